@@ -0,0 +1,74 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """Один запрос user_state, результат которого получают все ожидающие потоки."""
+
+    def __init__(self, generation):
+        self.generation = generation  # Поколение снимка на момент старта запроса
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AccountState:
+    """Снимок user_state с TTL и single-flight: параллельные вызовы ждут один запрос к Info API.
+
+    invalidate() сбрасывает снимок сразу (например, по подтверждению нашего ордера); если
+    инвалидация пришла во время запроса, его результат отдаётся уже ждущим, но не кэшируется,
+    а вызовы после инвалидации не присоединяются к нему и запускают новый запрос.
+    """
+
+    def __init__(self, info_client, address, ttl=None):
+        self.info_client = info_client
+        self.address = address
+        self.ttl = ttl if ttl is not None else float(os.getenv("ACCOUNT_STATE_TTL", "5"))
+        self.fetches = 0
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._fetched_at = 0.0
+        self._generation = 0
+        self._flight = None
+
+    def snapshot(self, max_age=None):
+        """Текущий user_state (из кэша, если он моложе max_age/ttl секунд)."""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._fetched_at <= max_age:
+                return self._snapshot
+            flight = self._flight
+            # Запрос, начатый до invalidate(), может вернуть состояние до нашего ордера
+            leader = flight is None or flight.generation != self._generation
+            if leader:
+                flight = self._flight = _Flight(self._generation)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self.info_client.user_state(self.address)
+            self.fetches += 1
+        except Exception as e:
+            flight.error = e
+        with self._lock:
+            if self._flight is flight:
+                self._flight = None
+            if flight.error is None and flight.generation == self._generation:
+                self._snapshot = flight.result
+                self._fetched_at = time.monotonic()
+        flight.done.set()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def invalidate(self):
+        """Сбросить снимок: следующий вызов snapshot() пойдёт в API."""
+        with self._lock:
+            self._generation += 1
+            self._fetched_at = 0.0
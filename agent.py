@@ -1,38 +1,31 @@
-import time
 import logging
 import os
 import threading
-from api_interface import HyperliquidAPI
+from api_interface import get_api
 from ml_strategy import MLStrategy
 from external_data import ExternalData
-import telegram
+from telegram_alerts import enqueue
+from scheduler import CandleScheduler, StrategyJob
+import metrics
+import log_pipeline
 
-logging.basicConfig(
-    filename="agent.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+log_pipeline.configure("agent.log")
 logger = logging.getLogger(__name__)
 
-# Telegram
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-bot = telegram.Bot(token=TELEGRAM_TOKEN)
+# Telegram: через общий фоновый диспетчер, цикл не ждёт отправки
 def send_telegram(msg):
-    try:
-        bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=msg)
-    except Exception as e:
-        logger.error(f"Ошибка отправки Telegram: {e}")
+    enqueue(msg)
 
 # Настройки
 SYMBOL = "BTC"
-TRADE_INTERVAL = 10  # секунд
+TRADE_INTERVAL = "1m"  # Интервал свечей, на закрытии которых считается сигнал
 POSITION_SIZE = 0.01
 
 # Инициализация
-api = HyperliquidAPI(testnet=True)
+api = get_api()
 ml_strategy = MLStrategy()
 external_data = ExternalData()
+external_data.get_features(SYMBOL)  # Запуск фонового sentiment-сервиса до первого тика
 
 logger.info("Агент запущен")
 send_telegram("🚀 Агент запущен на Hyperliquid testnet")
@@ -48,40 +41,36 @@ def price_callback(price):
 ws_thread = threading.Thread(target=api.subscribe_price, args=(SYMBOL, price_callback), daemon=True)
 ws_thread.start()
 
-# Главный цикл
-try:
-    while True:
-        if current_price is None:
-            time.sleep(1)
-            continue
-        last_price = current_price
-
-        # Берём OHLCV
-        df = api.info_client.ohlcv(symbol=SYMBOL, interval="1m", limit=20)
-        if df.empty:
-            logger.warning("Нет данных OHLCV")
-            time.sleep(TRADE_INTERVAL)
-            continue
-
+def on_signal(job, signal, df):
+    """Сигнал на закрытии минутной свечи: sentiment из памяти, ордер по позиции."""
+    last_price = current_price or float(df["close"].iloc[-1])
+    with metrics.span("external"):
         ext_features = external_data.get_features(SYMBOL)
-        X_tensor = ml_strategy.prepare_data(df, ext_features)
-        signal = ml_strategy.get_signal(X_tensor)
-        logger.info(f"Сигнал: {signal}")
+    logger.info(f"Сигнал: {signal}, sentiment={ext_features['sentiment']}")
 
+    with metrics.span("positions"):
         positions = api.get_positions()
-        open_pos = next((p for p in positions if p['symbol']==SYMBOL), None)
+    # assetPositions: {"position": {"coin", "szi", ...}}; сторона — знак szi
+    szi = next((float(p["position"]["szi"]) for p in positions if p["position"]["coin"] == SYMBOL), 0.0)
+    side = "BUY" if szi > 0 else "SELL" if szi < 0 else None
 
-        if signal == "BUY" and (not open_pos or open_pos['side'] != 'BUY'):
-            api.place_order(symbol=SYMBOL, is_buy=True, qty=POSITION_SIZE)
-            send_telegram(f"🟢 BUY {POSITION_SIZE} {SYMBOL} по {last_price}")
-        elif signal == "SELL" and (not open_pos or open_pos['side'] != 'SELL'):
-            api.place_order(symbol=SYMBOL, is_buy=False, qty=POSITION_SIZE)
-            send_telegram(f"🔴 SELL {POSITION_SIZE} {SYMBOL} по {last_price}")
-        else:
-            logger.info("HOLD — не открываем новые позиции")
-
-        time.sleep(TRADE_INTERVAL)
+    if signal == "BUY" and side != "BUY":
+        with metrics.span("place_order"):
+            api.place_order(asset=SYMBOL, is_buy=True, qty=POSITION_SIZE)
+        send_telegram(f"🟢 BUY {POSITION_SIZE} {SYMBOL} по {last_price}")
+    elif signal == "SELL" and side != "SELL":
+        with metrics.span("place_order"):
+            api.place_order(asset=SYMBOL, is_buy=False, qty=POSITION_SIZE)
+        send_telegram(f"🔴 SELL {POSITION_SIZE} {SYMBOL} по {last_price}")
+    else:
+        logger.info("HOLD — не открываем новые позиции")
 
+# Главный цикл: оценка на закрытии каждой 1m свечи вместо опроса раз в TRADE_INTERVAL
+metrics.start_http_server()
+scheduler = CandleScheduler([StrategyJob("agent", ml_strategy, coin=SYMBOL, interval=TRADE_INTERVAL,
+                                         lookback_hours=1, on_signal=on_signal)])
+try:
+    scheduler.run_forever(after_tick=metrics.dump)
 except KeyboardInterrupt:
     logger.info("Агент остановлен вручную")
     send_telegram("⏹️ Агент остановлен вручную")
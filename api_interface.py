@@ -5,16 +5,48 @@ from hyperliquid.info import Info
 from hyperliquid.utils import constants
 from eth_account import Account
 import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from market_data import get_market_data_hub
+from orderbook import get_order_books
+from account_state import AccountState
+from log_pipeline import event
+import rate_limiter
 
-logging.basicConfig(
-    filename='trades.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+_session = None
+_api = None
+_registry_lock = threading.RLock()
+
+
+def get_session():
+    """Общая на процесс HTTP-сессия с пулом keep-alive соединений."""
+    global _session
+    with _registry_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update({"Content-Type": "application/json"})
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.getenv("HL_HTTP_POOL_SIZE", "32")))
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+
+def get_api():
+    """Общий на процесс HyperliquidAPI (один набор Info/Exchange клиентов и соединений)."""
+    global _api
+    with _registry_lock:
+        if _api is None:
+            _api = HyperliquidAPI()
+    return _api
+
 class HyperliquidAPI:
-    def __init__(self):
+    def __init__(self, info_client=None, exchange_client=None):
+        if info_client is not None:
+            self._init_external(info_client, exchange_client)
+            return
         load_dotenv()
         self.private_key = os.getenv("PRIVATE_KEY")
         self.account_address = os.getenv("ACCOUNT_ADDRESS")
@@ -22,6 +54,9 @@ class HyperliquidAPI:
 
         self.base_url = constants.TESTNET_API_URL if self.environment == "testnet" else constants.MAINNET_API_URL
 
+        self.use_ws = os.getenv("MARKET_DATA_WS", "1") == "1"
+        self.market_data = None  # Общий WebSocket hub, подключается при первом запросе цены
+
         self.account = Account.from_key(self.private_key)
         self.info_client = Info(self.base_url, skip_ws=True)
         self.exchange_client = Exchange(
@@ -29,69 +64,203 @@ class HyperliquidAPI:
             base_url=self.base_url,
             account_address=self.account_address
         )
+        # Все клиенты SDK ходят через общую сессию и общий лимитер запросов (лимит биржи — на IP)
+        self.rate_limiter = rate_limiter.get_rate_limiter()
+        for client in (self.info_client, self.exchange_client, self.exchange_client.info):
+            rate_limiter.install(client, self.rate_limiter, get_session())
+        self.account_state = AccountState(self.info_client, self.account_address)  # Один user_state на TTL
         logger.info(f"Подключено к Hyperliquid {'testnet' if self.environment == 'testnet' else 'mainnet'}")
 
+    def _init_external(self, info_client, exchange_client):
+        """Готовые клиенты Info/Exchange (например, exchange_sim): без ключей, WebSocket и лимитера."""
+        self.account_address = getattr(exchange_client, "account_address", None)
+        self.environment = "simulator"
+        self.base_url = None
+        self.use_ws = False
+        self.market_data = None
+        self.info_client = info_client
+        self.exchange_client = exchange_client
+        self.rate_limiter = rate_limiter.get_rate_limiter()
+        self.account_state = AccountState(info_client, self.account_address, ttl=0)  # Время виртуальное — без кэша
+        logger.info("Подключено к симулятору биржи")
+
     def get_candles(self, coin="BTC", interval="1h", start_time=None, end_time=None):
-        """Получить исторические свечи (candles) из Info API Hyperliquid."""
+        """Получить исторические свечи (candles) из Info API Hyperliquid; None — запрос не удался ([] — свечей нет)."""
         try:
-            # Используем candle_snapshot из SDK (требует start_time и end_time в ms)
-            candles = self.info_client.candle_snapshot(
-                coin=coin,
+            # Используем candles_snapshot из SDK (требует startTime и endTime в ms)
+            candles = self.info_client.candles_snapshot(
+                name=coin,
                 interval=interval,
-                start_time=start_time,
-                end_time=end_time
+                startTime=start_time,
+                endTime=end_time
             )
-            logger.info(f"Получены свечи для {coin}: {len(candles) if candles else 0} точек")
+            logger.info("Получены свечи для %s: %s точек", coin, len(candles) if candles else 0)
             return candles or []
         except Exception as e:
             logger.error(f"Ошибка получения свечей: {e}")
-            return []
+            return None
+
+    def _market_data(self):
+        """Общий на процесс hub с подпиской allMids (None, если WebSocket выключен)."""
+        if self.market_data is None and self.use_ws:
+            try:
+                self.market_data = get_market_data_hub(self.base_url)
+                self.market_data.subscribe_mids()
+            except Exception as e:
+                logger.error(f"Ошибка подключения market data WebSocket: {e}")
+                self.use_ws = False
+        return self.market_data
+
+    def subscribe_price(self, asset="BTC", callback=None):
+        """Подписка на mid-цену asset через общий WebSocket hub: callback(price) на каждое обновление."""
+        hub = self._market_data()
+        if hub is None:
+            logger.error("WebSocket выключен (MARKET_DATA_WS=0), подписка на цену невозможна")
+            return None
+
+        def on_mids(mids):
+            if asset in mids and callback is not None:
+                callback(mids[asset])
+
+        return hub.subscribe_mids(on_mids)
 
     def get_price(self, asset="BTC"):
         try:
+            hub = self._market_data()
+            price = hub.get_mid(asset, max_age=10) if hub is not None else None
+            if price is not None:
+                return price  # Из памяти, без HTTP
             all_mids = self.info_client.all_mids()
             return float(all_mids.get(asset, 0))
         except Exception as e:
             logger.error(f"Ошибка получения цены для {asset}: {e}")
             return 0
 
+    def get_order_book(self, asset="BTC", max_age=5):
+        """Буфер L2-стакана asset из WebSocket (первый вызов подписывает); None, пока нет свежего снимка."""
+        try:
+            hub = self._market_data()
+            if hub is None:
+                return None
+            books = get_order_books()
+            books.attach(hub, asset)
+            return books.get(asset, max_age=max_age)
+        except Exception as e:
+            logger.error(f"Ошибка получения стакана {asset}: {e}")
+            return None
+
+    def get_prices(self):
+        """Все mid-цены одним запросом all_mids()."""
+        try:
+            return {coin: float(px) for coin, px in self.info_client.all_mids().items()}
+        except Exception as e:
+            logger.error(f"Ошибка получения всех цен: {e}")
+            return {}
+
+    def get_asset_contexts(self):
+        """Funding и mark-цена всех перпов одним запросом meta_and_asset_ctxs()."""
+        try:
+            meta, ctxs = self.info_client.meta_and_asset_ctxs()
+            return {
+                asset["name"]: {"funding": float(ctx.get("funding", 0)), "mark_price": float(ctx.get("markPx", 0))}
+                for asset, ctx in zip(meta["universe"], ctxs)
+                if not asset.get("isDelisted")
+            }
+        except Exception as e:
+            logger.error(f"Ошибка получения контекстов активов: {e}")
+            return {}
+
+    def round_price(self, asset, price):
+        """Цена по правилам Hyperliquid: 5 значащих цифр и не больше 6 - szDecimals знаков."""
+        sz_decimals = self.info_client.asset_to_sz_decimals[self.info_client.name_to_asset(asset)]
+        return round(float(f"{price:.5g}"), 6 - sz_decimals)
+
+    def round_size(self, asset, qty):
+        sz_decimals = self.info_client.asset_to_sz_decimals[self.info_client.name_to_asset(asset)]
+        return round(qty, sz_decimals)
+
+    def build_order(self, asset="BTC", is_buy=True, qty=0.008, price=None, reduce_only=False, slippage=0.05, tif=None):
+        """OrderRequest для exchange_client; без price — агрессивный IoC-лимит (market), как market_open в SDK."""
+        if price is None:
+            mid = self.get_price(asset)
+            price = mid * (1 + slippage) if is_buy else mid * (1 - slippage)
+            tif = tif or "Ioc"
+        order_type = {"limit": {"tif": tif or "Gtc"}}
+        return {
+            "coin": asset,
+            "is_buy": is_buy,
+            "sz": self.round_size(asset, qty),
+            "limit_px": self.round_price(asset, price),
+            "order_type": order_type,
+            "reduce_only": reduce_only,
+        }
+
     def place_order(self, asset="BTC", is_buy=True, qty=0.008, price=None):
         try:
-            order_type = {"market": {}} if price is None else {"limit": {"tif": "Gtc"}}
-            limit_px = str(price) if price else "0"
-            logger.info(f"Отправка ордера: asset={asset}, is_buy={is_buy}, sz={qty}, limit_px={limit_px}, order_type={order_type}")
-            result = self.exchange_client.order(
-                asset=asset,
-                is_buy=is_buy,
-                sz=str(qty),
-                limit_px=limit_px,
-                order_type=order_type
-            )
-            logger.info(f"Размещён ордер: {asset}, {'buy' if is_buy else 'sell'}, qty={qty}, result={result}")
+            order = self.build_order(asset, is_buy, qty, price)
+            event(logger, "Отправка ордера", asset=asset, is_buy=is_buy, sz=order["sz"], limit_px=order["limit_px"],
+                  order_type=order["order_type"])
+            result = self.exchange_client.bulk_orders([order])
+            self.invalidate_account()
+            event(logger, "Размещён ордер", asset=asset, is_buy=is_buy, qty=qty, result=result)
             return result
         except Exception as e:
             logger.error(f"Ошибка размещения ордера: {e}")
             return None
 
+    def place_orders(self, orders):
+        """Несколько OrderRequest одним bulk-запросом (одна подпись, один HTTP round trip)."""
+        try:
+            result = self.exchange_client.bulk_orders(orders)
+            self.invalidate_account()
+            event(logger, "Размещено ордеров пакетом", orders=len(orders), result=result)
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка пакетного размещения ордеров: {e}")
+            return None
+
     def cancel_order(self, order_id, asset="BTC"):
         try:
-            result = self.exchange_client.cancel_order(asset=asset, oid=order_id)
-            logger.info(f"Отменён ордер: {order_id} для {asset}, result={result}")
+            result = self.exchange_client.cancel(name=asset, oid=order_id)
+            self.invalidate_account()
+            event(logger, "Отменён ордер", oid=order_id, asset=asset, result=result)
             return result
         except Exception as e:
             logger.error(f"Ошибка отмены ордера: {e}")
             return None
 
+    def close_position(self, asset="BTC", sz=None, slippage=0.05):
+        """Закрыть позицию reduce-only IoC ордером (market_close SDK); sz=None — целиком."""
+        try:
+            result = self.exchange_client.market_close(asset, sz=sz, slippage=slippage)
+            self.invalidate_account()
+            event(logger, "Закрытие позиции", asset=asset, sz=sz, result=result)
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка закрытия позиции {asset}: {e}")
+            return None
+
+    def get_open_orders(self, asset=None):
+        """Открытые (резервные) ордера аккаунта: coin, side B/A, limitPx, sz, oid; asset — фильтр по монете."""
+        try:
+            orders = self.info_client.open_orders(self.account_address)
+            return [o for o in orders if asset is None or o["coin"] == asset]
+        except Exception as e:
+            logger.error(f"Ошибка получения открытых ордеров: {e}")
+            return None
+
     def get_balance(self):
         try:
-            user_state = self.info_client.user_state(self.account_address)
+            user_state = self.account_state.snapshot()
             balance = {
                 "margin_used": user_state.get("marginUsed", "0"),
                 "withdrawable": user_state.get("withdrawable", "0"),
                 "asset_positions": user_state.get("assetPositions", []),
                 "fundingRate": user_state.get("funding", {}).get("fundingRate", "0.0001") if "funding" in user_state else "0.0001"  # Добавили funding
             }
-            logger.info(f"Получен баланс: {balance}")
+            event(logger, "Получен баланс", margin_used=balance["margin_used"], withdrawable=balance["withdrawable"],
+                  positions=len(balance["asset_positions"]))
+            logger.debug("Баланс: %s", balance)  # Полный снимок — только на DEBUG, строка собирается в writer'е
             return balance
         except Exception as e:
             logger.error(f"Ошибка получения баланса: {e}")
@@ -99,10 +268,28 @@ class HyperliquidAPI:
 
     def get_positions(self):
         try:
-            user_state = self.info_client.user_state(self.account_address)
+            user_state = self.account_state.snapshot()
             positions = user_state.get("assetPositions", [])
-            logger.info(f"Получены позиции: {positions}")
+            event(logger, "Получены позиции", count=len(positions))
+            logger.debug("Позиции: %s", positions)
             return positions
         except Exception as e:
             logger.error(f"Ошибка получения позиций: {e}")
             return []
+
+    def get_funding_rate(self):
+        """Funding rate из того же снимка user_state, что и баланс/позиции."""
+        try:
+            user_state = self.account_state.snapshot()
+            return float(user_state.get("funding", {}).get("fundingRate", 0.0001)) if "funding" in user_state else 0.0001
+        except Exception as e:
+            logger.error(f"Ошибка получения funding rate: {e}")
+            return 0.0001
+
+    def invalidate_account(self):
+        """Сбросить кэш user_state после наших ордеров/отмен."""
+        self.account_state.invalidate()
+
+    def rate_limit_stats(self):
+        """Время ожидания запросов в очереди лимитера по приоритетам."""
+        return self.rate_limiter.stats()
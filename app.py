@@ -1,131 +1,220 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-from api_interface import HyperliquidAPI
+import altair as alt
+from api_interface import get_api as get_shared_api
 from ml_strategy import MLStrategy
-from telegram_alerts import send_alert
-import asyncio
+from indicators import StreamingIndicators, INDICATOR_COLUMNS
+from telegram_alerts import enqueue
+from trade_journal import TradeJournal
+from portfolio import Portfolio
 import pandas as pd
-import time
+
+SYMBOL = "BTC"
+INTERVAL = "1h"
+LOOKBACK_HOURS = 24
+REFRESH_SECONDS = 30  # Период автообновления живой панели
+ACCOUNT_TTL = 10  # Баланс/позиции не чаще раза в 10 секунд
 
 st.title("Hyperliquid Trading Bot")
 
+
+# Тяжёлые объекты создаются один раз на процесс, а не на каждый rerun
+@st.cache_resource
+def get_api():
+    return get_shared_api()
+
+
+@st.cache_resource
+def get_strategy(grid_mode):
+    return MLStrategy(testnet=True, grid_mode=grid_mode)
+
+
+@st.cache_resource
+def get_journal():
+    return TradeJournal()
+
+
+@st.cache_data(ttl=ACCOUNT_TTL, show_spinner=False)
+def load_account():
+    api = get_api()
+    return api.get_balance(), api.get_positions()
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def load_price(asset):
+    return get_api().get_price(asset)
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def load_mids():
+    return get_api().get_prices()
+
+
+@st.cache_data(ttl=REFRESH_SECONDS, show_spinner=False)
+def load_candles(asset, interval, lookback_hours, _ml):
+    """Синхронизация свечей с API не чаще раза в REFRESH_SECONDS: клики и чекбоксы берут кэш."""
+    return _ml.fetch_historical_data(asset=asset, interval=interval, lookback_hours=lookback_hours)
+
+
+def refresh_candles(ml):
+    """Дописать в session_state только новые свечи; индикаторы считаются инкрементально."""
+    fresh = load_candles(SYMBOL, INTERVAL, LOOKBACK_HOURS, ml)
+    state = st.session_state
+    if fresh.empty:
+        return state.get("candles", fresh)
+    if "candles" not in state or state.candles.empty:
+        state.engine = StreamingIndicators()
+        state.engine.update_frame(fresh)
+        state.candles = ml.calculate_indicators(fresh.copy())
+        return state.candles
+    candles = state.candles
+    last_time = candles["time"].iloc[-1]
+    new_rows = fresh[fresh["time"] >= last_time]
+    if new_rows.empty:
+        return candles
+    rows = []
+    for row in new_rows.to_dict("records"):
+        row.update(state.engine.update(row, time_key=row["time"]))
+        rows.append(row)
+    candles = pd.concat([candles[candles["time"] < last_time], pd.DataFrame(rows)], ignore_index=True)
+    state.candles = candles.tail(LOOKBACK_HOURS).reset_index(drop=True)
+    return state.candles
+
+
+def refresh_trades(journal, window_start):
+    """Отметки сделок: первый раз — окно по индексу журнала, дальше — только новые записи."""
+    state = st.session_state
+    if "trade_tail" not in state:
+        state.trade_tail = journal.tail()
+        records = journal.read_range(start_ms=window_start)
+        state.trades = []
+    else:
+        records = state.trade_tail.read_new()
+    for record in records:
+        # Только исполнения: у "resting" в журнале цена лимита, а не сделки, и его fill туда не попадает
+        if record.get("price") is None or record.get("status") != "filled":
+            continue
+        trade_time = pd.to_datetime(record["ts"], unit="ms").floor(INTERVAL).strftime('%Y-%m-%d %H:%M:%S')
+        state.trades.append({"time": trade_time, "price": float(record["price"]), "side": record.get("side")})
+    return pd.DataFrame(state.trades, columns=["time", "price", "side"])
+
+
+def current_signal(ml, candles, grid_mode):
+    """Сигнал пересчитывается только при изменении последней свечи или режима grid."""
+    state = st.session_state
+    key = (candles["time"].iloc[-1], float(candles["close"].iloc[-1]), grid_mode)
+    if state.get("signal_key") != key:
+        state.signal = ml.get_signal(candles.copy(), asset=SYMBOL, interval=INTERVAL)
+        state.signal_key = key
+    return state.signal
+
+
+def price_chart(candles, trades):
+    base = alt.Chart(candles).encode(x=alt.X("time:T", title="Time"))
+    band = base.mark_area(opacity=0.2, color="gray").encode(y="BB_lower:Q", y2="BB_upper:Q")
+    lines = alt.Chart(candles).transform_fold(
+        ["close", "SMA10", "SMA50", "BB_upper", "BB_lower"], as_=["series", "value"]
+    ).mark_line().encode(
+        x="time:T", y=alt.Y("value:Q", title="Price (USDC)", scale=alt.Scale(zero=False)), color="series:N"
+    )
+    layers = [band, lines]
+    if not trades.empty:
+        layers.append(alt.Chart(trades).mark_point(color="red", size=80, filled=True).encode(
+            x="time:T", y="price:Q", tooltip=["side", "price"]))
+    return alt.layer(*layers).properties(height=400)
+
+
 # Инициализация с grid_mode из UI
 grid_mode = st.checkbox("Включить Grid Mode (для range-рынков)")
-ml = MLStrategy(testnet=True, grid_mode=grid_mode)
-api = HyperliquidAPI()
-
-# Данные
-df = ml.fetch_historical_data(asset="BTC", interval="1h", lookback_hours=24)
-if not df.empty:
-    df = ml.calculate_indicators(df)
-    signal = ml.get_signal(df)
-    st.write(f"Текущий сигнал (с LSTM и sentiment): {signal}")
-else:
-    signal = "HOLD"
-    st.write("Нет данных для расчёта сигнала.")
-
-# Цена и баланс
-price = api.get_price("BTC")
-balance = api.get_balance()
-positions = api.get_positions()
-
-# Расчёт PnL (твой старый код, но улучшен)
-pnl = 0
-for pos in positions:
-    entry_price = float(pos.get("entryPx", 0))
-    size = float(pos.get("sz", 0))
-    side = pos.get("side")
-    current_price = price
-    if side == "buy":  # Long
-        unrealized_pnl = (current_price - entry_price) * size
-    else:  # Short
-        unrealized_pnl = (entry_price - current_price) * size
-    pnl += unrealized_pnl
-st.write(f"Текущая цена BTC: {price} USDC")
-st.write(f"Баланс (выводимый): {balance.get('withdrawable', 0)} USDC")
-st.write(f"PnL: {pnl:.2f} USDC")
-st.write(f"Позиции: {positions}")
-
-# Загрузка логов сделок (твой старый, но улучшен парсинг — используй json позже)
-trade_data = []
-try:
-    with open("trades.log", "r") as f:
-        for line in f:
-            timestamp, result = line.strip().split(",", 1)
-            trade_time = pd.to_datetime(timestamp)
-            # Упрощённый парсинг (улучши на json)
-            if "buy" in result.lower():
-                trade_price = price
-            elif "sell" in result.lower():
-                trade_price = price
-            else:
-                trade_price = price
-            trade_data.append((trade_time, trade_price))
-except FileNotFoundError:
-    st.write("Файл trades.log не найден. Ожидайте автоматические сделки.")
-except Exception as e:
-    st.write(f"Ошибка чтения trades.log: {e}")
-
-# График с отметками сделок
-if not df.empty:
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(df["time"], df["close"], label="BTC Close Price", color="#1f77b4")
-    ax.plot(df["time"], df["SMA10"], label="SMA10", color="#ff7f0e")
-    ax.plot(df["time"], df["SMA50"], label="SMA50", color="#2ca02c")
-    # Добавим BB для визуализации
-    ax.plot(df["time"], df["BB_upper"], label="BB Upper", color="gray", linestyle="--")
-    ax.plot(df["time"], df["BB_lower"], label="BB Lower", color="gray", linestyle="--")
-    ax.fill_between(df["time"], df["BB_upper"], df["BB_lower"], alpha=0.2, color="gray")
-
-    # Отметки сделок из trades.log
-    trade_times = [t[0] for t in trade_data]
-    trade_prices = [t[1] for t in trade_data]
-    if trade_times and trade_prices:
-        ax.scatter(trade_times, trade_prices, color="red", label="Trades", zorder=5)
-
-    ax.set_title("BTC Price with Indicators, BB, and Trades (LSTM Signal: {signal})")
-    ax.set_xlabel("Time")
-    ax.set_ylabel("Price (USDC)")
-    ax.legend()
-    ax.grid(True)
-    plt.xticks(rotation=45)
-    st.pyplot(fig)
-else:
-    st.write("Нет данных для построения графика.")
+ml = get_strategy(grid_mode)
+api = get_api()
+journal = get_journal()
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_panel():
+    candles = refresh_candles(ml)
+    if not candles.empty and set(INDICATOR_COLUMNS).issubset(candles.columns):
+        signal = current_signal(ml, candles, grid_mode)
+        st.write(f"Текущий сигнал (с LSTM и sentiment): {signal}")
+    else:
+        st.session_state.signal = "HOLD"
+        st.write("Нет данных для расчёта сигнала.")
+
+    price = load_price(SYMBOL)
+    balance, positions = load_account()
+    # PnL по всем монетам: позиции лежат в assetPositions[i]["position"] (szi со знаком, entryPx, leverage)
+    portfolio = Portfolio().load_positions(positions, mids=load_mids())
+    risk = portfolio.snapshot()
+    st.write(f"Текущая цена {SYMBOL}: {price} USDC")
+    st.write(f"Баланс (выводимый): {balance.get('withdrawable', 0)} USDC")
+    st.write(f"PnL: {risk['unrealized_pnl']:.2f} USDC")
+    st.write(f"Экспозиция: gross {risk['gross_exposure']:.2f} / net {risk['net_exposure']:.2f} USDC, "
+             f"маржа {risk['margin_used']:.2f} USDC")
+    for pos in portfolio.positions():
+        st.write(f"{pos['coin']}: {pos['size']} @ {pos['entry']:.2f}, PnL {pos['unrealized_pnl']:.2f} USDC, "
+                 f"до ликвидации {pos['liq_distance']:.1%}")
+    st.write(f"Позиции: {positions}")
+
+    if not candles.empty:
+        window_start = int(pd.to_datetime(candles["time"].iloc[0]).timestamp() * 1000)
+        try:
+            trades = refresh_trades(journal, window_start)
+        except Exception as e:
+            st.write(f"Ошибка чтения журнала сделок: {e}")
+            trades = pd.DataFrame(columns=["time", "price", "side"])
+        trades = trades[trades["time"] >= candles["time"].iloc[0]]
+        st.altair_chart(price_chart(candles, trades), use_container_width=True)
+    else:
+        st.write("Нет данных для построения графика.")
+
+
+live_panel()
+signal = st.session_state.get("signal", "HOLD")
+_, positions = load_account()
 
 # Ручное управление (твой старый, но добавь signal в алерты)
 if st.button("Открыть BUY ордер"):
-    result = api.place_order("BTC", is_buy=True, qty=0.008)
+    result = api.place_order(SYMBOL, is_buy=True, qty=0.008)
     st.write(f"Результат BUY ордера: {result}")
     if result:
-        with open("trades.log", "a") as f:
-            f.write(f"{time.ctime()},{result}\n")
-        asyncio.create_task(send_alert(f"Ручной BUY ордер: {result} (signal: {signal})"))
-
-if st.button("Закрыть BUY ордер"):
-    for pos in positions:
-        if pos.get("side") == "buy":
-            result = api.cancel_order(pos.get("oid"), "BTC")
-            st.write(f"Результат закрытия BUY ордера: {result}")
+        journal.record_result({"coin": SYMBOL, "is_buy": True, "sz": 0.008, "limit_px": None}, result,
+                              signal=signal, tag="manual")
+        enqueue(f"Ручной BUY ордер: {result} (signal: {signal})")
+        load_account.clear()
+
+if st.button("Закрыть BUY позицию"):
+    # У позиции нет oid: закрываем reduce-only IoC ордером на весь размер
+    for item in positions:
+        pos = item.get("position", item)
+        szi = float(pos.get("szi", 0) or 0)
+        if pos.get("coin") == SYMBOL and szi > 0:
+            result = api.close_position(SYMBOL)
+            st.write(f"Результат закрытия BUY позиции: {result}")
             if result:
-                with open("trades.log", "a") as f:
-                    f.write(f"{time.ctime()},{result}\n")
-                asyncio.create_task(send_alert(f"Ручное закрытие BUY ордера: {result}"))
+                journal.record_result({"coin": SYMBOL, "is_buy": szi < 0, "sz": abs(szi), "limit_px": None}, result,
+                                      signal=signal, tag="manual_close")
+                enqueue(f"Ручное закрытие BUY позиции: {result}")
+                load_account.clear()
 
 if st.button("Открыть SELL ордер"):
-    result = api.place_order("BTC", is_buy=False, qty=0.008)
+    result = api.place_order(SYMBOL, is_buy=False, qty=0.008)
     st.write(f"Результат SELL ордера: {result}")
     if result:
-        with open("trades.log", "a") as f:
-            f.write(f"{time.ctime()},{result}\n")
-        asyncio.create_task(send_alert(f"Ручной SELL ордер: {result} (signal: {signal})"))
-
-if st.button("Закрыть SELL ордер"):
-    for pos in positions:
-        if pos.get("side") == "sell":
-            result = api.cancel_order(pos.get("oid"), "BTC")
-            st.write(f"Результат закрытия SELL ордера: {result}")
+        journal.record_result({"coin": SYMBOL, "is_buy": False, "sz": 0.008, "limit_px": None}, result,
+                              signal=signal, tag="manual")
+        enqueue(f"Ручной SELL ордер: {result} (signal: {signal})")
+        load_account.clear()
+
+if st.button("Закрыть SELL позицию"):
+    # У позиции нет oid: закрываем reduce-only IoC ордером на весь размер
+    for item in positions:
+        pos = item.get("position", item)
+        szi = float(pos.get("szi", 0) or 0)
+        if pos.get("coin") == SYMBOL and szi < 0:
+            result = api.close_position(SYMBOL)
+            st.write(f"Результат закрытия SELL позиции: {result}")
             if result:
-                with open("trades.log", "a") as f:
-                    f.write(f"{time.ctime()},{result}\n")
-                asyncio.create_task(send_alert(f"Ручное закрытие SELL ордера: {result}"))
+                journal.record_result({"coin": SYMBOL, "is_buy": szi < 0, "sz": abs(szi), "limit_px": None}, result,
+                                      signal=signal, tag="manual_close")
+                enqueue(f"Ручное закрытие SELL позиции: {result}")
+                load_account.clear()
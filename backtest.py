@@ -0,0 +1,196 @@
+import os
+import argparse
+import logging
+import log_pipeline
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from indicators import chop
+from candle_store import CandleStore, INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+# Коды сигналов: индекс в SIGNALS, направление в DIRECTIONS
+SIGNALS = np.array(["HOLD", "BUY", "SELL", "STRONG_BUY", "STRONG_SELL",
+                    "GRID_BUY", "GRID_SELL", "GRID_STRONG_BUY", "GRID_STRONG_SELL"])
+DIRECTIONS = np.array([0, 1, -1, 1, -1, 1, -1, 1, -1])
+HOLD, BUY, SELL, STRONG_BUY, STRONG_SELL = 0, 1, 2, 3, 4
+GRID_OFFSET = 4  # BUY -> GRID_BUY, STRONG_SELL -> GRID_STRONG_SELL
+
+# Параметры правил MLStrategy.get_signal по умолчанию
+DEFAULT_PARAMS = {
+    "sma_fast": 10,
+    "sma_slow": 50,
+    "rsi_length": 14,
+    "rsi_upper": 70,
+    "rsi_lower": 30,
+    "chop_length": 14,
+    "chop_threshold": 50,
+    "grid_distance": 0.02,
+    "sentiment": 0.5,
+    "grid_mode": False,
+    "min_bars": 50,
+}
+
+
+def compute_features(close, high, low, params=None):
+    """Векторный расчёт индикаторов, которые нужны правилам get_signal."""
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    close_s = pd.Series(close, copy=False)
+    high_s = pd.Series(high, copy=False)
+    low_s = pd.Series(low, copy=False)
+    delta = close_s.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=p["rsi_length"], min_periods=1).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=p["rsi_length"], min_periods=1).mean()
+    return {
+        "sma_fast": close_s.rolling(window=p["sma_fast"], min_periods=1).mean().to_numpy(),
+        "sma_slow": close_s.rolling(window=p["sma_slow"], min_periods=1).mean().to_numpy(),
+        "rsi": (100 - (100 / (1 + gain / loss))).to_numpy(),
+        "chop": chop(high_s, low_s, close_s, length=p["chop_length"]).to_numpy(),
+    }
+
+
+def generate_signals(close, high, low, funding_rate=0.0001, params=None, features=None):
+    """Коды сигналов get_signal для каждой свечи за один проход массивных операций.
+
+    LSTM не учитывается: в get_signal он меняет сигнал только на равный базовому, т.е. никогда.
+    """
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    close = np.asarray(close, dtype=np.float64)
+    f = features if features is not None else compute_features(close, high, low, p)
+    sma_fast, sma_slow, rsi = f["sma_fast"], f["sma_slow"], f["rsi"]
+
+    with np.errstate(invalid="ignore"):
+        buy = (sma_fast > sma_slow) & (rsi < p["rsi_upper"])
+        sell = ~buy & (sma_fast < sma_slow) & (rsi > p["rsi_lower"])
+    codes = np.where(buy, BUY, np.where(sell, SELL, HOLD)).astype(np.int8)
+
+    sentiment = np.broadcast_to(np.asarray(p["sentiment"], dtype=np.float64), close.shape)
+    codes[(codes == BUY) & (sentiment > 0.3)] = STRONG_BUY
+    codes[(codes == SELL) & (sentiment < -0.3)] = STRONG_SELL
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ranging = p["grid_mode"] | (f["chop"] > p["chop_threshold"])
+        stretched = np.abs(close - sma_slow) / sma_slow > p["grid_distance"]
+    codes[ranging & stretched & (codes != HOLD)] += GRID_OFFSET
+
+    # Вето funding: только «чистый» BUY, как в get_signal
+    funding = np.broadcast_to(np.asarray(funding_rate, dtype=np.float64), close.shape)
+    codes[(funding < 0) & (codes == BUY)] = HOLD
+
+    codes[:p["min_bars"] - 1] = HOLD  # get_signal требует минимум 50 свечей
+    return codes
+
+
+def run_backtest(df, params=None, qty=0.008, mode="target", fee_rate=0.00035, slippage=0.0005,
+                 initial_equity=10_000.0, interval="1h"):
+    """Бэктест правил get_signal: кривая капитала, список сделок и статистика.
+
+    mode="target" держит позицию ±qty по последнему сигналу (HOLD сохраняет позицию),
+    mode="accumulate" добавляет ±qty на каждый сигнал, как bot.run_bot.
+    Исполнение по close сигнальной свечи с проскальзыванием и комиссией taker.
+    """
+    close = df["close"].to_numpy(dtype=np.float64)
+    high = df["high"].to_numpy(dtype=np.float64)
+    low = df["low"].to_numpy(dtype=np.float64)
+    funding = df["funding_rate"].to_numpy(dtype=np.float64) if "funding_rate" in df else 0.0001
+    codes = generate_signals(close, high, low, funding, params)
+    position, traded, equity = simulate(close, codes, qty, mode, fee_rate, slippage, initial_equity)
+
+    times = df["time"].to_numpy()
+    trade_idx = np.flatnonzero(traded)
+    trade_side = np.where(traded[trade_idx] > 0, "buy", "sell")
+    fill_price = close[trade_idx] * (1 + np.sign(traded[trade_idx]) * slippage)
+    trades = pd.DataFrame({
+        "time": times[trade_idx],
+        "signal": SIGNALS[codes[trade_idx]],
+        "side": trade_side,
+        "size": np.abs(traded[trade_idx]),
+        "price": fill_price,
+        "fee": np.abs(traded[trade_idx]) * fill_price * fee_rate,
+        "position": position[trade_idx],
+    })
+    curve = pd.DataFrame({"time": times, "close": close, "signal": SIGNALS[codes],
+                          "position": position, "equity": equity})
+    return {"equity": curve, "trades": trades, "stats": performance_stats(equity, initial_equity, len(trade_idx), interval)}
+
+
+def simulate(close, codes, qty=0.008, mode="target", fee_rate=0.00035, slippage=0.0005, initial_equity=10_000.0):
+    """Позиция, объём сделок и кривая капитала по кодам сигналов (массивы той же длины, что close)."""
+    direction = DIRECTIONS[codes]
+    if mode == "accumulate":
+        position = np.cumsum(direction * qty)
+    else:
+        # Последний ненулевой сигнал задаёт целевую позицию (forward fill без цикла)
+        last_idx = np.maximum.accumulate(np.where(direction != 0, np.arange(len(direction)), -1))
+        position = np.where(last_idx >= 0, direction[np.maximum(last_idx, 0)], 0) * qty
+
+    prev_position = np.concatenate(([0.0], position[:-1]))
+    traded = position - prev_position
+    price_change = np.diff(close, prepend=close[0])
+    pnl = prev_position * price_change
+    costs = np.abs(traded) * close * (fee_rate + slippage)
+    equity = initial_equity + np.cumsum(pnl - costs)
+    return position, traded, equity
+
+
+def performance_stats(equity, initial_equity, n_trades, interval):
+    """Доходность, максимальная просадка, годовой Sharpe и число сделок по кривой капитала.
+
+    Доходность бара — PnL относительно initial_equity (позиция фиксированного размера), поэтому
+    знак Sharpe не переворачивается при отрицательном капитале. Разорение (equity <= 0) — sharpe=-inf.
+    """
+    if not len(equity):
+        return {"total_return": 0.0, "max_drawdown": 0.0, "sharpe": 0.0, "trades": int(n_trades)}
+    returns = np.diff(equity, prepend=initial_equity) / initial_equity
+    peak = np.maximum.accumulate(np.concatenate(([initial_equity], equity)))[1:]
+    bars_per_year = 365 * 24 * 3_600_000 / INTERVAL_MS.get(interval, 3_600_000)
+    std = returns.std()
+    if equity.min() <= 0:
+        sharpe = -np.inf
+    else:
+        sharpe = returns.mean() / std * np.sqrt(bars_per_year) if std > 0 else 0.0
+    return {
+        "total_return": float(equity[-1] / initial_equity - 1),
+        "max_drawdown": float(min(((peak - equity) / peak).max(), 1.0)),
+        "sharpe": float(sharpe),
+        "trades": int(n_trades),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Векторный бэктест правил MLStrategy.get_signal")
+    parser.add_argument("--coin", default="BTC")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--start", default=os.getenv("BACKTESTING_START", "2025-01-01"))
+    parser.add_argument("--end", default=os.getenv("BACKTESTING_END", datetime.now().strftime("%Y-%m-%d")))
+    parser.add_argument("--mode", choices=("target", "accumulate"), default="target")
+    parser.add_argument("--qty", type=float, default=0.008)
+    parser.add_argument("--fee", type=float, default=0.00035)
+    parser.add_argument("--slippage", type=float, default=0.0005)
+    parser.add_argument("--grid-mode", action="store_true")
+    parser.add_argument("--offline", action="store_true", help="Только локальное хранилище, без API")
+    parser.add_argument("--trades-csv", default=None)
+    args = parser.parse_args(argv)
+    log_pipeline.configure()
+
+    start_ts = int(datetime.strptime(args.start, "%Y-%m-%d").timestamp() * 1000)
+    end_ts = int(datetime.strptime(args.end, "%Y-%m-%d").timestamp() * 1000)
+    api = None
+    if not args.offline:
+        from api_interface import get_api
+        api = get_api()
+    df = CandleStore(api).frame(coin=args.coin, interval=args.interval, start_time=start_ts, end_time=end_ts)
+    if df.empty:
+        print("Нет свечей в хранилище для заданного периода")
+        return
+    result = run_backtest(df, params={"grid_mode": args.grid_mode}, qty=args.qty, mode=args.mode,
+                          fee_rate=args.fee, slippage=args.slippage, interval=args.interval)
+    for key, value in result["stats"].items():
+        print(f"{key}: {value}")
+    if args.trades_csv:
+        result["trades"].to_csv(args.trades_csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import numpy as np
+import pandas as pd
+from candle_store import candles_to_arrays, arrays_to_frame, INTERVAL_MS
+
+# Детерминированные наборы свечей и отслеживаемые пути сигнала
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+BENCHMARKS = ("frame_from_payload", "calculate_indicators", "get_signal", "lstm_inference")
+BASELINE_PATH = os.getenv("BENCH_BASELINE", "bench_baseline.json")
+DEFAULT_THRESHOLD = 1.3  # Регрессия: медиана медленнее базовой более чем на 30%
+MIN_SECONDS = 0.2  # Каждый замер повторяется, пока суммарно не наберётся хотя бы столько
+MAX_REPEATS = 50
+# Фиксированный набор бэкендов get_signal: lstm зависел бы от чекпоинтов на машине, а sentiment при
+# заданных TW_* запускает опрос Twitter — замер должен быть офлайн и воспроизводимым
+SIGNAL_BACKENDS = "rules"
+
+
+class OfflineAPI:
+    """Заглушка API для офлайн-замеров: get_signal и индикаторы в сеть не ходят."""
+
+    def get_funding_rate(self, asset="BTC"):
+        return 0.0001
+
+    def get_price(self, asset="BTC"):
+        return 50_000.0
+
+
+def synthetic_candles(n_bars, seed=0, start_price=50_000.0, interval="1h"):
+    """Сидированный random walk OHLCV в формате fetch_historical_data (как _generate_synthetic)."""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.004, n_bars)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.002, n_bars))
+    times = np.arange(n_bars, dtype=np.int64) * INTERVAL_MS[interval] + 1_700_000_000_000
+    return pd.DataFrame({
+        "time": pd.to_datetime(times, unit="ms").strftime('%Y-%m-%d %H:%M:%S'),
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + spread),
+        "low": np.minimum(open_, close) * (1 - spread),
+        "close": close,
+        "volume": rng.integers(100, 1000, n_bars).astype(np.float64),
+        "funding_rate": 0.0001,
+    })
+
+
+def synthetic_payload(frame, coin="BTC", interval="1h"):
+    """Сырые свечи в формате ответа candle_snapshot (строковые цены, как отдаёт биржа)."""
+    times = pd.to_datetime(frame["time"]).astype("int64") // 1_000_000
+    step = INTERVAL_MS[interval]
+    return [{"t": int(t), "T": int(t) + step - 1, "s": coin, "i": interval, "o": f"{o:.1f}", "h": f"{h:.1f}",
+             "l": f"{lo:.1f}", "c": f"{c:.1f}", "v": f"{v:.5f}", "n": 100}
+            for t, o, h, lo, c, v in zip(times, frame["open"], frame["high"], frame["low"], frame["close"],
+                                         frame["volume"])]
+
+
+def measure(fn, min_seconds=MIN_SECONDS, max_repeats=MAX_REPEATS):
+    """Медиана и минимум времени вызова fn (ms) после одного прогрева."""
+    fn()
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_repeats and (len(timings) < 3 or time.perf_counter() - started < min_seconds):
+        t = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t) * 1000)
+    timings = np.array(timings)
+    return {"median_ms": float(np.median(timings)), "min_ms": float(timings.min()), "repeats": len(timings)}
+
+
+def build_lstm():
+    """LSTMInference на сидированной необученной сети: замер не зависит от чекпоинтов."""
+    import torch
+    from lstm_model import LSTMPredictor
+    from lstm_inference import LSTMInference
+    torch.manual_seed(0)
+    return LSTMInference(LSTMPredictor())
+
+
+def build_cases(strategy, sizes, lstm=None):
+    """(имя, размер) -> функция без аргументов для замера."""
+    cases = {}
+    for label in sizes:
+        frame = synthetic_candles(SIZES[label], seed=SIZES[label])
+        payload = synthetic_payload(frame)
+        prices = frame["close"].to_numpy()
+        windows = np.lib.stride_tricks.sliding_window_view(prices[-(150 + 99):], 100)  # 150 окон по 100 цен
+        cases[("frame_from_payload", label)] = lambda p=payload: arrays_to_frame(candles_to_arrays(p))
+        cases[("calculate_indicators", label)] = lambda f=frame: strategy.calculate_indicators(f.copy())
+        cases[("get_signal", label)] = lambda f=frame: strategy.get_signal(f.copy())  # С расчётом индикаторов
+        if lstm is not None:
+            cases[("lstm_inference", label)] = lambda p=prices, w=windows: (lstm.predict_series(p),
+                                                                            lstm.predict_windows(w))
+    return cases
+
+
+def run(sizes=None, benchmarks=None):
+    """Прогнать замеры: {"benchmark/size": {"median_ms", "min_ms", "repeats"}}."""
+    logging.disable(logging.CRITICAL)  # Логи get_signal не должны попадать в замер
+    from ml_strategy import MLStrategy
+    strategy = MLStrategy(backends=SIGNAL_BACKENDS, api=OfflineAPI())
+    lstm = build_lstm() if not benchmarks or "lstm_inference" in benchmarks else None
+    results = {}
+    for (name, label), fn in build_cases(strategy, sizes or list(SIZES), lstm).items():
+        if benchmarks and name not in benchmarks:
+            continue
+        results[f"{name}/{label}"] = measure(fn)
+        print(f"{name + '/' + label:<28} median={results[f'{name}/{label}']['median_ms']:10.3f} ms "
+              f"min={results[f'{name}/{label}']['min_ms']:10.3f} ms")
+    logging.disable(logging.NOTSET)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Список регрессий: (ключ, базовая медиана, текущая медиана, отношение)."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        ratio = current["median_ms"] / base["median_ms"] if base["median_ms"] > 0 else 1.0
+        if ratio > threshold:
+            regressions.append((key, base["median_ms"], current["median_ms"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк горячего пути сигнала с проверкой регрессий")
+    parser.add_argument("--sizes", nargs="*", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--bench", nargs="*", choices=BENCHMARKS, default=None)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update", action="store_true", help="Записать результаты как новую базу")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--allow-missing-baseline", action="store_true",
+                        help="Без файла базы завершиться с кодом 0 (по умолчанию — ошибка 2)")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.bench)
+    if args.update:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.setdefault("results", {}).update(results)
+        baseline["machine"] = {"python": platform.python_version(), "platform": platform.platform(),
+                               "cpus": os.cpu_count()}
+        baseline["signal_backends"] = SIGNAL_BACKENDS
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"База сохранена: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"Нет базы {args.baseline}: запусти с --update на эталонной машине")
+        if args.allow_missing_baseline:
+            return
+        sys.exit(2)  # CI без базы не должен проходить молча
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("signal_backends", SIGNAL_BACKENDS) != SIGNAL_BACKENDS:
+        print(f"База снята с бэкендами {baseline['signal_backends']}, текущие {SIGNAL_BACKENDS}: обнови базу (--update)")
+        sys.exit(2)
+    regressions = compare(results, baseline, args.threshold)
+    for key, base, current, ratio in regressions:
+        print(f"РЕГРЕССИЯ {key}: {base:.3f} ms -> {current:.3f} ms (x{ratio:.2f})")
+    if regressions:
+        sys.exit(1)
+    print(f"Регрессий нет (порог x{args.threshold})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,137 @@
-import time
-import asyncio
-from api_interface import HyperliquidAPI
+import os
+from api_interface import get_api
 from ml_strategy import MLStrategy
-from telegram_alerts import send_alert
+from telegram_alerts import enqueue
+from execution import OrderExecutor
+from trade_journal import TradeJournal
+from scheduler import CandleScheduler, StrategyJob
+from portfolio import Portfolio
+from grid import GridManager
+import metrics
+import log_pipeline
 import logging
 
-logging.basicConfig(
-    filename='bot.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+log_pipeline.configure("bot.log")  # Очередь + фоновый writer с ротацией; без эффекта, если логирование уже настроено
 logger = logging.getLogger(__name__)
 
-api = HyperliquidAPI()
-ml = MLStrategy(testnet=True, grid_mode=False)  # Grid off по умолчанию; включи если нужно
+api = get_api()  # Тот же клиент, что и у MLStrategy
+# Рынки бота: "coin:interval[:каждая N-я свеча]" через запятую; на каждый — своя MLStrategy в одном процессе
+MARKETS = os.getenv("BOT_MARKETS", "BTC:1h")
+# Grid off по умолчанию; включи если нужно. Без LSTM бот стартует без импорта torch
+BACKENDS = os.getenv("BOT_SIGNAL_BACKENDS", "rules,sentiment")
+SYNC_ACK_TIMEOUT = 5.0  # Ожидание ack перед сверкой портфеля, с
+executor = OrderExecutor(api)
+journal = TradeJournal()
+portfolio = Portfolio()  # Позиции и риск в памяти: pre-trade проверка без запроса к API
+grid = GridManager(api, executor)  # Лестница сетки по монете: повторный сигнал переставляет, а не добавляет ордера
 
-def run_bot():
-    while True:
-        try:
-            df = ml.fetch_historical_data(asset="BTC", interval="1h", lookback_hours=24)
-            if not df.empty:
-                df = ml.calculate_indicators(df)  # Уже в get_signal, но на всякий
-                signal = ml.get_signal(df)
-                logger.info(f"Сигнал: {signal}")
-                price = api.get_price("BTC")
-                if "BUY" in signal or "STRONG_BUY" in signal:
-                    qty = 0.008  # Позже dynamic из risk
-                    if "GRID_BUY" in signal:
-                        for i in range(3):  # 3 grid levels с шагами 1%
-                            grid_price = price * (1 + i * 0.01)
-                            result = api.place_order("BTC", is_buy=True, qty=qty/3, price=grid_price)  # Limit orders
-                            if result:
-                                logger.info(f"Grid BUY level {i+1}: {result}")
-                                asyncio.run(send_alert(f"Grid BUY level {i+1}: {result}"))
-                                with open("trades.log", "a") as f:
-                                    f.write(f"{time.ctime()},{result}\n")
-                    else:
-                        result = api.place_order("BTC", is_buy=True, qty=qty)
-                        if result:
-                            logger.info(f"BUY ордер: {result}")
-                            asyncio.run(send_alert(f"Автоматический BUY ордер: {result}"))
-                            with open("trades.log", "a") as f:
-                                f.write(f"{time.ctime()},{result}\n")
-                elif "SELL" in signal or "STRONG_SELL" in signal:
-                    qty = 0.008
-                    if "GRID_SELL" in signal:
-                        for i in range(3):
-                            grid_price = price * (1 - i * 0.01)  # -1% steps
-                            result = api.place_order("BTC", is_buy=False, qty=qty/3, price=grid_price)
-                            if result:
-                                logger.info(f"Grid SELL level {i+1}: {result}")
-                                asyncio.run(send_alert(f"Grid SELL level {i+1}: {result}"))
-                                with open("trades.log", "a") as f:
-                                    f.write(f"{time.ctime()},{result}\n")
-                    else:
-                        result = api.place_order("BTC", is_buy=False, qty=qty)
-                        if result:
-                            logger.info(f"SELL ордер: {result}")
-                            asyncio.run(send_alert(f"Автоматический SELL ордер: {result}"))
-                            with open("trades.log", "a") as f:
-                                f.write(f"{time.ctime()},{result}\n")
-                elif signal == "HOLD":
-                    logger.info("Сигнал HOLD, ничего не делаем")
+LABELS = {"grid_buy": "Grid BUY level", "grid_sell": "Grid SELL level",
+          "buy": "Автоматический BUY ордер", "sell": "Автоматический SELL ордер"}
+
+def on_order_ack(ack):
+    """Алерт и запись в журнал после подтверждения — в фоне, вне критического пути."""
+    journal.append_ack(ack)
+    if ack["status"] == "filled":
+        portfolio.on_fill(ack["coin"], ack["side"] == "buy", ack["filled_size"], ack["avg_px"])
+    if ack["status"] == "error":
+        logger.error("Ордер отклонён (%s): %s", ack["tag"], ack["response"])
+        return
+    label = LABELS.get(ack["tag"], ack["tag"])
+    if ack["tag"].startswith("grid"):
+        label = f"{label} {ack['level']}"
+    logger.info("%s: %s (%.0f ms)", label, ack["response"], ack["latency_ms"])
+    enqueue(f"{label}: {ack['response']}")  # Fire-and-forget в фоновый диспетчер
+
+executor.add_ack_hook(on_order_ack)
+
+def on_signal(job, signal, df):
+    """Ордер по сигналу стратегии сразу после закрытия свечи."""
+    logger.info("Сигнал %s/%s: %s", job.coin, job.interval, signal)
+    coin = job.coin
+    with metrics.span("price"):
+        price = api.get_price(coin)
+    portfolio.on_mid(coin, price)
+    if signal != "HOLD":
+        is_buy = "BUY" in signal
+        ok, reason = portfolio.pre_trade_check(coin, is_buy, 0.008, price)
+        if not ok:
+            logger.warning("Ордер %s %s отклонён риск-проверкой: %s", coin, signal, reason)
+            return
+    book = api.get_order_book(coin) if signal != "HOLD" else None  # None без WebSocket или при старом снимке
+    with metrics.span("submit"):
+        if "BUY" in signal or "STRONG_BUY" in signal:
+            qty = 0.008  # Позже dynamic из risk
+            if "GRID_BUY" in signal:
+                # 3 grid levels вниз от лучшего bid с шагом 1% (post-only) — сверка с уже стоящими ордерами сетки
+                anchor = (book.best_bid() if book is not None else None) or price
+                grid.set_ladder(coin, [(True, anchor * (1 - i * 0.01), qty / 3) for i in range(3)])
+                reconcile_grid(coin, "grid_buy", signal)
+            else:
+                submit_market(coin, True, qty, book, tag="buy", signal=signal)
+        elif "SELL" in signal or "STRONG_SELL" in signal:
+            qty = 0.008
+            if "GRID_SELL" in signal:
+                anchor = (book.best_ask() if book is not None else None) or price
+                grid.set_ladder(coin, [(False, anchor * (1 + i * 0.01), qty / 3) for i in range(3)])  # Вверх от ask
+                reconcile_grid(coin, "grid_sell", signal)
             else:
-                logger.warning("Нет данных для сигнала")
-            time.sleep(300)  # Проверка каждые 5 минут
-        except Exception as e:
-            logger.error(f"Ошибка в боте: {e}")
-            time.sleep(60)
+                submit_market(coin, False, qty, book, tag="sell", signal=signal)
+        elif signal == "HOLD":
+            logger.info("Сигнал HOLD, ничего не делаем")
+
+def reconcile_grid(coin, tag, signal):
+    """Только разница между лестницей и открытыми ордерами; отменённые уровни — в журнал."""
+    plan = grid.reconcile(coin, tag=tag, signal=signal)
+    for oid in (plan or {}).get("cancelled", []):
+        journal.append({"oid": oid, "coin": coin, "status": "cancelled", "tag": f"{tag}_cancel", "signal": signal})
+
+def submit_market(coin, is_buy, qty, book, tag, signal):
+    """Market-ордер: IoC-лимит по цене уровня стакана, покрывающего qty, вместо mid ± 5%."""
+    price = None
+    if book is not None:
+        snapshot = book.latest()  # Один снимок для оценки и цены
+        fill = book.slippage(is_buy, qty, snapshot)
+        log_pipeline.event(logger, "Оценка исполнения по стакану", coin=coin, spread_bps=book.spread(snapshot)[1],
+                           avg_px=fill["avg_px"], slippage_bps=fill["slippage_bps"], complete=fill["complete"])
+        price = book.limit_price(is_buy, qty, snapshot)
+    executor.submit(coin, is_buy=is_buy, qty=qty, price=price, tif="Ioc" if price is not None else None,
+                    tag=tag, signal=signal)
+
+def build_jobs(markets=MARKETS):
+    """Задачи планировщика по BOT_MARKETS: по MLStrategy на каждый (coin, interval)."""
+    jobs = []
+    for spec in markets.split(","):
+        parts = spec.strip().split(":")
+        coin, interval = parts[0], parts[1] if len(parts) > 1 else "1h"
+        every = int(parts[2]) if len(parts) > 2 else 1
+        strategy = MLStrategy(testnet=True, grid_mode=False, backends=BACKENDS)
+        jobs.append(StrategyJob(f"bot_{coin}_{interval}", strategy, coin=coin, interval=interval, every=every,
+                                lookback_hours=24, on_signal=on_signal))
+    return jobs
+
+def sync_portfolio():
+    """Сверка с user_state биржи (источник истины); между сверками — по fill и mid."""
+    # Сначала дорабатывают хуки ack: on_fill после загрузки снимка посчитал бы то же исполнение дважды
+    if not executor.wait_idle(timeout=SYNC_ACK_TIMEOUT):
+        logger.warning("Сверка портфеля: не все ack обработаны, возможен двойной учёт исполнения")
+    try:
+        portfolio.load_user_state(api.account_state.snapshot())
+    except Exception as e:
+        logger.error(f"Ошибка синхронизации портфеля: {e}")
+
+def after_tick():
+    sync_portfolio()
+    logger.info("Риск портфеля: %s", portfolio.snapshot())
+    logger.info("Латентность ордеров submit->ack: %s", executor.latency_stats())
+    logger.info("Ожидание лимита запросов: %s", api.rate_limit_stats())
+    metrics.dump()  # Файл METRICS_DUMP, если задан
+
+def run_bot():
+    metrics.start_http_server()  # /metrics и /traces на METRICS_PORT
+    # Оценка на закрытии каждой свечи вместо опроса раз в 5 минут
+    sync_portfolio()
+    scheduler = CandleScheduler(build_jobs())
+    scheduler.run_forever(after_tick=after_tick)
 
 if __name__ == '__main__':
     run_bot()
@@ -0,0 +1,335 @@
+import os
+import json
+import fcntl
+import argparse
+import logging
+import log_pipeline
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Колонки хранятся раздельно (columnar): по одному бинарному файлу на колонку
+COLUMNS = ("time", "open", "high", "low", "close", "volume")
+DTYPES = {"time": np.int64, "open": np.float64, "high": np.float64,
+          "low": np.float64, "close": np.float64, "volume": np.float64}
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "8h": 28_800_000, "12h": 43_200_000,
+    "1d": 86_400_000, "3d": 259_200_000, "1w": 604_800_000, "1M": 2_592_000_000,
+}
+MAX_CANDLES_PER_REQUEST = 5000  # Лимит candleSnapshot у Hyperliquid
+
+
+def candles_to_arrays(candles):
+    """Сырые свечи candle_snapshot (dict с t/o/h/l/c/v или списки) -> dict numpy-колонок."""
+    if not candles:
+        return {col: np.empty(0, dtype=DTYPES[col]) for col in COLUMNS}
+    if isinstance(candles[0], dict):
+        keys = ("t", "o", "h", "l", "c", "v")
+        rows = [[c[k] for k in keys] for c in candles]
+    else:
+        rows = [list(c)[:6] for c in candles]
+    raw = np.asarray(rows, dtype=np.float64)
+    arrays = {col: raw[:, i].astype(DTYPES[col]) for i, col in enumerate(COLUMNS)}
+    return _dedupe(arrays)
+
+
+def arrays_to_frame(arrays):
+    """DataFrame поверх numpy-колонок без копирования данных."""
+    return pd.DataFrame({col: arrays[col] for col in COLUMNS}, copy=False)
+
+
+class CandleStore:
+    """Локальное хранилище свечей (coin, interval) с memory-mapped колонками и догрузкой недостающих диапазонов."""
+
+    def __init__(self, api=None, root=None):
+        self.api = api
+        self.root = root or os.getenv("CANDLE_STORE_DIR", "candles")
+
+    def _dir(self, coin, interval):
+        return os.path.join(self.root, coin, interval)
+
+    def _path(self, coin, interval, column):
+        return os.path.join(self._dir(coin, interval), f"{column}.bin")
+
+    def _meta_path(self, coin, interval):
+        return os.path.join(self._dir(coin, interval), "meta.json")
+
+    def _read_meta(self, coin, interval):
+        try:
+            with open(self._meta_path(coin, interval)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_meta(self, coin, interval, meta):
+        tmp = self._meta_path(coin, interval) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(coin, interval))
+
+    def _lock(self, coin, interval):
+        os.makedirs(self._dir(coin, interval), exist_ok=True)
+        lock_file = open(os.path.join(self._dir(coin, interval), ".lock"), "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def keys(self):
+        """Список сохранённых пар (coin, interval)."""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for coin in sorted(os.listdir(self.root)):
+            coin_dir = os.path.join(self.root, coin)
+            if not os.path.isdir(coin_dir):
+                continue
+            for interval in sorted(os.listdir(coin_dir)):
+                if os.path.exists(self._path(coin, interval, "time")):
+                    result.append((coin, interval))
+        return result
+
+    def load(self, coin, interval):
+        """Все свечи пары как read-only memmap-колонки (без чтения в память)."""
+        lengths = []
+        for col in COLUMNS:
+            path = self._path(coin, interval, col)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // np.dtype(DTYPES[col]).itemsize)
+        n = min(lengths)
+        if n == 0:
+            return {col: np.empty(0, dtype=DTYPES[col]) for col in COLUMNS}
+        # Длина по самой короткой колонке: защищает от чтения посреди записи
+        return {col: np.memmap(self._path(coin, interval, col), dtype=DTYPES[col], mode="r", shape=(n,))
+                for col in COLUMNS}
+
+    def window(self, coin, interval, start_time=None, end_time=None):
+        """Срез [start_time, end_time] в ms как zero-copy view на memmap."""
+        arrays = self.load(coin, interval)
+        times = arrays["time"]
+        lo = 0 if start_time is None else int(np.searchsorted(times, start_time, side="left"))
+        hi = len(times) if end_time is None else int(np.searchsorted(times, end_time, side="right"))
+        return {col: arr[lo:hi] for col, arr in arrays.items()}
+
+    def frame(self, coin="BTC", interval="1h", start_time=None, end_time=None, sync=True):
+        """DataFrame окна (time в ms); при sync=True сначала догружает недостающие свечи."""
+        if sync and self.api is not None and start_time is not None and end_time is not None:
+            self.sync(coin, interval, start_time, end_time)
+        return arrays_to_frame(self.window(coin, interval, start_time, end_time))
+
+    def sync(self, coin, interval, start_time, end_time):
+        """Догрузить из API только отсутствующие диапазоны и слить их в хранилище.
+
+        Диапазон считается покрытым, только если биржа ответила (свечами или пустым списком):
+        после ошибки запроса covered_from не сдвигается и дыра перезапрашивается при следующей
+        синхронизации. Пропуски между сохранёнными свечами внутри окна тоже догружаются;
+        подтверждённо пустые (биржа вернула []) запоминаются в meta["empty"].
+        """
+        lock_file = self._lock(coin, interval)
+        try:
+            meta = self._read_meta(coin, interval)
+            times = self.load(coin, interval)["time"]
+            fetched = 0
+            if len(times) == 0:
+                fresh, complete = self._fetch(coin, interval, start_time, end_time)
+                if len(fresh["time"]):
+                    self._write(coin, interval, fresh)
+                if complete:
+                    meta["covered_from"] = start_time
+                fetched += len(fresh["time"])
+            else:
+                covered_from = meta.get("covered_from", int(times[0]))
+                if start_time < covered_from:
+                    older, complete = self._fetch(coin, interval, start_time, covered_from - 1)
+                    if len(older["time"]):
+                        self._merge(coin, interval, older)
+                    if complete:
+                        meta["covered_from"] = start_time
+                    fetched += len(older["time"])
+                fetched += self._fill_gaps(coin, interval, meta, start_time, end_time)
+                last_time = int(self.load(coin, interval)["time"][-1])
+                if end_time >= last_time:
+                    # Последняя сохранённая свеча могла быть незакрытой — перезапрашиваем с неё
+                    newer, _ = self._fetch(coin, interval, last_time, end_time)
+                    if len(newer["time"]):
+                        self._append(coin, interval, newer)
+                    fetched += len(newer["time"])
+            self._write_meta(coin, interval, meta)
+            if fetched:
+                logger.info("Хранилище свечей %s/%s: догружено %s свечей", coin, interval, fetched)
+            return fetched
+        finally:
+            lock_file.close()
+
+    def gaps(self, coin, interval, start_time=None, end_time=None, meta=None):
+        """Пропуски [from, to] между сохранёнными свечами окна, кроме подтверждённо пустых."""
+        step = INTERVAL_MS.get(interval, 3_600_000)
+        times = self.load(coin, interval)["time"]
+        # Плюс свеча до окна: пропуск, начинающийся раньше start_time, тоже попадает в окно
+        lo = 0 if start_time is None else max(int(np.searchsorted(times, start_time, side="left")) - 1, 0)
+        hi = len(times) if end_time is None else int(np.searchsorted(times, end_time, side="right"))
+        times = times[lo:hi]
+        empty = (meta if meta is not None else self._read_meta(coin, interval)).get("empty", [])
+        holes = []
+        for i in np.flatnonzero(np.diff(times) > step):
+            hole_from, hole_to = int(times[i]) + step, int(times[i + 1]) - 1
+            if start_time is not None:
+                hole_from = max(hole_from, start_time)
+            if end_time is not None:
+                hole_to = min(hole_to, end_time)
+            if hole_from <= hole_to and not any(a <= hole_from and hole_to <= b for a, b in empty):
+                holes.append((hole_from, hole_to))
+        return holes
+
+    def _fill_gaps(self, coin, interval, meta, start_time, end_time):
+        fetched = 0
+        for lo, hi in self.gaps(coin, interval, start_time, end_time, meta):
+            arrays, complete = self._fetch(coin, interval, lo, hi)
+            if len(arrays["time"]):
+                self._merge(coin, interval, arrays)
+                fetched += len(arrays["time"])
+            elif complete:
+                meta.setdefault("empty", []).append([lo, hi])  # Биржа подтвердила: свечей нет
+        if fetched:
+            logger.info("Хранилище свечей %s/%s: закрыто пропусков на %s свечей", coin, interval, fetched)
+        return fetched
+
+    def _fetch(self, coin, interval, start_time, end_time):
+        """Постраничная загрузка свечей через HyperliquidAPI.get_candles: (свечи, complete).
+
+        Пустая страница — подтверждение, что свечей в ней нет. На ошибке запроса загрузка
+        останавливается (complete=False), чтобы отдать только непрерывный кусок от start_time.
+        """
+        step = INTERVAL_MS.get(interval, 3_600_000)
+        chunks = []
+        complete = True
+        cursor = start_time
+        while cursor <= end_time:
+            chunk_end = min(end_time, cursor + MAX_CANDLES_PER_REQUEST * step - 1)
+            candles = self.api.get_candles(coin=coin, interval=interval, start_time=cursor, end_time=chunk_end)
+            if candles is None:
+                logger.warning("Свечи %s/%s с %s не получены, диапазон останется непокрытым", coin, interval, cursor)
+                complete = False
+                break
+            arrays = candles_to_arrays(candles)
+            if len(arrays["time"]):
+                chunks.append(arrays)
+                cursor = int(arrays["time"][-1]) + step
+            else:
+                cursor = chunk_end + 1
+        if not chunks:
+            return candles_to_arrays([]), complete
+        if len(chunks) == 1:
+            return chunks[0], complete
+        merged = {col: np.concatenate([c[col] for c in chunks]) for col in COLUMNS}
+        return _dedupe(merged), complete
+
+    def _write(self, coin, interval, arrays):
+        """Полная атомарная перезапись колонок."""
+        os.makedirs(self._dir(coin, interval), exist_ok=True)
+        for col in COLUMNS:
+            path = self._path(coin, interval, col)
+            np.ascontiguousarray(arrays[col], dtype=DTYPES[col]).tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+    def _append(self, coin, interval, arrays):
+        """Дописать новые свечи в хвост, заменив пересекающиеся записи на месте."""
+        times = self.load(coin, interval)["time"]
+        first_new = int(arrays["time"][0])
+        if len(times) and first_new <= int(times[0]):
+            self._merge(coin, interval, arrays)
+            return
+        offset = int(np.searchsorted(times, first_new, side="left"))
+        replaced = len(times) - offset
+        for col in COLUMNS:
+            itemsize = np.dtype(DTYPES[col]).itemsize
+            path = self._path(coin, interval, col)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(offset * itemsize)
+                f.write(np.ascontiguousarray(arrays[col], dtype=DTYPES[col]).tobytes())
+                if len(arrays[col]) < replaced:
+                    f.truncate((offset + len(arrays[col])) * itemsize)
+
+    def _merge(self, coin, interval, arrays):
+        """Слить произвольный диапазон с уже сохранёнными данными (с перезаписью файлов)."""
+        current = self.load(coin, interval)
+        merged = {col: np.concatenate([np.asarray(current[col]), arrays[col]]) for col in COLUMNS}
+        self._write(coin, interval, _dedupe(merged))
+
+    def compact(self, coin, interval):
+        """Отсортировать, удалить дубликаты и перезаписать колонки пары."""
+        lock_file = self._lock(coin, interval)
+        try:
+            current = self.load(coin, interval)
+            before = len(current["time"])
+            compacted = _dedupe({col: np.array(current[col]) for col in COLUMNS})
+            del current
+            self._write(coin, interval, compacted)
+            logger.info(f"Компактизация {coin}/{interval}: {before} -> {len(compacted['time'])} свечей")
+            return before - len(compacted["time"])
+        finally:
+            lock_file.close()
+
+
+def _dedupe(arrays):
+    """Стабильная сортировка по времени; при дубликатах остаётся последняя запись."""
+    times = arrays["time"]
+    order = np.argsort(times, kind="stable")
+    sorted_times = times[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = sorted_times[1:] != sorted_times[:-1]
+    idx = order[keep]
+    return {col: arr[idx] for col, arr in arrays.items()}
+
+
+def _parse_ts(value):
+    return int(datetime.strptime(value, "%Y-%m-%d").timestamp() * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальное хранилище свечей Hyperliquid")
+    parser.add_argument("--root", default=None, help="Каталог хранилища (по умолчанию CANDLE_STORE_DIR или ./candles)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    backfill = sub.add_parser("backfill", help="Догрузить свечи за период")
+    backfill.add_argument("coins", nargs="+")
+    backfill.add_argument("--interval", default="1h")
+    backfill.add_argument("--start", default=os.getenv("BACKTESTING_START", "2025-01-01"))
+    backfill.add_argument("--end", default=os.getenv("BACKTESTING_END", datetime.now().strftime("%Y-%m-%d")))
+
+    compact = sub.add_parser("compact", help="Сортировка и удаление дубликатов")
+    compact.add_argument("coins", nargs="*")
+    compact.add_argument("--interval", default=None)
+
+    sub.add_parser("info", help="Показать содержимое хранилища")
+
+    args = parser.parse_args(argv)
+    log_pipeline.configure()
+
+    if args.command == "backfill":
+        from api_interface import get_api
+        store = CandleStore(get_api(), args.root)
+        for coin in args.coins:
+            fetched = store.sync(coin, args.interval, _parse_ts(args.start), _parse_ts(args.end))
+            print(f"{coin}/{args.interval}: догружено {fetched} свечей")
+    elif args.command == "compact":
+        store = CandleStore(root=args.root)
+        for coin, interval in store.keys():
+            if (args.coins and coin not in args.coins) or (args.interval and interval != args.interval):
+                continue
+            removed = store.compact(coin, interval)
+            print(f"{coin}/{interval}: удалено {removed} дубликатов")
+    else:
+        store = CandleStore(root=args.root)
+        for coin, interval in store.keys():
+            times = store.load(coin, interval)["time"]
+            if len(times):
+                first = pd.to_datetime(int(times[0]), unit="ms")
+                last = pd.to_datetime(int(times[-1]), unit="ms")
+                print(f"{coin}/{interval}: {len(times)} свечей, {first} — {last}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,551 @@
+import os
+import sys
+import time
+import argparse
+import logging
+import log_pipeline
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from candle_store import CandleStore, INTERVAL_MS
+from resampler import resample
+
+logger = logging.getLogger(__name__)
+
+SIM_ADDRESS = "0x000000000000000000000000000000000000dead"
+DEFAULT_SZ_DECIMALS = {"BTC": 5, "ETH": 4, "SOL": 2}
+CANCEL_ERROR = "Order was never placed, already canceled, or filled."
+
+
+class ReplayFinished(BaseException):
+    """Виртуальное время дошло до конца записанных свечей (BaseException: циклы бота его не глотают)."""
+
+
+class VirtualClock:
+    """Виртуальное время реплея: sleep() в управляющем потоке мгновенно сдвигает время."""
+
+    def __init__(self, start_ms, end_ms=None):
+        self.now_ms = int(start_ms)
+        self.end_ms = end_ms
+        self.driver = None
+        self._listeners = []
+        self._barriers = []
+        self._real_time = time.time
+        self._real_sleep = time.sleep
+
+    def time(self):
+        return self.now_ms / 1000
+
+    def add_listener(self, callback):
+        """callback(now_ms) после каждого сдвига времени (симулятор матчит ордера и начисляет funding)."""
+        self._listeners.append(callback)
+
+    def add_barrier(self, callback):
+        """callback() перед сдвигом времени: дождаться фоновой работы (ack ордеров), чтобы реплей был детерминированным."""
+        self._barriers.append(callback)
+
+    def advance(self, seconds):
+        for barrier in self._barriers:
+            barrier()
+        self.now_ms += int(round(seconds * 1000))
+        for callback in self._listeners:
+            callback(self.now_ms)
+        if self.end_ms is not None and self.now_ms >= self.end_ms:
+            raise ReplayFinished()
+
+    def sleep(self, seconds):
+        if threading.current_thread() is self.driver:
+            self.advance(seconds)
+        else:
+            self._real_sleep(seconds)  # Фоновые потоки (исполнитель, алерты) спят по-настоящему
+
+    @contextmanager
+    def patch(self, *datetime_modules):
+        """Подменить time.time/time.sleep и datetime.now в модулях datetime_modules на виртуальные."""
+        clock = self
+
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.fromtimestamp(clock.time(), tz)
+
+        self.driver = threading.current_thread()
+        saved = [(module, module.datetime) for module in datetime_modules]
+        time.time, time.sleep = self.time, self.sleep
+        for module in datetime_modules:
+            module.datetime = VirtualDatetime
+        try:
+            yield self
+        finally:
+            time.time, time.sleep = self._real_time, self._real_sleep
+            for module, original in saved:
+                module.datetime = original
+
+
+class SimulatedExchange:
+    """Локальная биржа по записанным свечам: матчинг, позиции, cross-маржа и funding на виртуальном времени.
+
+    Mid — close последней закрытой базовой свечи, bid/ask — mid -+ spread/2. Рыночные и
+    пересекающие лимитные ордера исполняются сразу как taker; остальные GTC ждут свечу,
+    чей high/low дотянулся до цены, и исполняются как maker (по open, если был гэп).
+    Funding начисляется каждый час по mark-цене.
+    """
+
+    def __init__(self, candles, clock, base_interval="1m", initial_balance=10_000.0, leverage=20,
+                 funding_rate=0.0000125, taker_fee=0.00035, maker_fee=0.0001, spread=0.0001,
+                 maintenance_ratio=0.5, sz_decimals=None, address=SIM_ADDRESS):
+        self.candles = {coin: {k: np.asarray(v) for k, v in arrays.items()} for coin, arrays in candles.items()}
+        self.clock = clock
+        self.base_interval = base_interval
+        self.step = INTERVAL_MS[base_interval]
+        self.leverage = leverage
+        self.funding_rate = funding_rate
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.spread = spread
+        self.maintenance_ratio = maintenance_ratio
+        self.address = address
+        self.coins = list(self.candles)
+        self.asset_to_sz_decimals = {i: (sz_decimals or DEFAULT_SZ_DECIMALS).get(coin, 3)
+                                     for i, coin in enumerate(self.coins)}
+        self.cash = float(initial_balance)
+        self.initial_balance = float(initial_balance)
+        self.positions = {}  # coin -> {"szi", "entry_px", "funding"}
+        self.orders = {}  # oid -> resting order
+        self.fills = []
+        self.funding_paid = 0.0
+        self.liquidations = 0
+        self._next_oid = 1
+        self._resampled = {}
+        self._lock = threading.RLock()
+        self._last_now = clock.now_ms
+        self.info = SimInfo(self)
+        self.exchange = SimExchangeClient(self)
+        clock.add_listener(self.advance_to)
+
+    # --- рыночные данные ---
+
+    def _series(self, coin, interval):
+        if interval == self.base_interval:
+            return self.candles[coin]
+        key = (coin, interval)
+        if key not in self._resampled:
+            self._resampled[key] = resample(self.candles[coin], INTERVAL_MS[interval])
+        return self._resampled[key]
+
+    def _last_closed(self, coin, now_ms=None):
+        """Индекс последней базовой свечи, закрытой к now_ms (-1, если ещё нет)."""
+        now_ms = self.clock.now_ms if now_ms is None else now_ms
+        return int(np.searchsorted(self.candles[coin]["time"] + self.step, now_ms, side="right")) - 1
+
+    def mid(self, coin, now_ms=None):
+        idx = self._last_closed(coin, now_ms)
+        if idx < 0:
+            return float(self.candles[coin]["open"][0]) if len(self.candles[coin]["open"]) else None
+        return float(self.candles[coin]["close"][idx])
+
+    def candle_snapshot(self, coin, interval, start_ms, end_ms):
+        """Только закрытые к виртуальному now свечи: будущее стратегии недоступно."""
+        if coin not in self.candles:
+            return []
+        series = self._series(coin, interval)
+        step = INTERVAL_MS[interval]
+        end_ms = min(end_ms, self.clock.now_ms - step)
+        lo = int(np.searchsorted(series["time"], start_ms, side="left"))
+        hi = int(np.searchsorted(series["time"], end_ms, side="right"))
+        return [{"t": int(series["time"][i]), "T": int(series["time"][i]) + step - 1, "s": coin, "i": interval,
+                 "o": str(series["open"][i]), "h": str(series["high"][i]), "l": str(series["low"][i]),
+                 "c": str(series["close"][i]), "v": str(series["volume"][i]), "n": 0}
+                for i in range(lo, hi)]
+
+    # --- счёт ---
+
+    def _unrealized(self, now_ms=None):
+        return sum((self.mid(coin, now_ms) - p["entry_px"]) * p["szi"] for coin, p in self.positions.items())
+
+    def account_value(self, now_ms=None):
+        return self.cash + self._unrealized(now_ms)
+
+    def margin_used(self, now_ms=None, extra=None):
+        notional = {coin: abs(p["szi"]) * self.mid(coin, now_ms) for coin, p in self.positions.items()}
+        if extra:
+            coin, szi = extra
+            notional[coin] = abs(szi) * self.mid(coin, now_ms)
+        return sum(notional.values()) / self.leverage
+
+    def _liquidation_px(self, coin, position):
+        szi, lev = position["szi"], self.leverage
+        others = self.cash + sum((self.mid(c) - p["entry_px"]) * p["szi"] for c, p in self.positions.items() if c != coin)
+        denominator = szi - self.maintenance_ratio * abs(szi) / lev
+        if denominator == 0:
+            return None
+        px = (position["entry_px"] * szi - others) / denominator
+        return px if px > 0 else None
+
+    def user_state(self):
+        with self._lock:
+            asset_positions = []
+            total_ntl = 0.0
+            for coin, p in self.positions.items():
+                mark = self.mid(coin)
+                value = abs(p["szi"]) * mark
+                total_ntl += value
+                unrealized = (mark - p["entry_px"]) * p["szi"]
+                liq = self._liquidation_px(coin, p)
+                asset_positions.append({"type": "oneWay", "position": {
+                    "coin": coin,
+                    "szi": str(p["szi"]),
+                    "entryPx": str(p["entry_px"]),
+                    "positionValue": str(value),
+                    "unrealizedPnl": str(unrealized),
+                    "returnOnEquity": str(unrealized / (abs(p["szi"]) * p["entry_px"] / self.leverage)),
+                    "liquidationPx": str(liq) if liq is not None else None,
+                    "leverage": {"type": "cross", "value": self.leverage},
+                    "marginUsed": str(value / self.leverage),
+                    "maxLeverage": 50,
+                    "cumFunding": {"allTime": str(p["funding"]), "sinceOpen": str(p["funding"]),
+                                   "sinceChange": str(p["funding"])},
+                }})
+            account_value = self.account_value()
+            margin_used = self.margin_used()
+            summary = {"accountValue": str(account_value), "totalNtlPos": str(total_ntl),
+                       "totalRawUsd": str(self.cash), "totalMarginUsed": str(margin_used)}
+            return {
+                "assetPositions": asset_positions,
+                "marginSummary": summary,
+                "crossMarginSummary": summary,
+                "crossMaintenanceMarginUsed": str(margin_used * self.maintenance_ratio),
+                "withdrawable": str(max(0.0, account_value - margin_used)),
+                "time": self.clock.now_ms,
+            }
+
+    def open_orders(self):
+        with self._lock:
+            return [{"coin": o["coin"], "limitPx": str(o["limit_px"]), "oid": oid, "side": "B" if o["is_buy"] else "A",
+                     "sz": str(o["sz"]), "origSz": str(o["orig_sz"]), "timestamp": o["timestamp"],
+                     "reduceOnly": o["reduce_only"]} for oid, o in self.orders.items()]
+
+    # --- ордера ---
+
+    def place(self, order):
+        """Один OrderRequest SDK -> статус в формате ответа /exchange."""
+        with self._lock:
+            coin = order["coin"]
+            if coin not in self.candles:
+                return {"error": f"Unknown asset {coin}"}
+            is_buy, sz, limit_px = order["is_buy"], float(order["sz"]), float(order["limit_px"])
+            tif = order.get("order_type", {}).get("limit", {}).get("tif", "Gtc")
+            if order.get("reduce_only"):
+                sz = min(sz, self._reducible(coin, is_buy))
+            if sz <= 0:
+                return {"error": "Reduce only order would increase position."}
+            mid = self.mid(coin)
+            touch = mid * (1 + self.spread / 2) if is_buy else mid * (1 - self.spread / 2)
+            crosses = limit_px >= touch if is_buy else limit_px <= touch
+            if tif == "Alo" and crosses:
+                return {"error": "Post only order would have immediately matched, bbo was "
+                                 f"{mid * (1 - self.spread / 2)}@{mid * (1 + self.spread / 2)}."}
+            if not self._margin_ok(coin, is_buy, sz):
+                return {"error": f"Insufficient margin to place order. asset={self.coins.index(coin)}"}
+            oid = self._next_oid
+            self._next_oid += 1
+            if crosses:
+                self._fill(coin, is_buy, sz, touch, self.taker_fee, oid)
+                return {"filled": {"totalSz": str(sz), "avgPx": str(touch), "oid": oid}}
+            if tif == "Ioc":
+                return {"error": "Order could not immediately match against any resting orders. "
+                                 f"asset={self.coins.index(coin)}"}
+            self.orders[oid] = {"coin": coin, "is_buy": is_buy, "sz": sz, "orig_sz": sz, "limit_px": limit_px,
+                                "reduce_only": bool(order.get("reduce_only")), "timestamp": self.clock.now_ms}
+            return {"resting": {"oid": oid}}
+
+    def cancel(self, coin, oid):
+        with self._lock:
+            order = self.orders.get(oid)
+            if order is None or order["coin"] != coin:
+                return {"error": CANCEL_ERROR}
+            del self.orders[oid]
+            return "success"
+
+    def modify(self, oid, order):
+        """Изменить цену/размер резервного ордера (новый oid, как при cancel+place)."""
+        with self._lock:
+            if oid not in self.orders or self.orders[oid]["coin"] != order["coin"]:
+                return {"error": "Cannot modify canceled or filled order"}
+            del self.orders[oid]
+            return self.place(order)
+
+    def _reducible(self, coin, is_buy):
+        szi = self.positions.get(coin, {}).get("szi", 0.0)
+        return max(0.0, -szi if is_buy else szi)
+
+    def _margin_ok(self, coin, is_buy, sz):
+        szi = self.positions.get(coin, {}).get("szi", 0.0) + (sz if is_buy else -sz)
+        if abs(szi) <= abs(self.positions.get(coin, {}).get("szi", 0.0)):
+            return True  # Сокращение позиции маржу не требует
+        return self.margin_used(extra=(coin, szi)) <= self.account_value()
+
+    def _fill(self, coin, is_buy, sz, px, fee_rate, oid):
+        position = self.positions.setdefault(coin, {"szi": 0.0, "entry_px": 0.0, "funding": 0.0})
+        szi = position["szi"]
+        delta = sz if is_buy else -sz
+        closed_pnl = 0.0
+        if szi == 0 or (szi > 0) == (delta > 0):
+            position["entry_px"] = (position["entry_px"] * abs(szi) + px * sz) / (abs(szi) + sz)
+        else:
+            closed = min(abs(szi), sz)
+            closed_pnl = (px - position["entry_px"]) * closed * (1 if szi > 0 else -1)
+            if sz > abs(szi):
+                position["entry_px"] = px  # Переворот: остаток открыт по цене сделки
+        position["szi"] = round(szi + delta, 10)
+        fee = sz * px * fee_rate
+        self.cash += closed_pnl - fee
+        if position["szi"] == 0:
+            del self.positions[coin]
+        self.fills.append({"coin": coin, "px": px, "sz": sz, "side": "B" if is_buy else "A", "time": self.clock.now_ms,
+                           "oid": oid, "fee": fee, "closedPnl": closed_pnl, "startPosition": szi,
+                           "crossed": fee_rate == self.taker_fee})
+
+    # --- течение времени ---
+
+    def advance_to(self, now_ms):
+        """Исполнить резервные ордера по свечам, закрывшимся в (prev, now], начислить funding, проверить ликвидацию."""
+        with self._lock:
+            prev = self._last_now
+            self._last_now = now_ms
+            if now_ms <= prev:
+                return
+            self._match_resting(prev, now_ms)
+            self._apply_funding(prev, now_ms)
+            self._check_liquidation(now_ms)
+
+    def _match_resting(self, prev, now_ms):
+        hits = []
+        for oid, order in self.orders.items():
+            arrays = self.candles[order["coin"]]
+            lo = self._last_closed(order["coin"], prev) + 1
+            hi = self._last_closed(order["coin"], now_ms) + 1
+            if hi <= lo:
+                continue
+            touched = arrays["low"][lo:hi] <= order["limit_px"] if order["is_buy"] else \
+                arrays["high"][lo:hi] >= order["limit_px"]
+            if touched.any():
+                idx = lo + int(np.argmax(touched))
+                hits.append((int(arrays["time"][idx]), oid, idx))
+        for _, oid, idx in sorted(hits):
+            order = self.orders.pop(oid)
+            open_px = float(self.candles[order["coin"]]["open"][idx])
+            px = min(order["limit_px"], open_px) if order["is_buy"] else max(order["limit_px"], open_px)
+            sz = min(order["sz"], self._reducible(order["coin"], order["is_buy"])) if order["reduce_only"] else order["sz"]
+            if sz > 0:
+                self._fill(order["coin"], order["is_buy"], sz, px, self.maker_fee, oid)
+
+    def _apply_funding(self, prev, now_ms):
+        hour = 3_600_000
+        for boundary in range((prev // hour + 1) * hour, now_ms + 1, hour):
+            for coin, position in self.positions.items():
+                payment = position["szi"] * self.mid(coin, boundary) * self.funding_rate  # Лонги платят при rate > 0
+                position["funding"] += payment
+                self.cash -= payment
+                self.funding_paid += payment
+
+    def _check_liquidation(self, now_ms):
+        if not self.positions:
+            return
+        if self.account_value(now_ms) < self.margin_used(now_ms) * self.maintenance_ratio:
+            logger.warning(f"Ликвидация: account_value={self.account_value(now_ms):.2f}")
+            self.liquidations += 1
+            for coin, position in list(self.positions.items()):
+                self._fill(coin, position["szi"] < 0, abs(position["szi"]), self.mid(coin, now_ms), self.taker_fee, 0)
+            self.orders.clear()
+
+    def summary(self):
+        with self._lock:
+            account_value = self.account_value()
+            return {"account_value": account_value, "return": account_value / self.initial_balance - 1,
+                    "fills": len(self.fills), "fees": sum(f["fee"] for f in self.fills),
+                    "funding_paid": self.funding_paid, "liquidations": self.liquidations,
+                    "open_orders": len(self.orders),
+                    "positions": {coin: p["szi"] for coin, p in self.positions.items()}}
+
+
+class SimInfo:
+    """Поверхность hyperliquid.info.Info, которой пользуется HyperliquidAPI."""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.asset_to_sz_decimals = sim.asset_to_sz_decimals
+        self.coin_to_asset = {coin: i for i, coin in enumerate(sim.coins)}
+
+    def name_to_asset(self, name):
+        return self.coin_to_asset[name]
+
+    def candles_snapshot(self, name, interval, startTime, endTime):
+        return self.sim.candle_snapshot(name, interval, startTime, endTime)
+
+    def all_mids(self):
+        return {coin: str(self.sim.mid(coin)) for coin in self.sim.coins}
+
+    def user_state(self, address):
+        return self.sim.user_state()
+
+    def open_orders(self, address):
+        return self.sim.open_orders()
+
+    def user_fills(self, address):
+        return list(self.sim.fills)
+
+    def meta(self):
+        return {"universe": [{"name": coin, "szDecimals": self.asset_to_sz_decimals[i], "maxLeverage": 50}
+                             for i, coin in enumerate(self.sim.coins)]}
+
+    def meta_and_asset_ctxs(self):
+        ctxs = [{"funding": str(self.sim.funding_rate), "markPx": str(self.sim.mid(coin)),
+                 "midPx": str(self.sim.mid(coin))} for coin in self.sim.coins]
+        return self.meta(), ctxs
+
+
+class SimExchangeClient:
+    """Поверхность hyperliquid.exchange.Exchange: ответы в формате /exchange."""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.info = sim.info
+        self.account_address = sim.address
+
+    @staticmethod
+    def _response(kind, statuses):
+        return {"status": "ok", "response": {"type": kind, "data": {"statuses": statuses}}}
+
+    def bulk_orders(self, order_requests, builder=None, grouping="na"):
+        return self._response("order", [self.sim.place(order) for order in order_requests])
+
+    def order(self, name, is_buy, sz, limit_px, order_type, reduce_only=False, cloid=None, builder=None):
+        return self.bulk_orders([{"coin": name, "is_buy": is_buy, "sz": sz, "limit_px": limit_px,
+                                  "order_type": order_type, "reduce_only": reduce_only}])
+
+    def market_open(self, name, is_buy, sz, px=None, slippage=0.05, cloid=None, builder=None):
+        mid = px or self.sim.mid(name)
+        limit_px = mid * (1 + slippage) if is_buy else mid * (1 - slippage)
+        return self.order(name, is_buy, sz, limit_px, {"limit": {"tif": "Ioc"}})
+
+    def market_close(self, coin, sz=None, px=None, slippage=0.05, cloid=None, builder=None):
+        szi = self.sim.positions.get(coin, {}).get("szi", 0.0)
+        if not szi:
+            return None
+        mid = px or self.sim.mid(coin)
+        limit_px = mid * (1 - slippage) if szi > 0 else mid * (1 + slippage)
+        return self.order(coin, szi < 0, sz or abs(szi), limit_px, {"limit": {"tif": "Ioc"}}, reduce_only=True)
+
+    def cancel(self, name, oid):
+        return self.bulk_cancel([{"coin": name, "oid": oid}])
+
+    def bulk_cancel(self, cancel_requests):
+        return self._response("cancel", [self.sim.cancel(c["coin"], c["oid"]) for c in cancel_requests])
+
+    def modify_order(self, oid, name, is_buy, sz, limit_px, order_type, reduce_only=False, cloid=None):
+        return self.bulk_modify_orders_new([{"oid": oid, "order": {
+            "coin": name, "is_buy": is_buy, "sz": sz, "limit_px": limit_px, "order_type": order_type,
+            "reduce_only": reduce_only}}])
+
+    def bulk_modify_orders_new(self, modify_requests):
+        return self._response("order", [self.sim.modify(m["oid"], m["order"]) for m in modify_requests])
+
+
+def load_candles(coins, interval, start_ms, end_ms, root=None, api=None):
+    """Записанные свечи из CandleStore (без api — только то, что уже лежит локально)."""
+    store = CandleStore(api, root)
+    candles = {}
+    for coin in coins:
+        frame = store.frame(coin=coin, interval=interval, start_time=start_ms, end_time=end_ms, sync=api is not None)
+        candles[coin] = {col: frame[col].to_numpy() for col in frame.columns}
+    return candles
+
+
+def install(sim):
+    """Сделать симулятор общим API процесса: get_api() в боте и стратегии вернёт клиента симулятора."""
+    import api_interface
+    api = api_interface.HyperliquidAPI(info_client=sim.info, exchange_client=sim.exchange)
+    with api_interface._registry_lock:
+        api_interface._api = api
+    return api
+
+
+def replay_bot(sim, clock, workdir=None):
+    """Прогнать неизменённый bot.run_bot на виртуальном времени до конца свечей; итог — sim.summary().
+
+    Без workdir хранилища реплея живут во временном каталоге, который удаляется после прогона.
+    """
+    temporary = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="replay_")
+    # Реплей не трогает боевые хранилища, лог, Telegram и порт метрик
+    os.environ["CANDLE_STORE_DIR"] = os.path.join(workdir, "candles")
+    os.environ.setdefault("TRADE_JOURNAL", os.path.join(workdir, "trades.jsonl"))
+    os.environ["TELEGRAM_ALERTS"] = "0"
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["MARKET_DATA_WS"] = "0"
+    os.environ.pop("BACKTESTING_END", None)
+    log_pipeline.configure(os.path.join(workdir, "bot.log"))  # Без эффекта, если логирование уже настроено
+    install(sim)
+    import ml_strategy
+    try:
+        with clock.patch(ml_strategy):
+            import bot
+            clock.add_barrier(bot.executor.wait_idle)
+            started = time.perf_counter()
+            try:
+                bot.run_bot()
+            except ReplayFinished:
+                pass
+            bot.executor.wait_idle()
+        summary = sim.summary()
+        summary["wall_seconds"] = time.perf_counter() - started
+        if not temporary:
+            summary["workdir"] = workdir
+        return summary
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Реплей bot.run_bot на локальном симуляторе Hyperliquid")
+    parser.add_argument("--coins", nargs="+", default=["BTC"])
+    parser.add_argument("--interval", default="1m", help="Базовый интервал записанных свечей")
+    parser.add_argument("--start", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--warmup-days", type=int, default=3, help="История до --start, доступная стратегии")
+    parser.add_argument("--balance", type=float, default=10_000.0)
+    parser.add_argument("--leverage", type=int, default=20)
+    parser.add_argument("--funding-rate", type=float, default=0.0000125, help="Funding за час")
+    parser.add_argument("--root", default=None, help="Каталог CandleStore с записанными свечами")
+    parser.add_argument("--fetch", action="store_true", help="Догрузить недостающие свечи из API")
+    parser.add_argument("--workdir", default=None, help="Каталог журнала и лога реплея (по умолчанию временный)")
+    args = parser.parse_args(argv)
+    log_pipeline.configure()
+
+    start_ms = int(datetime.strptime(args.start, "%Y-%m-%d").timestamp() * 1000)
+    end_ms = int(datetime.strptime(args.end, "%Y-%m-%d").timestamp() * 1000)
+    api = None
+    if args.fetch:
+        from api_interface import get_api
+        api = get_api()
+    root = os.path.abspath(args.root or os.getenv("CANDLE_STORE_DIR", "candles"))
+    candles = load_candles(args.coins, args.interval, start_ms - args.warmup_days * 86_400_000, end_ms, root, api)
+    if any(len(c["time"]) == 0 for c in candles.values()):
+        print("Нет записанных свечей для реплея (запусти с --fetch или candle_store backfill)")
+        sys.exit(1)
+    clock = VirtualClock(start_ms, end_ms)
+    sim = SimulatedExchange(candles, clock, base_interval=args.interval, initial_balance=args.balance,
+                            leverage=args.leverage, funding_rate=args.funding_rate)
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    for key, value in replay_bot(sim, clock, args.workdir).items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
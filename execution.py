@@ -0,0 +1,206 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+import metrics
+from log_pipeline import event
+
+logger = logging.getLogger(__name__)
+
+
+def parse_statuses(orders, result, latency_ms):
+    """Ответ bulk_orders -> список подтверждений (ack) по каждому ордеру пакета."""
+    statuses = []
+    if isinstance(result, dict) and result.get("status") == "ok":
+        statuses = result.get("response", {}).get("data", {}).get("statuses", [])
+    acks = []
+    for i, order in enumerate(orders):
+        status = statuses[i] if i < len(statuses) else {"error": str(result)}
+        ack = {
+            "coin": order["coin"],
+            "side": "buy" if order["is_buy"] else "sell",
+            "size": order["sz"],
+            "price": order["limit_px"],
+            "status": "error",
+            "oid": None,
+            "avg_px": None,
+            "filled_size": 0.0,
+            "latency_ms": latency_ms,
+            "response": status,
+        }
+        if "resting" in status:
+            ack.update(status="resting", oid=status["resting"].get("oid"))
+        elif "filled" in status:
+            filled = status["filled"]
+            ack.update(status="filled", oid=filled.get("oid"), avg_px=float(filled.get("avgPx", 0)),
+                       filled_size=float(filled.get("totalSz", 0)))
+        acks.append(ack)
+    return acks
+
+
+def parse_cancel_statuses(cancels, result):
+    """Ответ bulk_cancel -> [(oid, True/False, статус)]: "success" или {"error": ...} на каждую отмену."""
+    statuses = []
+    if isinstance(result, dict) and result.get("status") == "ok":
+        statuses = result.get("response", {}).get("data", {}).get("statuses", [])
+    return [(cancel["oid"], i < len(statuses) and statuses[i] == "success",
+             statuses[i] if i < len(statuses) else str(result)) for i, cancel in enumerate(cancels)]
+
+
+class OrderExecutor:
+    """Асинхронный конвейер ордеров поверх exchange_client.
+
+    Пакеты (например, все уровни сетки) уходят одним bulk_orders, независимые пакеты
+    отправляются параллельно. Хуки on_ack (алерты, журнал) выполняются в отдельном
+    потоке и не задерживают следующую отправку. Латентность submit->ack копится в окне.
+    """
+
+    def __init__(self, api, max_in_flight=4, latency_window=1000):
+        self.api = api
+        self.on_ack = []
+        self.latencies = deque(maxlen=latency_window)
+        self.in_flight = 0
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._io_pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="order-io")
+        self._hook_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-hooks")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="order-executor", daemon=True)
+        self._thread.start()
+
+    def add_ack_hook(self, hook):
+        """hook(ack) вызывается для каждого подтверждённого ордера вне критического пути."""
+        self.on_ack.append(hook)
+
+    def submit(self, asset="BTC", is_buy=True, qty=0.008, price=None, tag=None, signal=None, tif=None):
+        """Отправить один ордер (market без price); возвращает Future со списком ack."""
+        return self.submit_batch([self.api.build_order(asset, is_buy, qty, price, tif=tif)], tag=tag, signal=signal)
+
+    def submit_grid(self, asset, is_buy, levels, tag=None, signal=None):
+        """Все уровни сетки [(price, qty), ...] одним bulk-запросом."""
+        orders = [self.api.build_order(asset, is_buy, qty, price) for price, qty in levels]
+        return self.submit_batch(orders, tag=tag, signal=signal)
+
+    def submit_batch(self, orders, tag=None, signal=None):
+        """Неблокирующая отправка пакета OrderRequest; Future.result() вернёт список ack."""
+        # Trace итерации цикла, породившей пакет: к нему привяжется span order_ack
+        trace = metrics.current_trace()
+        return self._schedule(self._send(orders, tag, signal, trace))
+
+    def submit_modify(self, modifies, tag=None, signal=None):
+        """Изменение резервных ордеров [(oid, OrderRequest), ...] одним bulk_modify; ack как у submit_batch."""
+        trace = metrics.current_trace()
+        orders = [order for _, order in modifies]
+        return self._schedule(self._send(orders, tag, signal, trace, oids=[oid for oid, _ in modifies]))
+
+    def submit_cancel(self, cancels, tag=None):
+        """Отмена [{"coin", "oid"}, ...] одним bulk_cancel; Future.result() -> [(oid, ok, статус)]."""
+        return self._schedule(self._cancel(cancels, tag))
+
+    def _schedule(self, coro):
+        return self._track(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def _track(self, future):
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def wait_idle(self, timeout=None):
+        """Дождаться ack всех отправленных пакетов и их хуков on_ack (реплей на виртуальном времени, тесты).
+
+        Хуки (журнал, алерты, portfolio.on_fill) ставятся в очередь до завершения пакета, поэтому
+        цикл ждёт и их: после возврата состояние не меняется за спиной вызывающего.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._pending_lock:
+                pending = list(self._pending)
+            if not pending:
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            wait(pending, remaining)
+
+    async def _send(self, orders, tag, signal=None, trace=None, oids=None):
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            if oids is None:
+                result = await self._loop.run_in_executor(self._io_pool, self.api.exchange_client.bulk_orders, orders)
+            else:
+                modifies = [{"oid": oid, "order": order} for oid, order in zip(oids, orders)]
+                result = await self._loop.run_in_executor(self._io_pool, self.api.exchange_client.bulk_modify_orders_new,
+                                                          modifies)
+        except Exception as e:
+            logger.error(f"Ошибка отправки пакета ордеров ({tag}): {e}")
+            result = {"status": "err", "response": str(e)}
+        finally:
+            self.in_flight -= 1
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.latencies.append(latency_ms)
+        metrics.record_ack(trace, started, latency_ms / 1000)
+        self.api.invalidate_account()  # Позиции изменились — снимок user_state устарел
+        acks = parse_statuses(orders, result, latency_ms)
+        for level, ack in enumerate(acks, start=1):
+            ack["tag"] = tag
+            ack["signal"] = signal
+            ack["level"] = level
+            if oids is not None:
+                ack["replaced_oid"] = oids[level - 1]
+        event(logger, "Пакет ордеров", tag=tag, orders=len(orders), latency_ms=round(latency_ms, 1),
+              statuses=[ack["status"] for ack in acks])
+        self._track(self._hook_pool.submit(self._run_hooks, acks))
+        return acks
+
+    async def _cancel(self, cancels, tag):
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = await self._loop.run_in_executor(self._io_pool, self.api.exchange_client.bulk_cancel, cancels)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной отмены ордеров ({tag}): {e}")
+            result = {"status": "err", "response": str(e)}
+        finally:
+            self.in_flight -= 1
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.latencies.append(latency_ms)
+        self.api.invalidate_account()
+        statuses = parse_cancel_statuses(cancels, result)
+        event(logger, "Пакет отмен", tag=tag, cancels=len(cancels), latency_ms=round(latency_ms, 1),
+              ok=sum(1 for _, ok, _ in statuses if ok))
+        return statuses
+
+    def _run_hooks(self, acks):
+        for ack in acks:
+            for hook in self.on_ack:
+                try:
+                    hook(ack)
+                except Exception as e:
+                    logger.error(f"Ошибка в обработчике ack: {e}")
+
+    def latency_stats(self):
+        """Статистика submit->ack в ms по последним пакетам."""
+        if not self.latencies:
+            return {"count": 0, "p50_ms": None, "p95_ms": None, "max_ms": None, "in_flight": self.in_flight}
+        values = np.fromiter(self.latencies, dtype=np.float64)
+        return {
+            "count": len(values),
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "max_ms": float(values.max()),
+            "in_flight": self.in_flight,
+        }
+
+    def close(self, wait=True):
+        self._io_pool.shutdown(wait=wait)
+        self._hook_pool.shutdown(wait=wait)
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -1,6 +1,9 @@
 import os
-import tweepy
-from textblob import TextBlob
+import logging
+from sentiment_service import get_sentiment_service
+
+logger = logging.getLogger(__name__)
+
 
 class ExternalData:
     def __init__(self):
@@ -8,21 +11,27 @@ class ExternalData:
         TW_CONSUMER_SECRET = os.getenv("TW_CONSUMER_SECRET", "")
         TW_ACCESS_TOKEN = os.getenv("TW_ACCESS_TOKEN", "")
         TW_ACCESS_TOKEN_SECRET = os.getenv("TW_ACCESS_TOKEN_SECRET", "")
+        self.api = None
+        if not TW_CONSUMER_KEY:
+            return
         try:
+            import tweepy
             auth = tweepy.OAuth1UserHandler(TW_CONSUMER_KEY, TW_CONSUMER_SECRET,
                                             TW_ACCESS_TOKEN, TW_ACCESS_TOKEN_SECRET)
             self.api = tweepy.API(auth)
-        except:
-            self.api = None
+        except Exception as e:
+            logger.error(f"Ошибка инициализации Twitter API: {e}")
+
+    def fetch_tweets(self, symbol="BTC", count=50):
+        """Свежие твиты по символу: [(id, текст)]; вызывается из фонового sentiment-сервиса."""
+        tweets = self.api.search_tweets(q=symbol, count=count, lang="en", result_type="recent")
+        return [(t.id, t.text) for t in tweets]
 
     def get_features(self, symbol="BTC"):
-        score = 0
-        if self.api:
-            try:
-                tweets = self.api.search_tweets(q=symbol, count=10, lang="en")
-                for t in tweets:
-                    score += TextBlob(t.text).sentiment.polarity
-                score /= max(len(tweets),1)
-            except:
-                score = 0
-        return {"sentiment": score}
+        """Последний агрегат sentiment из памяти, без сетевых запросов в торговом цикле."""
+        service = get_sentiment_service((symbol,), source=self)
+        if service is None:
+            return {"sentiment": 0, "sentiment_updated": None, "sentiment_stale": True}
+        latest = service.latest(symbol)
+        return {"sentiment": latest["sentiment"], "sentiment_updated": latest["updated"],
+                "sentiment_stale": latest["stale"]}
@@ -0,0 +1,185 @@
+import os
+import logging
+import threading
+import metrics
+from log_pipeline import event
+
+logger = logging.getLogger(__name__)
+
+PRICE_TOLERANCE_BPS = float(os.getenv("GRID_PRICE_TOLERANCE_BPS", "5"))  # Ближе к цели — уровень не переставляется
+ACK_TIMEOUT = float(os.getenv("GRID_ACK_TIMEOUT", "10"))
+GRID_TIF = os.getenv("GRID_TIF", "Alo")  # Post-only: уровень, который пересёк бы стакан, отклоняется, а не берёт taker
+
+
+class GridManager:
+    """Сетка лимитных ордеров по монетам: целевая лестница и живые резервные ордера.
+
+    set_ladder задаёт цель, reconcile сверяет её с открытыми ордерами (один запрос open_orders) и
+    отправляет только разницу: совпадающие уровни остаются, сдвинутые переставляются modify,
+    лишние отменяются, недостающие ставятся. Каждый вид действий — один bulk-запрос, поэтому
+    повторные сигналы не копят ордера и число запросов на тик не зависит от частоты сигналов.
+    Резервные ордера монеты без reduce-only считаются ордерами сетки.
+
+    Уровень, выставленный сеткой и пропавший из open_orders без нашей отмены, считается исполненным:
+    пока сторона остаётся в цели, столько же ближайших к рынку уровней этой стороны не ставится заново,
+    иначе каждый повторный сигнал добирал бы позицию.
+    """
+
+    def __init__(self, api, executor, tolerance_bps=PRICE_TOLERANCE_BPS, timeout=ACK_TIMEOUT, tif=GRID_TIF):
+        self.api = api
+        self.executor = executor
+        self.tolerance_bps = tolerance_bps
+        self.timeout = timeout
+        self.tif = tif
+        self.targets = {}  # coin -> [(is_buy, price, size)]
+        self.live = {}  # coin -> {oid: (is_buy, price, size)}
+        self.placed = {}  # coin -> {oid: is_buy}: резервные ордера, выставленные этой сеткой
+        self.filled = {}  # coin -> {is_buy: число исполненных уровней}
+        self._lock = threading.Lock()
+
+    def set_ladder(self, coin, levels):
+        """Цель для coin: [(is_buy, price, size), ...]; цена и размер округляются по правилам биржи."""
+        ladder = []
+        for is_buy, price, size in levels:
+            sz = self.api.round_size(coin, size)
+            if sz > 0:
+                ladder.append((bool(is_buy), self.api.round_price(coin, price), sz))
+        with self._lock:
+            self.targets[coin] = ladder
+            sides = {level[0] for level in ladder}
+            filled = self.filled.setdefault(coin, {})
+            for is_buy in list(filled):
+                if is_buy not in sides:
+                    del filled[is_buy]  # Сторона снята (разворот или clear) — счёт исполнений заново
+        return ladder
+
+    def clear(self, coin):
+        """Снять сетку coin: следующий reconcile отменит все её ордера, счёт исполнений сбрасывается."""
+        return self.set_ladder(coin, [])
+
+    def sync(self, coin=None):
+        """Живые ордера из open_orders биржи (источник истины: исполнения между тиками, ручные отмены)."""
+        orders = self.api.get_open_orders(coin)
+        if orders is None:
+            return False
+        live = {}
+        for order in orders:
+            if order.get("reduceOnly"):
+                continue
+            # Частично исполненный ордер сверяется по исходному размеру: остаток не доливается
+            live.setdefault(order["coin"], {})[order["oid"]] = (order["side"] == "B", float(order["limitPx"]),
+                                                                 float(order.get("origSz", order["sz"])))
+        with self._lock:
+            for c in (list(self.placed) if coin is None else [coin]):
+                for oid in [oid for oid in self.placed.get(c, {}) if oid not in live.get(c, {})]:
+                    self._count_fill(c, self.placed[c].pop(oid))
+            if coin is None:
+                self.live = live
+            else:
+                self.live[coin] = live.get(coin, {})
+        return True
+
+    def _count_fill(self, coin, is_buy):
+        filled = self.filled.setdefault(coin, {})
+        filled[is_buy] = filled.get(is_buy, 0) + 1
+
+    def _same(self, order, level):
+        return (abs(order[1] - level[1]) <= level[1] * self.tolerance_bps / 10_000
+                and abs(order[2] - level[2]) <= level[2] * 1e-9)
+
+    def plan(self, coin):
+        """Минимальный набор действий до цели: {"cancel": [oid], "modify": [(oid, level)], "place": [level]}."""
+        with self._lock:
+            target = list(self.targets.get(coin, []))
+            live = dict(self.live.get(coin, {}))
+            filled = dict(self.filled.get(coin, {}))
+        cancel, modify, place = [], [], []
+        for is_buy in (True, False):
+            # От ближайшего к рынку уровня: переставленный ордер сдвигается на соседний уровень
+            want = sorted((level for level in target if level[0] == is_buy), key=lambda l: l[1], reverse=is_buy)
+            want = want[filled.get(is_buy, 0):]  # Исполненные уровни стоят ближе всех к рынку
+            have = sorted(((oid, o) for oid, o in live.items() if o[0] == is_buy), key=lambda x: x[1][1],
+                          reverse=is_buy)
+            missing = []
+            for level in want:
+                match = next((i for i, (_, order) in enumerate(have) if self._same(order, level)), None)
+                if match is None:
+                    missing.append(level)
+                else:
+                    have.pop(match)  # Уже стоит с нужной ценой и размером
+            # modify вместо cancel+place: одно действие и новый уровень без окна без ордера
+            modify.extend((oid, level) for (oid, _), level in zip(have, missing))
+            cancel.extend(oid for oid, _ in have[len(missing):])
+            place.extend(missing[len(have):])
+        return {"cancel": cancel, "modify": modify, "place": place}
+
+    def reconcile(self, coin, tag="grid", signal=None, sync=True):
+        """Привести ордера coin к цели; вернуть план с результатами (None, если ордера не получены).
+
+        Сначала отмены (освобождают маржу), затем modify и place параллельно. Ack modify/place
+        проходят через OrderExecutor, поэтому журнал, алерты и портфель видят их как обычные ордера.
+        """
+        if sync and not self.sync(coin):
+            logger.warning("Сетка %s: открытые ордера не получены, сверка отложена", coin)
+            return None
+        plan = self.plan(coin)
+        plan["cancelled"] = []
+        if not (plan["cancel"] or plan["modify"] or plan["place"]):
+            logger.info("Сетка %s: ордера совпадают с целью", coin)
+            return plan
+        if plan["cancel"]:
+            future = self.executor.submit_cancel([{"coin": coin, "oid": oid} for oid in plan["cancel"]],
+                                                 tag=f"{tag}_cancel")
+            for oid, ok, status in future.result(self.timeout):
+                if ok:
+                    self._forget(coin, oid)
+                    plan["cancelled"].append(oid)
+                elif isinstance(status, dict):  # Ошибка биржи — ордер исполнился раньше отмены
+                    self._forget(coin, oid, filled=True)
+        futures = []
+        if plan["modify"]:
+            futures.append(self.executor.submit_modify(
+                [(oid, self.api.build_order(coin, is_buy, sz, px, tif=self.tif))
+                 for oid, (is_buy, px, sz) in plan["modify"]],
+                tag=tag, signal=signal))
+        if plan["place"]:
+            futures.append(self.executor.submit_batch(
+                [self.api.build_order(coin, is_buy, sz, px, tif=self.tif) for is_buy, px, sz in plan["place"]],
+                tag=tag, signal=signal))
+        for future in futures:
+            for ack in future.result(self.timeout):
+                self._apply_ack(coin, ack)
+        for action in ("cancel", "modify", "place"):
+            if plan[action]:
+                metrics.GRID_ACTIONS.inc(len(plan[action]), coin=coin, action=action)
+        event(logger, "Сверка сетки", coin=coin, cancel=len(plan["cancel"]), modify=len(plan["modify"]),
+              place=len(plan["place"]))
+        return plan
+
+    def _forget(self, coin, oid, filled=False):
+        with self._lock:
+            order = self.live.get(coin, {}).pop(oid, None)
+            is_buy = self.placed.get(coin, {}).pop(oid, None)
+            if filled and is_buy is None and order is not None:
+                is_buy = order[0]
+            if filled and is_buy is not None:
+                self._count_fill(coin, is_buy)
+
+    def _apply_ack(self, coin, ack):
+        """Живое состояние по ack: заменённый oid уходит, резервный ордер добавляется, исполненный — в счёт."""
+        replaced = ack.get("replaced_oid")
+        if replaced is not None:
+            # "Cannot modify" — ордер исполнился до modify; прочие ошибки не считаются исполнением
+            self._forget(coin, replaced, filled=ack["status"] == "error" and "Cannot modify" in str(ack["response"]))
+        is_buy = ack["side"] == "buy"
+        with self._lock:
+            if ack["status"] == "resting":
+                self.live.setdefault(coin, {})[ack["oid"]] = (is_buy, float(ack["price"]), float(ack["size"]))
+                self.placed.setdefault(coin, {})[ack["oid"]] = is_buy
+            elif ack["status"] == "filled":
+                self._count_fill(coin, is_buy)
+
+    def open_orders(self, coin):
+        with self._lock:
+            return dict(self.live.get(coin, {}))
+
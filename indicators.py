@@ -0,0 +1,284 @@
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+INDICATOR_COLUMNS = ("SMA10", "SMA20", "SMA50", "RSI", "BB_upper", "BB_lower", "chop")
+HISTORY = 5000  # Сколько последних свечей помнит StreamingIndicators для полных колонок кадра
+
+
+class RollingMean:
+    """Скользящее среднее на бегущей сумме (min_periods=1, как в pandas rolling)."""
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+
+    def push(self, x):
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+
+    def replace_last(self, x):
+        self.total += x - self.values[-1]
+        self.values[-1] = x
+
+    @property
+    def value(self):
+        return self.total / len(self.values) if self.values else math.nan
+
+
+class RollingVariance:
+    """Скользящая дисперсия по Уэлфорду с удалением старых значений (ddof=1)."""
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _add(self, x):
+        n = len(self.values)
+        delta = x - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, y, n_after):
+        if n_after == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = y - self.mean
+        self.mean -= delta / n_after
+        self.m2 = max(self.m2 - delta * (y - self.mean), 0.0)
+
+    def push(self, x):
+        if len(self.values) == self.values.maxlen:
+            self._remove(self.values[0], len(self.values) - 1)
+        self.values.append(x)
+        self._add(x)
+
+    def replace_last(self, x):
+        self._remove(self.values[-1], len(self.values) - 1)
+        self.values[-1] = x
+        self._add(x)
+
+    @property
+    def std(self):
+        n = len(self.values)
+        return math.sqrt(self.m2 / (n - 1)) if n > 1 else math.nan
+
+
+class RollingExtreme:
+    """Скользящий максимум/минимум через монотонную деку (амортизированно O(1))."""
+
+    def __init__(self, window, is_max=True):
+        self.window = window
+        self.is_max = is_max
+        self.items = deque()  # (index, value), монотонно по value
+        self.raw = deque(maxlen=window)
+        self.index = -1
+
+    def _dominates(self, new, old):
+        return new >= old if self.is_max else new <= old
+
+    def push(self, x):
+        self.index += 1
+        self.raw.append(x)
+        while self.items and self._dominates(x, self.items[-1][1]):
+            self.items.pop()
+        self.items.append((self.index, x))
+        while self.items[0][0] <= self.index - self.window:
+            self.items.popleft()
+
+    def replace_last(self, x):
+        # Пересборка деки по окну фиксированной длины — O(window), не зависит от истории
+        self.raw[-1] = x
+        self.items.clear()
+        start = self.index - len(self.raw) + 1
+        for offset, value in enumerate(self.raw):
+            while self.items and self._dominates(value, self.items[-1][1]):
+                self.items.pop()
+            self.items.append((start + offset, value))
+
+    @property
+    def value(self):
+        return self.items[0][1] if len(self.raw) == self.window else math.nan
+
+
+class StreamingIndicators:
+    """Потоковый расчёт SMA10/20/50, RSI, BB и Chop с O(1) обновлением на свечу.
+
+    Значения совпадают с MLStrategy.calculate_indicators на той же истории (в пределах
+    погрешности float). rsi_mode="wilder" включает сглаживание Уайлдера вместо SMA.
+    Значения последних history свечей хранятся, чтобы отдать колонки всего кадра без пересчёта.
+    """
+
+    def __init__(self, rsi_length=14, bb_length=20, bb_std=2, chop_length=14, rsi_mode="sma", history=HISTORY):
+        self.rsi_length = rsi_length
+        self.bb_length = bb_length
+        self.bb_std = bb_std
+        self.chop_length = chop_length
+        self.rsi_mode = rsi_mode
+        self.history_size = history
+        self.reset()
+
+    def reset(self):
+        self.sma = {10: RollingMean(10), 20: RollingMean(20), 50: RollingMean(50)}
+        self.bb_var = RollingVariance(self.bb_length)
+        self.gain = RollingMean(self.rsi_length)
+        self.loss = RollingMean(self.rsi_length)
+        self.wilder_gain = None
+        self.wilder_loss = None
+        self.true_range = RollingMean(self.chop_length)
+        self.tr_count = 0
+        self.highest = RollingExtreme(self.chop_length, is_max=True)
+        self.lowest = RollingExtreme(self.chop_length, is_max=False)
+        self.prev_close = None  # close предыдущей закрытой свечи
+        self.last_candle = None
+        self.last_time = None
+        self.count = 0
+        self.values = {}
+        self.history = deque(maxlen=self.history_size)  # (time_key, значения в порядке INDICATOR_COLUMNS)
+
+    def update(self, candle, time_key=None):
+        """Добавить свечу (dict с high/low/close); та же time_key пересчитывает последнюю свечу."""
+        high, low, close = float(candle["high"]), float(candle["low"]), float(candle["close"])
+        revise = time_key is not None and time_key == self.last_time and self.count > 0
+        if revise:
+            self._replace(high, low, close)
+        else:
+            if self.last_candle is not None:
+                self.prev_close = self.last_candle[2]
+                self._commit_wilder()
+            self._push(high, low, close)
+            self.count += 1
+        self.last_candle = (high, low, close)
+        self.last_time = time_key
+        self.values = self._compute()
+        row = (time_key, tuple(self.values[column] for column in INDICATOR_COLUMNS))
+        if revise:
+            self.history[-1] = row
+        else:
+            self.history.append(row)
+        return self.values
+
+    def update_frame(self, df):
+        """Скормить только новые строки df (по колонке time); при разрыве истории — полный прогрев."""
+        if df.empty:
+            return self.values
+        times = df["time"].tolist()
+        if self.last_time is None or times[0] > self.last_time:
+            self.reset()
+            start = 0
+        else:
+            start = len(times)
+            while start > 0 and times[start - 1] >= self.last_time:
+                start -= 1
+        highs = df["high"].tolist()
+        lows = df["low"].tolist()
+        closes = df["close"].tolist()
+        for i in range(start, len(times)):
+            self.update({"high": highs[i], "low": lows[i], "close": closes[i]}, time_key=times[i])
+        return self.values
+
+    def frame_columns(self, times):
+        """Колонки индикаторов для свечей times из истории обновлений; None, если какой-то свечи в ней нет."""
+        known = dict(self.history)
+        rows = [known.get(time_key) for time_key in times]
+        if any(row is None for row in rows):
+            return None
+        if not rows:
+            return {column: np.empty(0) for column in INDICATOR_COLUMNS}
+        table = np.array(rows, dtype=np.float64)
+        return {column: table[:, i] for i, column in enumerate(INDICATOR_COLUMNS)}
+
+    def _push(self, high, low, close):
+        for sma in self.sma.values():
+            sma.push(close)
+        self.bb_var.push(close)
+        gain, loss = self._gain_loss(close)
+        self.gain.push(gain)
+        self.loss.push(loss)
+        if self.prev_close is not None:
+            self.true_range.push(self._tr(high, low))
+            self.tr_count += 1
+        self.highest.push(high)
+        self.lowest.push(low)
+
+    def _replace(self, high, low, close):
+        for sma in self.sma.values():
+            sma.replace_last(close)
+        self.bb_var.replace_last(close)
+        gain, loss = self._gain_loss(close)
+        self.gain.replace_last(gain)
+        self.loss.replace_last(loss)
+        if self.prev_close is not None:
+            self.true_range.replace_last(self._tr(high, low))
+        self.highest.replace_last(high)
+        self.lowest.replace_last(low)
+
+    def _gain_loss(self, close):
+        if self.prev_close is None:
+            return 0.0, 0.0
+        delta = close - self.prev_close
+        return max(delta, 0.0), max(-delta, 0.0)
+
+    def _tr(self, high, low):
+        return max(high - low, abs(high - self.prev_close), abs(self.prev_close - low))
+
+    def _commit_wilder(self):
+        """Зафиксировать состояние Уайлдера по закрытой свече (только для rsi_mode="wilder")."""
+        if self.rsi_mode != "wilder":
+            return
+        gain, loss = self.gain.values[-1], self.loss.values[-1]
+        if self.wilder_gain is None:
+            self.wilder_gain, self.wilder_loss = gain, loss
+        else:
+            alpha = 1.0 / self.rsi_length
+            self.wilder_gain += alpha * (gain - self.wilder_gain)
+            self.wilder_loss += alpha * (loss - self.wilder_loss)
+
+    def _rsi(self):
+        if self.rsi_mode == "wilder":
+            gain, loss = self.gain.values[-1], self.loss.values[-1]
+            if self.wilder_gain is not None:
+                alpha = 1.0 / self.rsi_length
+                gain = self.wilder_gain + alpha * (gain - self.wilder_gain)
+                loss = self.wilder_loss + alpha * (loss - self.wilder_loss)
+        else:
+            gain, loss = self.gain.value, self.loss.value
+        if loss == 0:
+            return math.nan if gain == 0 else 100.0
+        return 100 - (100 / (1 + gain / loss))
+
+    def _chop(self):
+        if self.tr_count < self.chop_length:
+            return math.nan
+        diff = self.highest.value - self.lowest.value
+        atr_sum = self.true_range.total
+        if diff <= 0 or atr_sum <= 0:
+            return math.nan
+        return 100 * (math.log10(atr_sum) - math.log10(diff)) / math.log10(self.chop_length)
+
+    def _compute(self):
+        std = self.bb_var.std
+        return {
+            "SMA10": self.sma[10].value,
+            "SMA20": self.sma[20].value,
+            "SMA50": self.sma[50].value,
+            "RSI": self._rsi(),
+            "BB_upper": self.bb_var.mean + std * self.bb_std,
+            "BB_lower": self.bb_var.mean - std * self.bb_std,
+            "chop": self._chop(),
+        }
+
+
+def chop(high, low, close, length=14):
+    """Векторный Choppiness Index (как ta.chop с atr_length=1) для pandas Series."""
+    prev_close = close.shift(1)
+    true_range = pd.concat([high - low, (high - prev_close).abs(), (prev_close - low).abs()], axis=1).max(axis=1)
+    true_range.iloc[:1] = np.nan
+    atr_sum = true_range.rolling(length).sum()
+    diff = high.rolling(length).max() - low.rolling(length).min()
+    return 100 * (np.log10(atr_sum) - np.log10(diff)) / np.log10(length)
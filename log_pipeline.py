@@ -0,0 +1,220 @@
+import os
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "")  # Переопределяет файл entry point'а (bot.log, agent.log)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text | json (одна JSON-запись на строку)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Для шумных модулей: "api_interface=0.1,market_data=0.01" — доля INFO/DEBUG записей, которая пишется
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# "api_interface=5" — не больше 5 строк/с с одного места вызова; пропущенные считаются в suppressed=N
+LOG_RATE_LIMIT = os.getenv("LOG_RATE_LIMIT", "")
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+LOG_RECORDS_DROPPED = metrics.REGISTRY.counter("log_records_dropped_total", "Отброшенные записи лога", ("reason",))
+
+
+def parse_rules(spec):
+    """"name=value,name=value" -> {name: float}; имя — логгер или его префикс (api_interface, hyperliquid)."""
+    rules = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            rules[name.strip()] = float(value)
+    return rules
+
+
+class SamplingFilter(logging.Filter):
+    """Сэмплирование и rate limit INFO/DEBUG по модулям; WARNING и выше проходят всегда.
+
+    Работает в вызывающем потоке до постановки в очередь, поэтому не форматирует сообщение:
+    правило ищется по имени логгера (с кэшем), лимит — token bucket на место вызова.
+    """
+
+    def __init__(self, sampling=None, rate_limits=None):
+        super().__init__()
+        self.sampling = sampling or {}
+        self.rate_limits = rate_limits or {}
+        self._rules = {}
+        self._buckets = {}  # (логгер, строка) -> [токены, время, пропущено]
+        self._lock = threading.Lock()
+
+    def _rule(self, name):
+        rule = self._rules.get(name)
+        if rule is None:
+            rule = (self._match(self.sampling, name), self._match(self.rate_limits, name))
+            self._rules[name] = rule
+        return rule
+
+    @staticmethod
+    def _match(rules, name):
+        """Самый длинный префикс имени логгера из правил (None — правила нет)."""
+        while name:
+            if name in rules:
+                return rules[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        sample, limit = self._rule(record.name)
+        if sample is not None and random.random() >= sample:
+            LOG_RECORDS_DROPPED.inc(reason="sampled")
+            return False
+        if not limit:
+            return True
+        key = (record.name, record.lineno)
+        capacity = max(1.0, limit)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, record.created, 0]
+            bucket[0] = min(capacity, bucket[0] + (record.created - bucket[1]) * limit)
+            bucket[1] = record.created
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                LOG_RECORDS_DROPPED.inc(reason="rate_limited")
+                return False
+            bucket[0] -= 1.0
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.fields = dict(getattr(record, "fields", None) or {}, suppressed=suppressed)
+        return True
+
+
+class AsyncQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке: запись уходит в очередь как есть.
+
+    Сообщение с %-аргументами собирается в фоновом writer'е, поэтому аргументы не должны
+    изменяться после вызова logger (передавай значения, а не изменяемые буферы). При
+    переполнении очереди запись отбрасывается — торговый цикл никогда не ждёт диск.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Текстовая строка с полями key=value из extra={"fields": {...}} или JSON-строка (LOG_FORMAT=json)."""
+
+    def __init__(self, fmt=TEXT_FORMAT, json_lines=False):
+        super().__init__(fmt)
+        self.json_lines = json_lines
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+    def format(self, record):
+        if not self.json_lines:
+            return super().format(record)
+        payload = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                   "message": record.getMessage()}
+        payload.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def event(logger, message, level=logging.INFO, **fields):
+    """Структурированная запись: сообщение + поля key=value; строка собирается в фоновом потоке."""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields}, stacklevel=2)
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def configure(filename=None, level=None, force=False):
+    """Логирование процесса: root -> ограниченная очередь -> фоновый writer (файл с ротацией или stderr).
+
+    Вызывается entry point'ом (bot, agent, CLI), библиотечные модули только берут getLogger.
+    Повторный вызов ничего не делает; если root уже настроен снаружи (basicConfig в скрипте,
+    реплее), настройка не меняется — как basicConfig без force.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        root = logging.getLogger()
+        if root.handlers and not force:
+            return None
+        filename = LOG_FILE or filename
+        if filename:
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            target = RotatingFileHandler(filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        else:
+            target = logging.StreamHandler()
+        target.setFormatter(KeyValueFormatter(json_lines=LOG_FORMAT == "json"))
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = AsyncQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter(parse_rules(LOG_SAMPLING), parse_rules(LOG_RATE_LIMIT)))
+        for old in root.handlers[:]:
+            root.removeHandler(old)
+            old.close()
+        root.addHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+        _listener = QueueListener(log_queue, target, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+        return _listener
+
+
+def shutdown():
+    """Дописать очередь на диск и остановить writer (вызывается при выходе)."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, AsyncQueueHandler):
+                root.removeHandler(handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def _after_fork():
+    """В дочернем процессе (воркеры ProcessPoolExecutor) writer-потока нет: пишем синхронно в stderr.
+
+    Файл с ротацией остаётся за родителем: несколько процессов, ротирующих один файл, теряют и
+    перемешивают строки. Фильтр создаётся заново — его lock мог быть захвачен в момент fork.
+    """
+    global _listener, _lock
+    _lock = threading.Lock()
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, AsyncQueueHandler):
+            root.removeHandler(handler)
+    stream = logging.StreamHandler()
+    stream.setFormatter(KeyValueFormatter(json_lines=LOG_FORMAT == "json"))
+    stream.addFilter(SamplingFilter(parse_rules(LOG_SAMPLING), parse_rules(LOG_RATE_LIMIT)))
+    root.addHandler(stream)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,146 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+from lstm_model import LSTMPredictor
+
+logger = logging.getLogger(__name__)
+
+SEQ_LENGTH = 10
+TRAIN_SPLIT = 0.8  # Как в get_signal: min/max считаются по первым 80% окна
+MODES = ("eager", "torchscript", "quantized")
+
+
+def minmax_fit(train):
+    """Параметры MinMaxScaler в чистом NumPy: (min, range) по последней оси."""
+    data_min = train.min(axis=-1)
+    data_range = train.max(axis=-1) - data_min
+    data_range = np.where(data_range == 0, 1.0, data_range)  # Как sklearn для константных рядов
+    return data_min, data_range
+
+
+def build_variant(model, mode="eager"):
+    """Вариант модели для инференса: eager, TorchScript или int8 dynamic-quantized."""
+    model.eval()
+    if mode == "eager":
+        return model
+    if mode == "torchscript":
+        return torch.jit.optimize_for_inference(torch.jit.script(model))
+    if mode == "quantized":
+        return torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    raise ValueError(f"Неизвестный режим инференса: {mode}")
+
+
+class LSTMInference:
+    """Батчевый инференс LSTMPredictor: много (symbol, window) за один forward pass."""
+
+    def __init__(self, model=None, mode=None, seq_length=SEQ_LENGTH, scaler=None):
+        self.model = model if model is not None else LSTMPredictor()
+        self.mode = mode or os.getenv("LSTM_INFERENCE_MODE", "eager")
+        self.seq_length = seq_length
+        self.scaler = scaler  # (min, range) из чекпоинта; None — min/max по первым 80% каждого окна
+        self.runner = build_variant(self.model, self.mode)
+
+    def predict_scaled(self, sequences):
+        """Forward pass по батчу уже отмасштабированных последовательностей [B, T] -> [B]."""
+        batch = torch.from_numpy(np.ascontiguousarray(sequences, dtype=np.float32)).unsqueeze(-1)
+        with torch.inference_mode():
+            return self.runner(batch).squeeze(-1).numpy()
+
+    def predict_windows(self, windows):
+        """Предсказать следующую цену для каждого окна цен (dict symbol -> 1D массив или 2D массив).
+
+        Масштабирование — параметрами scaler обученной модели, без него — как в get_signal:
+        min/max по первым 80% окна. Последовательность — последние seq_length цен.
+        Окна короче нужного пропускаются (NaN / нет ключа).
+        """
+        if isinstance(windows, dict):
+            symbols = [s for s, w in windows.items() if self._usable(len(w))]
+            if not symbols:
+                return {}
+            preds = self._predict_ragged([np.asarray(windows[s], dtype=np.float64).ravel() for s in symbols])
+            return dict(zip(symbols, preds))
+        windows = np.asarray(windows, dtype=np.float64)
+        if not self._usable(windows.shape[1]):
+            return np.full(windows.shape[0], np.nan)
+        if self.scaler is not None:
+            data_min = np.full(windows.shape[0], self.scaler[0])
+            data_range = np.full(windows.shape[0], self.scaler[1])
+        else:
+            data_min, data_range = minmax_fit(windows[:, :int(windows.shape[1] * TRAIN_SPLIT)])
+        seq = (windows[:, -self.seq_length:] - data_min[:, None]) / data_range[:, None]
+        return self.predict_scaled(seq) * data_range + data_min
+
+    def predict_series(self, prices):
+        """Предсказание для одного ряда цен (NaN если данных недостаточно)."""
+        prices = np.asarray(prices, dtype=np.float64).ravel()
+        if not self._usable(len(prices)):
+            return float("nan")
+        return float(self.predict_windows(prices[None, :])[0])
+
+    def _usable(self, length):
+        if self.scaler is not None:
+            return length >= self.seq_length
+        return length > 20 and length - int(length * TRAIN_SPLIT) >= self.seq_length
+
+    def _predict_ragged(self, series):
+        data_min = np.empty(len(series))
+        data_range = np.empty(len(series))
+        seq = np.empty((len(series), self.seq_length))
+        for i, prices in enumerate(series):
+            if self.scaler is not None:
+                data_min[i], data_range[i] = self.scaler
+            else:
+                data_min[i], data_range[i] = minmax_fit(prices[:int(len(prices) * TRAIN_SPLIT)])
+            seq[i] = prices[-self.seq_length:]
+        seq = (seq - data_min[:, None]) / data_range[:, None]
+        return self.predict_scaled(seq) * data_range + data_min
+
+
+def compare_modes(model=None, batch_size=150, window=100, repeats=50, seed=0):
+    """Сравнение режимов по латентности батча и отклонению от eager-предсказаний."""
+    rng = np.random.default_rng(seed)
+    windows = 50_000 + np.cumsum(rng.normal(0, 50, (batch_size, window)), axis=1)
+    model = model if model is not None else LSTMPredictor()
+    reference = LSTMInference(model, mode="eager").predict_windows(windows)
+    rows = []
+    for mode in MODES:
+        inference = LSTMInference(model, mode=mode)
+        preds = inference.predict_windows(windows)  # Прогрев (JIT-профилирование)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            preds = inference.predict_windows(windows)
+            timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1000
+        rows.append({
+            "mode": mode,
+            "batch_ms_p50": float(np.median(timings)),
+            "batch_ms_p95": float(np.percentile(timings, 95)),
+            "us_per_window": float(np.median(timings) * 1000 / batch_size),
+            "max_abs_err": float(np.max(np.abs(preds - reference))),
+            "max_rel_err": float(np.max(np.abs(preds - reference) / np.abs(reference))),
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение режимов инференса LSTMPredictor")
+    parser.add_argument("--batch", type=int, default=150)
+    parser.add_argument("--window", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    for row in compare_modes(batch_size=args.batch, window=args.window, repeats=args.repeats):
+        print(f"{row['mode']:<12} p50={row['batch_ms_p50']:.3f}ms p95={row['batch_ms_p95']:.3f}ms "
+              f"{row['us_per_window']:.1f}us/окно max_abs_err={row['max_abs_err']:.4f} "
+              f"max_rel_err={row['max_rel_err']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import torch.nn as nn
+
+
+class LSTMPredictor(nn.Module):
+    """Простая LSTM-модель для предсказания следующей цены по последовательности."""
+
+    def __init__(self, input_size=1, hidden_size=50, num_layers=1):
+        super().__init__()
+        self.lstm = nn.LSTM(input_size=input_size, hidden_size=hidden_size, num_layers=num_layers, batch_first=True)
+        self.linear = nn.Linear(hidden_size, 1)
+
+    def forward(self, x):
+        _, (hn, _) = self.lstm(x)
+        return self.linear(hn[-1])
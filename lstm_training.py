@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import time
+import queue
+import argparse
+import logging
+import log_pipeline
+import threading
+from datetime import datetime
+import numpy as np
+import torch
+import torch.nn as nn
+from lstm_model import LSTMPredictor
+from lstm_inference import SEQ_LENGTH
+from candle_store import CandleStore, INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.getenv("LSTM_CHECKPOINT_DIR", os.path.join("checkpoints", "lstm"))  # Внутри — COIN_interval/
+CHECKPOINT_RE = re.compile(r"^lstm_v(\d+)\.pt$")
+VAL_FRACTION = 0.2
+
+
+def sliding_windows(series, seq_length=SEQ_LENGTH):
+    """Окна [N, seq_length + 1] как strided view без копирования: seq_length входов и цель."""
+    return np.lib.stride_tricks.sliding_window_view(series, seq_length + 1)
+
+
+def fit_scaler(prices):
+    """Параметры MinMax (min, range) по обучающей истории; хранятся в чекпоинте."""
+    data_min = float(np.min(prices))
+    data_range = float(np.max(prices) - data_min) or 1.0
+    return data_min, data_range
+
+
+def scale(prices, scaler):
+    return ((np.asarray(prices, dtype=np.float64) - scaler[0]) / scaler[1]).astype(np.float32)
+
+
+def iter_batches(windows, batch_size, shuffle=True, seed=0, prefetch=4):
+    """Батчи (x [B, T, 1], y [B, 1]) собираются в фоновом потоке, пока идёт шаг обучения."""
+    order = np.random.default_rng(seed).permutation(len(windows)) if shuffle else np.arange(len(windows))
+    batches = queue.Queue(maxsize=prefetch)
+
+    def produce():
+        for start in range(0, len(order), batch_size):
+            batch = windows[np.sort(order[start:start + batch_size])]  # Копируется только батч
+            x = torch.from_numpy(np.ascontiguousarray(batch[:, :-1])).unsqueeze(-1)
+            y = torch.from_numpy(np.ascontiguousarray(batch[:, -1:]))
+            batches.put((x, y))
+        batches.put(None)
+
+    threading.Thread(target=produce, name="lstm-batches", daemon=True).start()
+    while True:
+        item = batches.get()
+        if item is None:
+            return
+        yield item
+
+
+def evaluate(model, windows, batch_size=4096):
+    """Средний MSE на окнах (в масштабе scaler)."""
+    if len(windows) == 0:
+        return float("nan")
+    loss_fn = nn.MSELoss(reduction="sum")
+    total = 0.0
+    model.eval()
+    with torch.inference_mode():
+        for x, y in iter_batches(windows, batch_size, shuffle=False):
+            total += loss_fn(model(x), y).item()
+    return total / len(windows)
+
+
+def train(model, windows, epochs=20, batch_size=256, lr=1e-3, patience=3, threads=None, seed=0):
+    """Обучение с разбиением по времени (последние 20% окон — валидация) и early stopping."""
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(seed)
+    split = int(len(windows) * (1 - VAL_FRACTION))
+    train_windows, val_windows = windows[:split], windows[split:]
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    loss_fn = nn.MSELoss()
+    best_loss, best_state, stale = float("inf"), None, 0
+    history = []
+    for epoch in range(epochs):
+        started = time.perf_counter()
+        model.train()
+        for x, y in iter_batches(train_windows, batch_size, seed=seed + epoch):
+            optimizer.zero_grad()
+            loss = loss_fn(model(x), y)
+            loss.backward()
+            optimizer.step()
+        val_loss = evaluate(model, val_windows)
+        history.append(val_loss)
+        logger.info(f"Эпоха {epoch + 1}/{epochs}: val_mse={val_loss:.6f} ({time.perf_counter() - started:.1f}s)")
+        if val_loss < best_loss:
+            best_loss, stale = val_loss, 0
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return {"val_mse": best_loss, "epochs": len(history), "train_windows": len(train_windows),
+            "val_windows": len(val_windows)}
+
+
+def checkpoint_dir(coin, interval, directory=None):
+    """Каталог версий одной модели: у каждой пары (coin, interval) свои веса, scaler и счётчик версий."""
+    return os.path.join(directory or CHECKPOINT_DIR, f"{coin}_{interval}")
+
+
+def list_checkpoints(coin, interval, directory=None):
+    """[(версия, путь)] модели (coin, interval) по возрастанию версии."""
+    directory = checkpoint_dir(coin, interval, directory)
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        match = CHECKPOINT_RE.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def list_models(directory=None):
+    """[(coin, interval)] всех моделей с чекпоинтами."""
+    directory = directory or CHECKPOINT_DIR
+    if not os.path.isdir(directory):
+        return []
+    models = []
+    for name in sorted(os.listdir(directory)):
+        coin, _, interval = name.rpartition("_")
+        if coin and os.path.isdir(os.path.join(directory, name)):
+            models.append((coin, interval))
+    return models
+
+
+def latest_checkpoint(coin, interval, directory=None):
+    checkpoints = list_checkpoints(coin, interval, directory)
+    return checkpoints[-1][1] if checkpoints else None
+
+
+def save_checkpoint(model, scaler, info, directory=None):
+    """Новая версия чекпоинта (coin, interval) из info: веса, scaler и метаданные; запись атомарная."""
+    checkpoints = list_checkpoints(info["coin"], info["interval"], directory)
+    directory = checkpoint_dir(info["coin"], info["interval"], directory)
+    os.makedirs(directory, exist_ok=True)
+    version = checkpoints[-1][0] + 1 if checkpoints else 1
+    payload = {
+        "version": version,
+        "state_dict": model.state_dict(),
+        "scaler": {"min": scaler[0], "range": scaler[1]},
+        "config": {"hidden_size": model.lstm.hidden_size, "num_layers": model.lstm.num_layers,
+                   "seq_length": info.get("seq_length", SEQ_LENGTH)},
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **info,
+    }
+    path = os.path.join(directory, f"lstm_v{version:04d}.pt")
+    torch.save(payload, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    logger.info(f"Сохранён чекпоинт LSTM v{version}: {path}")
+    return path
+
+
+def load_checkpoint(path):
+    """(модель в eval, scaler, метаданные) из файла чекпоинта."""
+    payload = torch.load(path, map_location="cpu", weights_only=False)
+    config = payload["config"]
+    model = LSTMPredictor(hidden_size=config["hidden_size"], num_layers=config["num_layers"])
+    model.load_state_dict(payload["state_dict"])
+    model.eval()
+    scaler = (payload["scaler"]["min"], payload["scaler"]["range"])
+    meta = {k: v for k, v in payload.items() if k != "state_dict"}
+    return model, scaler, meta
+
+
+def train_from_history(frame, coin, interval, seq_length=SEQ_LENGTH, directory=None, **train_kwargs):
+    """Обучение с нуля на истории frame (колонки time/close) и сохранение новой версии."""
+    prices = frame["close"].to_numpy(dtype=np.float64)
+    scaler = fit_scaler(prices[:int(len(prices) * (1 - VAL_FRACTION))])  # Без утечки из валидации
+    windows = sliding_windows(scale(prices, scaler), seq_length)
+    model = LSTMPredictor()
+    metrics = train(model, windows, **train_kwargs)
+    info = {"coin": coin, "interval": interval, "seq_length": seq_length, "parent": None,
+            "trained_until": int(frame["time"].iloc[-1]), "metrics": metrics}
+    return save_checkpoint(model, scaler, info, directory)
+
+
+def fine_tune(frame, coin, interval, path=None, directory=None, replay_bars=500, epochs=3, lr=2e-4,
+              **train_kwargs):
+    """Дообучить последний чекпоинт (coin, interval) на свечах, закрытых после trained_until (+ replay_bars истории).
+
+    Scaler не меняется, чтобы веса оставались в том же масштабе; без новых свечей — None.
+    """
+    path = path or latest_checkpoint(coin, interval, directory)
+    if path is None:
+        raise FileNotFoundError(f"Нет чекпоинта {coin}/{interval} для дообучения: сначала train")
+    model, scaler, meta = load_checkpoint(path)
+    if (meta.get("coin"), meta.get("interval")) != (coin, interval):
+        raise ValueError(f"Чекпоинт {path} обучен на {meta.get('coin')}/{meta.get('interval')}, а не {coin}/{interval}")
+    seq_length = meta["config"]["seq_length"]
+    times = frame["time"].to_numpy()
+    new_from = int(np.searchsorted(times, meta["trained_until"], side="right"))
+    if new_from >= len(times):
+        logger.info(f"Новых свечей после {meta['trained_until']} нет, дообучение пропущено")
+        return None
+    start = max(0, new_from - seq_length - replay_bars)  # Контекст + часть старой истории против забывания
+    prices = frame["close"].to_numpy(dtype=np.float64)[start:]
+    windows = sliding_windows(scale(prices, scaler), seq_length)
+    metrics = train(model, windows, epochs=epochs, lr=lr, **train_kwargs)
+    info = {"coin": coin, "interval": interval, "seq_length": seq_length,
+            "parent": meta["version"], "trained_until": int(times[-1]), "new_bars": len(times) - new_from,
+            "metrics": metrics}
+    return save_checkpoint(model, scaler, info, directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обучение и дообучение LSTMPredictor с версионными чекпоинтами")
+    parser.add_argument("command", choices=("train", "finetune", "list"))
+    parser.add_argument("--coin", default="BTC")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--start", default=os.getenv("BACKTESTING_START", "2025-01-01"))
+    parser.add_argument("--end", default=None, help="YYYY-MM-DD (по умолчанию — сейчас)")
+    parser.add_argument("--dir", default=None, help="Каталог чекпоинтов (LSTM_CHECKPOINT_DIR)")
+    parser.add_argument("--epochs", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=None, help="Потоки torch для обучения")
+    parser.add_argument("--offline", action="store_true", help="Только локальное хранилище, без API")
+    args = parser.parse_args(argv)
+    log_pipeline.configure()
+
+    if args.command == "list":
+        for coin, interval in list_models(args.dir):
+            for version, path in list_checkpoints(coin, interval, args.dir):
+                _, _, meta = load_checkpoint(path)
+                print(f"{coin}/{interval} v{version}: до {meta.get('trained_until')} "
+                      f"parent={meta.get('parent')} val_mse={meta.get('metrics', {}).get('val_mse')}")
+        return
+
+    start_ts = int(datetime.strptime(args.start, "%Y-%m-%d").timestamp() * 1000)
+    end_ts = int(datetime.strptime(args.end, "%Y-%m-%d").timestamp() * 1000) if args.end else int(time.time() * 1000)
+    api = None
+    if not args.offline:
+        from api_interface import get_api
+        api = get_api()
+    frame = CandleStore(api).frame(coin=args.coin, interval=args.interval, start_time=start_ts, end_time=end_ts)
+    # Только закрытые свечи: последняя может быть ещё в процессе
+    frame = frame[frame["time"] + INTERVAL_MS.get(args.interval, 3_600_000) <= end_ts]
+    if len(frame) <= SEQ_LENGTH + 1:
+        print("Недостаточно свечей для обучения")
+        return
+    kwargs = {"batch_size": args.batch_size, "threads": args.threads}
+    if args.command == "train":
+        path = train_from_history(frame, args.coin, args.interval, directory=args.dir,
+                                  epochs=args.epochs or 20, **kwargs)
+    else:
+        path = fine_tune(frame, args.coin, args.interval, directory=args.dir, epochs=args.epochs or 3, **kwargs)
+    if path:
+        _, _, meta = load_checkpoint(path)
+        print(json.dumps({"path": path, "version": meta["version"], "metrics": meta["metrics"]}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
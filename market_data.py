@@ -0,0 +1,189 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict, deque
+from hyperliquid.websocket_manager import WebsocketManager
+
+logger = logging.getLogger(__name__)
+
+MIDS = "allMids"
+
+
+def candle_key(coin, interval):
+    return f"candle:{coin},{interval}"
+
+
+def trades_key(coin):
+    return f"trades:{coin}"
+
+
+def l2_key(coin):
+    return f"l2Book:{coin}"
+
+
+class MarketDataHub:
+    """Одна WebSocket-подписка на фид (allMids, candle, trades) с кэшем в памяти и fan-out потребителям.
+
+    Кэш обновляется заменой ссылок (атомарно под GIL), поэтому чтение не берёт блокировок.
+    Watchdog переподключается и заново подписывается, если поток сокета умер или данные устарели.
+    """
+
+    def __init__(self, base_url, stale_after=30, trades_history=500):
+        self.base_url = base_url
+        self.stale_after = stale_after
+        self.trades_history = trades_history
+        self.mids = {}
+        self.mids_time = 0.0
+        self.candles = {}  # (coin, interval) -> последняя (строящаяся) свеча
+        self.trades = {}  # coin -> deque последних сделок
+        self.last_message = 0.0
+        self.reconnects = 0
+        self._feeds = {}  # key -> subscription
+        self._callbacks = defaultdict(list)
+        self._queues = defaultdict(list)  # key -> [(loop, queue)]
+        self._ws = None
+        self._lock = threading.Lock()  # Только для управления подписками, не для чтения кэша
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def start(self):
+        with self._lock:
+            if self._ws is not None:
+                return self
+            self._connect()
+            self._watchdog = threading.Thread(target=self._watch, name="market-data-watchdog", daemon=True)
+            self._watchdog.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._disconnect()
+
+    def _connect(self):
+        self._ws = WebsocketManager(self.base_url)
+        self._ws.daemon = True
+        self._ws.start()
+        self.last_message = time.time()
+        for subscription in self._feeds.values():
+            self._ws.subscribe(subscription, self._on_message)
+        logger.info(f"Market data WebSocket подключён, фидов: {len(self._feeds)}")
+
+    def _disconnect(self):
+        if self._ws is not None:
+            try:
+                self._ws.stop()
+            except Exception as e:
+                logger.error(f"Ошибка закрытия WebSocket: {e}")
+            self._ws = None
+
+    def _watch(self):
+        while not self._stop.wait(5):
+            stale = self._feeds and self.stale_after and time.time() - self.last_message > self.stale_after
+            if self._ws is not None and self._ws.is_alive() and not stale:
+                continue
+            logger.warning("Market data WebSocket потерян или устарел, переподключение")
+            with self._lock:
+                self._disconnect()
+                try:
+                    self._connect()
+                    self.reconnects += 1
+                except Exception as e:
+                    logger.error(f"Ошибка переподключения WebSocket: {e}")
+
+    def _feed(self, key, subscription, callback=None):
+        with self._lock:
+            if callback is not None:
+                self._callbacks[key].append(callback)
+            if key not in self._feeds:
+                self._feeds[key] = subscription
+                if self._ws is not None:
+                    self._ws.subscribe(subscription, self._on_message)
+        return key
+
+    def subscribe_mids(self, callback=None):
+        """Подписка на все mid-цены; callback(mids_dict) на каждое обновление."""
+        return self._feed(MIDS, {"type": "allMids"}, callback)
+
+    def subscribe_candles(self, coin, interval="1m", callback=None):
+        """Подписка на строящиеся свечи; callback(candle_dict) на каждое обновление."""
+        return self._feed(candle_key(coin, interval), {"type": "candle", "coin": coin, "interval": interval}, callback)
+
+    def subscribe_trades(self, coin, callback=None):
+        """Подписка на сделки; callback(list_of_trades) на каждое сообщение."""
+        return self._feed(trades_key(coin), {"type": "trades", "coin": coin}, callback)
+
+    def subscribe_l2(self, coin, callback=None):
+        """Подписка на L2-стакан; callback(l2_data) на каждый снимок (хранение — orderbook.OrderBooks)."""
+        return self._feed(l2_key(coin), {"type": "l2Book", "coin": coin}, callback)
+
+    def queue(self, key, maxsize=1000):
+        """asyncio.Queue обновлений фида для текущего event loop (при переполнении теряются старые)."""
+        queue = asyncio.Queue(maxsize=maxsize)
+        with self._lock:
+            self._queues[key].append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def get_mid(self, coin, max_age=None):
+        """Mid-цена из памяти (None, если нет данных или они старше max_age секунд)."""
+        if max_age is not None and time.time() - self.mids_time > max_age:
+            return None
+        return self.mids.get(coin)
+
+    def get_candle(self, coin, interval="1m"):
+        return self.candles.get((coin, interval))
+
+    def get_trades(self, coin):
+        return list(self.trades.get(coin, ()))
+
+    def _on_message(self, msg):
+        self.last_message = time.time()
+        channel = msg.get("channel")
+        data = msg.get("data")
+        if channel == "allMids":
+            self.mids = {coin: float(px) for coin, px in data["mids"].items()}
+            self.mids_time = self.last_message
+            self._dispatch(MIDS, self.mids)
+        elif channel == "candle":
+            candle = {"time": data["t"], "close_time": data["T"], "open": float(data["o"]), "high": float(data["h"]),
+                      "low": float(data["l"]), "close": float(data["c"]), "volume": float(data["v"])}
+            self.candles[(data["s"], data["i"])] = candle
+            self._dispatch(candle_key(data["s"], data["i"]), candle)
+        elif channel == "l2Book":
+            self._dispatch(l2_key(data["coin"]), data)
+        elif channel == "trades" and data:
+            coin = data[0]["coin"]
+            history = self.trades.get(coin)
+            if history is None:
+                history = self.trades[coin] = deque(maxlen=self.trades_history)
+            history.extend(data)
+            self._dispatch(trades_key(coin), data)
+
+    def _dispatch(self, key, payload):
+        for callback in tuple(self._callbacks.get(key, ())):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Ошибка в callback market data {key}: {e}")
+        for loop, queue in tuple(self._queues.get(key, ())):
+            loop.call_soon_threadsafe(_put_latest, queue, payload)
+
+
+def _put_latest(queue, payload):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def get_market_data_hub(base_url):
+    """Общий на процесс hub для base_url (создаётся и подключается при первом обращении)."""
+    with _hubs_lock:
+        hub = _hubs.get(base_url)
+        if hub is None:
+            hub = _hubs[base_url] = MarketDataHub(base_url)
+    return hub.start()
@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "trade_agent"
+# Границы бакетов латентности (с): от сотен микросекунд до минуты
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_DUMP = os.getenv("METRICS_DUMP", "")
+TRACE_HISTORY = 200
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def quantile(self, q, **labels):
+        """Оценка квантиля по бакетам (верхняя граница бакета)."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state[2]:
+                return None
+            counts, total = list(state[0]), state[2]
+        rank, seen = q * total, 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def expose(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._values.items()]
+        lines = self.header()
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса с выдачей в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help_text, labels, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help_text, labels=()):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def expose(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Латентность стадии цикла", ("loop", "stage"))
+TICK_TO_ACK = REGISTRY.histogram("tick_to_ack_seconds", "От начала итерации цикла до ack ордера", ("loop",))
+LOOP_LAG = REGISTRY.gauge("loop_lag_seconds", "Опоздание пробуждения цикла после sleep", ("loop",))
+LOOP_ITERATIONS = REGISTRY.counter("loop_iterations_total", "Итерации торгового цикла", ("loop",))
+LOOP_ERRORS = REGISTRY.counter("loop_errors_total", "Исключения в торговом цикле", ("loop",))
+API_REQUESTS = REGISTRY.counter("api_requests_total", "Запросы к API Hyperliquid", ("endpoint",))
+API_ERRORS = REGISTRY.counter("api_errors_total", "Ошибки запросов к API Hyperliquid", ("endpoint",))
+RETRIES = REGISTRY.counter("retries_total", "Повторные попытки", ("component",))
+RATE_LIMIT_WAIT = REGISTRY.histogram("rate_limit_wait_seconds", "Ожидание в очереди лимитера", ("priority",))
+CLOSE_TO_SIGNAL = REGISTRY.histogram("close_to_signal_seconds", "От закрытия свечи до готового сигнала", ("job",))
+EVALUATIONS_SKIPPED = REGISTRY.counter("evaluations_skipped_total", "Пропущенные оценки стратегии", ("job", "reason"))
+GRID_ACTIONS = REGISTRY.counter("grid_actions_total", "Действия сверки сетки ордеров", ("coin", "action"))
+
+
+class Trace:
+    """Одна итерация цикла: набор span-ов (стадия, смещение от старта, длительность)."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.started = time.perf_counter()
+        self.wall_time = time.time()
+        self.spans = []
+
+    def add_span(self, stage, start, duration):
+        self.spans.append((stage, round((start - self.started) * 1000, 3), round(duration * 1000, 3)))
+
+    def as_dict(self):
+        return {"loop": self.loop, "ts": self.wall_time,
+                "spans": [{"stage": s, "offset_ms": o, "duration_ms": d} for s, o, d in list(self.spans)]}
+
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_traces = deque(maxlen=TRACE_HISTORY)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(loop):
+    """Итерация цикла: span-ы внутри привязываются к ней, по завершении она попадает в историю."""
+    tr = Trace(loop)
+    token = _current_trace.set(tr)
+    LOOP_ITERATIONS.inc(loop=loop)
+    try:
+        yield tr
+    except Exception:
+        LOOP_ERRORS.inc(loop=loop)
+        raise
+    finally:
+        _current_trace.reset(token)
+        _traces.append(tr)
+
+
+@contextmanager
+def span(stage, loop=None):
+    """Замер стадии: гистограмма stage_seconds и span в текущем trace (если есть)."""
+    tr = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, loop=loop or (tr.loop if tr else "none"), stage=stage)
+        if tr is not None:
+            tr.add_span(stage, start, duration)
+
+
+def record_ack(tr, started, duration):
+    """Ack ордера из другого потока: span order в trace, породившем ордер, и tick-to-ack."""
+    STAGE_SECONDS.observe(duration, loop=tr.loop if tr else "none", stage="order_ack")
+    if tr is not None:
+        tr.add_span("order_ack", started, duration)
+        TICK_TO_ACK.observe(started + duration - tr.started, loop=tr.loop)
+
+
+class LoopClock:
+    """Loop lag: насколько позже запланированного проснулся цикл после sleep()."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._expected = None
+
+    def tick(self):
+        """Вызывается в начале итерации: обновляет gauge loop_lag_seconds и возвращает лаг."""
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected) if self._expected is not None else 0.0
+        LOOP_LAG.set(lag, loop=self.loop)
+        return lag
+
+    def sleep(self, seconds):
+        self._expected = time.monotonic() + seconds
+        time.sleep(seconds)
+
+
+def recent_traces(limit=TRACE_HISTORY):
+    return [tr.as_dict() for tr in list(_traces)[-limit:]]
+
+
+def dump(path=None):
+    """Записать метрики (.prom) и последние trace (.traces.json) в файлы."""
+    path = path or METRICS_DUMP
+    if not path:
+        return
+    try:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(REGISTRY.expose())
+        os.replace(tmp, path)
+        with open(f"{path}.traces.json", "w") as f:
+            json.dump(recent_traces(), f, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"Ошибка записи метрик в {path}: {e}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            body, content_type = REGISTRY.expose().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.startswith("/traces"):
+            body, content_type = json.dumps(recent_traces(), ensure_ascii=False).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Не засоряем логи запросами скрейпера
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=None, host=None):
+    """Локальный endpoint /metrics (Prometheus) и /traces (JSON); порт 0 в METRICS_PORT — выключено.
+
+    METRICS_PORT читается при вызове: реплей и тесты выключают порт через env уже после импорта модуля.
+    """
+    global _server
+    port = int(os.getenv("METRICS_PORT", METRICS_PORT)) if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host or os.getenv("METRICS_HOST", "127.0.0.1"), port), _Handler)
+            except OSError as e:
+                logger.error(f"Не удалось открыть порт метрик {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"Метрики доступны на http://{_server.server_address[0]}:{_server.server_address[1]}/metrics")
+    return _server
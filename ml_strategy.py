@@ -2,11 +2,12 @@ import os
 from dotenv import load_dotenv
 import numpy as np
 import pandas as pd
-import torch
-import torch.nn as nn
-from sklearn.preprocessing import MinMaxScaler
-import pandas_ta as ta  # Для Chop indicator
-from api_interface import HyperliquidAPI
+from api_interface import get_api
+from candle_store import CandleStore
+from indicators import StreamingIndicators, INDICATOR_COLUMNS, chop
+from backtest import run_backtest
+from signal_backends import load_backends
+import metrics
 from hyperliquid.utils import constants
 import logging
 import time
@@ -15,56 +16,44 @@ from datetime import datetime, timedelta
 load_dotenv()  # Загружаем .env для BACKTESTING_START/END
 
 class MLStrategy:
-    def __init__(self, testnet=True, grid_mode=False):
-        logging.basicConfig(
-            filename='ml_strategy.log',
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+    def __init__(self, testnet=True, grid_mode=False, backends=None, api=None):
         self.logger = logging.getLogger(__name__)
         self.logger.info("MLStrategy инициализирован")  # Test-log: Запишет при создании объекта
         self.model = None
         self.base_url = constants.TESTNET_API_URL if testnet else constants.MAINNET_API_URL
-        self.api = HyperliquidAPI()
-        self.scaler = MinMaxScaler()
-        self.lstm_model = self._build_lstm()
+        self.api = api if api is not None else get_api()  # Общий на процесс клиент
+        self.candle_store = CandleStore(self.api)
+        self.indicators = StreamingIndicators()  # Инкрементальные индикаторы для live-цикла
+        # Грузятся только включённые бэкенды (env SIGNAL_BACKENDS): без lstm torch не импортируется
+        self.backends = load_backends(backends)
         self.is_grid_mode = grid_mode
         self.chop_threshold = 50  # Threshold для ranging market (из algogene.com)
 
-    def _build_lstm(self):
-        """Построить простую LSTM-модель для предсказаний цен."""
-        class LSTMPredictor(nn.Module):
-            def __init__(self):
-                super().__init__()
-                self.lstm = nn.LSTM(input_size=1, hidden_size=50, num_layers=1, batch_first=True)
-                self.linear = nn.Linear(50, 1)
+    def fetch_historical_data(self, asset="BTC", interval="1h", lookback_hours=24, end_ms=None):
+        """Получить реальные исторические данные. Используем env dates для timeshift.
 
-            def forward(self, x):
-                _, (hn, _) = self.lstm(x)
-                return self.linear(hn[-1])
-
-        model = LSTMPredictor()
-        return model
-
-    def fetch_historical_data(self, asset="BTC", interval="1h", lookback_hours=24):
-        """Получить реальные исторические данные. Используем env dates для timeshift."""
+        end_ms — верхняя граница окна (планировщик передаёт момент закрытия свечи, чтобы не брать
+        формирующуюся); без неё — BACKTESTING_END, а если он не задан — текущий момент.
+        """
         try:
             start_date = os.getenv("BACKTESTING_START", "2025-01-01")
-            end_date = os.getenv("BACKTESTING_END", datetime.now().strftime("%Y-%m-%d"))
-            end_ts = int(datetime.strptime(end_date, "%Y-%m-%d").timestamp() * 1000)
+            end_date = os.getenv("BACKTESTING_END")
+            if end_ms is not None:
+                end_ts = int(end_ms)
+            elif end_date:
+                end_ts = int(datetime.strptime(end_date, "%Y-%m-%d").timestamp() * 1000)
+            else:
+                end_ts = int(datetime.now().timestamp() * 1000)  # Не полночь: иначе live видит только вчерашние свечи
             start_ts = end_ts - (lookback_hours * 3600 * 1000)
-            candles = self.api.get_candles(coin=asset, interval=interval, start_time=start_ts, end_time=end_ts)
+            # Локальное хранилище догружает только недостающий хвост, окно отдаётся view на memmap
+            df = self.candle_store.frame(coin=asset, interval=interval, start_time=start_ts, end_time=end_ts)
             
-            if candles and len(candles) > 0:
-                df = pd.DataFrame(candles, columns=["time", "open", "high", "low", "close", "volume"])
+            if not df.empty:
                 df["time"] = pd.to_datetime(df["time"], unit="ms").dt.strftime('%Y-%m-%d %H:%M:%S')  # Format как строка
-                df = df.sort_values("time").reset_index(drop=True)
                 
-                user_state = self.api.get_balance()
-                funding_rate = float(user_state.get("fundingRate", 0)) if "fundingRate" in user_state else 0.0001
-                df["funding_rate"] = funding_rate
+                df["funding_rate"] = self.api.get_funding_rate()  # Из общего снимка user_state
                 
-                self.logger.info(f"Загружены реальные данные для {asset}: {len(df)} свечей с env dates {start_date} to {end_date}")
+                self.logger.info("Загружены реальные данные для %s: %s свечей с env dates %s to %s", asset, len(df), start_date, end_date or end_ts)
                 return df
             else:
                 self.logger.warning("Нет реальных данных, fallback на синтетику")
@@ -112,67 +101,75 @@ class MLStrategy:
             df["BB_upper"] = df["SMA20"] + (df["close"].rolling(window=20, min_periods=1).std() * 2)
             df["BB_lower"] = df["SMA20"] - (df["close"].rolling(window=20, min_periods=1).std() * 2)
             # Chop indicator для grid (из algogene.com)
-            df["chop"] = ta.chop(df["high"], df["low"], df["close"], length=14)
+            df["chop"] = chop(df["high"], df["low"], df["close"], length=14)
             self.logger.info("Индикаторы рассчитаны: SMA, RSI, BB, Chop")
             return df
         except Exception as e:
             self.logger.error(f"Ошибка расчёта индикаторов: {e}")
             return df
 
+    def update_indicators(self, df):
+        """Инкрементально обновить индикаторы (O(1) на новую свечу) и записать колонки всего df.
+
+        Значения строк берутся из истории потокового расчёта; если каких-то свечей df в ней нет,
+        колонки пересчитываются целиком.
+        """
+        try:
+            if df.empty:
+                return df
+            self.indicators.update_frame(df)
+            columns = self.indicators.frame_columns(df["time"].tolist())
+            if columns is None:
+                return self.calculate_indicators(df)
+            for column in INDICATOR_COLUMNS:
+                df[column] = columns[column]
+            return df
+        except Exception as e:
+            self.logger.error(f"Ошибка инкрементального расчёта индикаторов: {e}")
+            return self.calculate_indicators(df)
+
+    def calculate_indicators_multi(self, resampler, intervals=None, include_partial=False):
+        """Индикаторы на нескольких таймфреймах из локального Resampler (без запросов к API)."""
+        frames = {}
+        for interval in intervals or resampler.intervals:
+            frames[interval] = self.calculate_indicators(resampler.frame(interval, include_partial))
+        return frames
+
     def get_sentiment(self, asset="BTC"):
-        """Получить sentiment (заглушка; позже NLP)."""
+        """Получить sentiment (0.0, если бэкенд sentiment выключен)."""
         try:
-            sentiment_score = 0.5  # Bullish
-            self.logger.info(f"Sentiment для {asset}: {sentiment_score}")
+            backend = self.backends.get("sentiment")
+            sentiment_score = backend.score(asset) if backend else 0.0
+            self.logger.info("Sentiment для %s: %s", asset, sentiment_score)
             return sentiment_score
         except Exception as e:
             self.logger.error(f"Ошибка sentiment: {e}")
             return 0.0
 
-    def get_signal(self, df):
+    def get_signal(self, df, asset="BTC", interval="1h"):
+        """Сигнал по последней свече df; asset/interval — рынок df (по нему выбираются LSTM и sentiment)."""
         try:
             if df.empty or len(df) < 50:
                 self.logger.warning("Данные недостаточны, сигнал HOLD")
                 return "HOLD"
             
-            df = self.calculate_indicators(df)
+            if not set(INDICATOR_COLUMNS).issubset(df.columns):
+                with metrics.span("indicators_full"):
+                    df = self.calculate_indicators(df)  # Не пересчитываем, если индикаторы уже есть
             last_row = df.iloc[-1]
             
             # Базовый сигнал SMA/RSI
-            base_signal = "HOLD"
-            if last_row["SMA10"] > last_row["SMA50"] and last_row["RSI"] < 70:
-                base_signal = "BUY"
-            elif last_row["SMA10"] < last_row["SMA50"] and last_row["RSI"] > 30:
-                base_signal = "SELL"
+            rules = self.backends.get("rules")
+            with metrics.span("rules"):
+                base_signal = rules.evaluate(df) if rules else "HOLD"
             
             # LSTM с train/test split (80/20, чтобы избежать overfitting как в paperswithbacktest.com)
-            lstm_signal = "HOLD"
-            if len(df) > 100:
-                prices = pd.to_numeric(df["close"], errors='coerce').dropna().values.reshape(-1, 1)
-                if len(prices) > 20:  # Min для split
-                    split_idx = int(len(prices) * 0.8)  # 80% train
-                    train_prices = prices[:split_idx]
-                    test_prices = prices[split_idx:]
-                    scaled_train = self.scaler.fit_transform(train_prices)
-                    # Простой pred на last 10 из test (упрощённо, без full train loop)
-                    seq_length = 10
-                    if len(test_prices) >= seq_length:
-                        seq = self.scaler.transform(test_prices[-seq_length:].reshape(-1, 1)).reshape(1, seq_length, 1)
-                        seq_tensor = torch.tensor(seq, dtype=torch.float32)
-                        self.lstm_model.eval()
-                        with torch.no_grad():
-                            pred_scaled = self.lstm_model(seq_tensor).item()
-                        pred_price = self.scaler.inverse_transform([[pred_scaled]])[0][0]
-                        current_price = last_row["close"]
-                        if pred_price > current_price * 1.001:
-                            lstm_signal = "BUY"
-                        elif pred_price < current_price * 0.999:
-                            lstm_signal = "SELL"
-                        self.logger.info(f"LSTM предсказание (split 80/20): {pred_price:.2f} vs {current_price:.2f} -> {lstm_signal}")
-            else:
-                self.logger.warning("Недостаточно данных для LSTM")
+            lstm = self.backends.get("lstm")
+            with metrics.span("lstm"):
+                lstm_signal = lstm.evaluate(df, asset, interval) if lstm else "HOLD"
             
-            sentiment = self.get_sentiment()
+            with metrics.span("sentiment"):
+                sentiment = self.get_sentiment(asset)
             signal = base_signal
             if lstm_signal != "HOLD" and lstm_signal == base_signal:
                 signal = lstm_signal  # Усиление
@@ -185,14 +182,20 @@ class MLStrategy:
             chop_value = last_row["chop"] if "chop" in last_row else 0
             if (self.is_grid_mode or chop_value > self.chop_threshold) and abs(last_row["close"] - last_row["SMA50"]) / last_row["SMA50"] > 0.02:
                 signal = f"GRID_{signal}" if signal != "HOLD" else "HOLD"
-                self.logger.info(f"Grid активирован (chop={chop_value:.2f}): {signal}")
+                self.logger.info("Grid активирован (chop=%.2f): %s", chop_value, signal)
             
             # Учёт funding rate
             if last_row["funding_rate"] < 0 and signal == "BUY":
                 signal = "HOLD"
             
-            self.logger.info(f"Финальный сигнал: {signal}, base={base_signal}, lstm={lstm_signal}, sentiment={sentiment}, chop={chop_value:.2f}")
+            self.logger.info("Финальный сигнал: %s, base=%s, lstm=%s, sentiment=%s, chop=%.2f", signal, base_signal, lstm_signal, sentiment, chop_value)
             return signal
         except Exception as e:
             self.logger.error(f"Ошибка генерации сигнала: {e}")
             return "HOLD"
+
+    def backtest(self, df, **kwargs):
+        """Векторный бэктест правил get_signal на истории df (см. backtest.run_backtest)."""
+        params = {"grid_mode": self.is_grid_mode, "chop_threshold": self.chop_threshold}
+        params.update(kwargs.pop("params", {}))
+        return run_backtest(df, params=params, **kwargs)
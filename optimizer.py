@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import logging
+import log_pipeline
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from backtest import DEFAULT_PARAMS, compute_features, generate_signals, simulate, performance_stats
+from candle_store import CandleStore
+
+logger = logging.getLogger(__name__)
+
+# Параметры, зашитые в MLStrategy/get_signal, и сетка по умолчанию для их подбора
+DEFAULT_SPACE = {
+    "sma_fast": [5, 10, 20],
+    "sma_slow": [30, 50, 100],
+    "rsi_upper": [65, 70, 75, 80],
+    "rsi_lower": [20, 25, 30, 35],
+}
+# Меняют только GRID_* метку сигнала, а направление у неё то же, и лестница в simulate не моделируется:
+# в сетке они давали бы копии одной конфигурации с одинаковым результатом
+NO_EFFECT_KEYS = ("chop_threshold", "grid_distance")
+FEATURE_KEYS = ("sma_fast", "sma_slow", "rsi_length", "chop_length")  # Влияют на compute_features
+ARRAYS = ("close", "high", "low", "funding")
+
+_shm = None
+_arrays = None
+_settings = None
+_features_cache = {}
+
+
+def param_grid(space=None, search="grid", n_iter=100, seed=0):
+    """Конфигурации для перебора: полная сетка или n_iter случайных точек из неё без повторов."""
+    space = space or DEFAULT_SPACE
+    inert = [name for name in NO_EFFECT_KEYS if len(space.get(name, ())) > 1]
+    if inert:
+        logger.warning(f"Параметры {inert} не влияют на результат бэктеста: конфигурации будут дублироваться")
+    names = list(space)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    combos = [c for c in combos if c.get("sma_fast", 0) < c.get("sma_slow", np.inf)
+              and c.get("rsi_lower", 0) < c.get("rsi_upper", 100)]
+    if search == "random" and n_iter < len(combos):
+        rng = np.random.default_rng(seed)
+        combos = [combos[i] for i in rng.choice(len(combos), size=n_iter, replace=False)]
+    # Конфигурации с одинаковыми индикаторами рядом: воркер переиспользует посчитанные признаки
+    return sorted(combos, key=lambda c: tuple(c.get(k, DEFAULT_PARAMS[k]) for k in FEATURE_KEYS))
+
+
+def walk_forward_folds(n_bars, n_folds=4, train_fraction=0.7, anchored=False):
+    """Индексы фолдов (train_start, train_end, test_end): тест всегда строго после обучения."""
+    if anchored:
+        # Обучение от начала истории, тестовые окна идут подряд по хвосту
+        test_size = int(n_bars * (1 - train_fraction) / n_folds)
+        first_test = n_bars - test_size * n_folds
+        return [(0, first_test + k * test_size, first_test + (k + 1) * test_size) for k in range(n_folds)]
+    window = n_bars // (n_folds * (1 - train_fraction) + train_fraction)
+    train_size = int(window * train_fraction)
+    test_size = int(window - train_size)
+    return [(k * test_size, k * test_size + train_size, k * test_size + train_size + test_size)
+            for k in range(n_folds)]
+
+
+def share_arrays(frame):
+    """Скопировать колонки свечей в один блок shared memory; воркеры читают его без pickling."""
+    n = len(frame)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, n * len(ARRAYS) * 8))
+    block = np.ndarray((len(ARRAYS), n), dtype=np.float64, buffer=shm.buf)
+    block[0] = frame["close"].to_numpy(dtype=np.float64)
+    block[1] = frame["high"].to_numpy(dtype=np.float64)
+    block[2] = frame["low"].to_numpy(dtype=np.float64)
+    block[3] = frame["funding_rate"].to_numpy(dtype=np.float64) if "funding_rate" in frame else 0.0001
+    return shm, (shm.name, n)
+
+
+def _init_worker(shm_spec, settings):
+    """Подключить shared memory в процессе пула: массивы — read-only views без копий."""
+    global _shm, _arrays, _settings
+    name, n = shm_spec
+    _shm = shared_memory.SharedMemory(name=name)
+    block = np.ndarray((len(ARRAYS), n), dtype=np.float64, buffer=_shm.buf)
+    block.flags.writeable = False
+    _arrays = dict(zip(ARRAYS, block))
+    _settings = settings
+
+
+def _features(params):
+    key = tuple(params[k] for k in FEATURE_KEYS)
+    if key not in _features_cache:
+        _features_cache.clear()  # Конфигурации отсортированы по признакам — хватает одной записи
+        _features_cache[key] = compute_features(_arrays["close"], _arrays["high"], _arrays["low"], params)
+    return _features_cache[key]
+
+
+def _segment_stats(close, codes, start, end):
+    s = _settings
+    _, traded, equity = simulate(close[start:end], codes[start:end], s["qty"], s["mode"], s["fee_rate"],
+                                 s["slippage"], s["initial_equity"])
+    return performance_stats(equity, s["initial_equity"], np.count_nonzero(traded), s["interval"])
+
+
+def _evaluate(config):
+    """Сигналы по всей истории один раз (индикаторы причинные), статистика по train/test каждого фолда."""
+    params = {**DEFAULT_PARAMS, **_settings["base_params"], **config}
+    close = _arrays["close"]
+    codes = generate_signals(close, _arrays["high"], _arrays["low"], _arrays["funding"], params,
+                             features=_features(params))
+    folds = []
+    for train_start, train_end, test_end in _settings["folds"]:
+        folds.append({"train": _segment_stats(close, codes, train_start, train_end),
+                      "test": _segment_stats(close, codes, train_end, test_end)})
+    return config, folds
+
+
+def _summarize(config, folds):
+    test = [f["test"] for f in folds]
+    train = [f["train"] for f in folds]
+    return {
+        **config,
+        "test_sharpe": float(np.mean([t["sharpe"] for t in test])),
+        "test_sharpe_min": float(np.min([t["sharpe"] for t in test])),
+        "test_return": float(np.mean([t["total_return"] for t in test])),
+        "test_max_drawdown": float(np.max([t["max_drawdown"] for t in test])),
+        "test_trades": int(np.sum([t["trades"] for t in test])),
+        "train_sharpe": float(np.mean([t["sharpe"] for t in train])),
+    }
+
+
+def optimize(frame, space=None, search="grid", n_iter=100, n_folds=4, train_fraction=0.7, anchored=False,
+             processes=None, base_params=None, qty=0.008, mode="target", fee_rate=0.00035, slippage=0.0005,
+             initial_equity=10_000.0, interval="1h", seed=0):
+    """Перебор параметров с walk-forward валидацией в пуле процессов.
+
+    Возвращает (ranking, walk_forward): ranking — конфигурации по среднему Sharpe на тестовых
+    окнах; walk_forward — по фолдам лучшая на train конфигурация и её результат на test.
+    """
+    configs = param_grid(space, search, n_iter, seed)
+    folds = walk_forward_folds(len(frame), n_folds, train_fraction, anchored)
+    settings = {"folds": folds, "base_params": base_params or {}, "qty": qty, "mode": mode, "fee_rate": fee_rate,
+                "slippage": slippage, "initial_equity": initial_equity, "interval": interval}
+    processes = processes or os.cpu_count()
+    started = time.perf_counter()
+    shm, spec = share_arrays(frame)
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(spec, settings)) as pool:
+            chunksize = max(1, len(configs) // (processes * 4))
+            results = list(pool.map(_evaluate, configs, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+    logger.info(f"Оптимизация: {len(configs)} конфигураций x {len(folds)} фолдов "
+                f"за {time.perf_counter() - started:.1f}s ({processes} процессов)")
+
+    ranking = pd.DataFrame([_summarize(config, fold_stats) for config, fold_stats in results])
+    if not ranking.empty:
+        ranking = ranking.sort_values(["test_sharpe", "test_sharpe_min"], ascending=False).reset_index(drop=True)
+
+    walk_forward = []
+    for k, (train_start, train_end, test_end) in enumerate(folds):
+        config, fold_stats = max(results, key=lambda r: r[1][k]["train"]["sharpe"])
+        walk_forward.append({"fold": k, "train_bars": train_end - train_start, "test_bars": test_end - train_end,
+                             **config, "train_sharpe": fold_stats[k]["train"]["sharpe"],
+                             "test_sharpe": fold_stats[k]["test"]["sharpe"],
+                             "test_return": fold_stats[k]["test"]["total_return"],
+                             "test_max_drawdown": fold_stats[k]["test"]["max_drawdown"]})
+    return ranking, pd.DataFrame(walk_forward)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward подбор параметров правил MLStrategy")
+    parser.add_argument("--coin", default="BTC")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--start", default=os.getenv("BACKTESTING_START", "2025-01-01"))
+    parser.add_argument("--end", default=os.getenv("BACKTESTING_END", datetime.now().strftime("%Y-%m-%d")))
+    parser.add_argument("--search", choices=("grid", "random"), default="grid")
+    parser.add_argument("--n-iter", type=int, default=100, help="Число точек для --search random")
+    parser.add_argument("--space", default=None, help="JSON-файл {параметр: [значения]} вместо сетки по умолчанию")
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--train-fraction", type=float, default=0.7)
+    parser.add_argument("--anchored", action="store_true", help="Обучение всегда от начала истории")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--mode", choices=("target", "accumulate"), default="target")
+    parser.add_argument("--grid-mode", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--offline", action="store_true", help="Только локальное хранилище, без API")
+    parser.add_argument("--out", default="optimizer_results.csv")
+    parser.add_argument("--walk-forward-out", default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+    log_pipeline.configure()
+
+    start_ts = int(datetime.strptime(args.start, "%Y-%m-%d").timestamp() * 1000)
+    end_ts = int(datetime.strptime(args.end, "%Y-%m-%d").timestamp() * 1000)
+    api = None
+    if not args.offline:
+        from api_interface import get_api
+        api = get_api()
+    frame = CandleStore(api).frame(coin=args.coin, interval=args.interval, start_time=start_ts, end_time=end_ts)
+    if frame.empty:
+        print("Нет свечей в хранилище для заданного периода")
+        return
+    space = None
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+
+    ranking, walk_forward = optimize(frame, space=space, search=args.search, n_iter=args.n_iter,
+                                     n_folds=args.folds, train_fraction=args.train_fraction,
+                                     anchored=args.anchored, processes=args.processes,
+                                     base_params={"grid_mode": args.grid_mode}, mode=args.mode,
+                                     interval=args.interval, seed=args.seed)
+    ranking.to_csv(args.out, index=False)
+    if args.walk_forward_out:
+        walk_forward.to_csv(args.walk_forward_out, index=False)
+    print(ranking.head(args.top).to_string(index=False))
+    print()
+    print(walk_forward.to_string(index=False))
+    print(f"Walk-forward out-of-sample Sharpe: {walk_forward['test_sharpe'].mean():.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LEVELS = 20  # Hyperliquid l2Book отдаёт до 20 уровней на сторону
+CAPACITY = 8192  # Снимков на монету в кольцевом буфере
+HEADER_MAGIC = 0x4C32424F4F4B  # "L2BOOK"
+ORDERBOOK_DIR = os.getenv("ORDERBOOK_DIR", "orderbooks")
+
+
+def record_dtype(depth=LEVELS):
+    """Один снимок стакана: время биржи и по depth уровней цены/объёма на сторону (пустые — NaN/0)."""
+    return np.dtype([("time", "<i8"), ("bid_px", "<f8", (depth,)), ("bid_sz", "<f8", (depth,)),
+                     ("ask_px", "<f8", (depth,)), ("ask_sz", "<f8", (depth,))])
+
+
+class OrderBookBuffer:
+    """Последние L2-снимки одной монеты в предвыделенном кольцевом буфере NumPy.
+
+    С path буфер лежит в memory-mapped файле (заголовок .hdr: magic, capacity, depth, число записей),
+    поэтому после рестарта история продолжается, а файл можно открыть для реплея. Запросы
+    (спред, глубина до цены, проскальзывание) считаются по последнему снимку без REST-запросов.
+    """
+
+    def __init__(self, coin, depth=LEVELS, capacity=CAPACITY, path=None, readonly=False):
+        self.coin = coin
+        self.depth = depth
+        self.capacity = capacity
+        self.path = path
+        self._lock = threading.Lock()
+        dtype = record_dtype(depth)
+        if path is None:
+            self.header = np.array([HEADER_MAGIC, capacity, depth, 0], dtype=np.int64)
+            self.data = np.zeros(capacity, dtype=dtype)
+            return
+        exists = os.path.exists(path) and os.path.exists(f"{path}.hdr")
+        if exists:
+            header = np.fromfile(f"{path}.hdr", dtype=np.int64, count=4)
+            exists = len(header) == 4 and header[0] == HEADER_MAGIC and header[1] == capacity and header[2] == depth
+            if not exists and not readonly:
+                logger.warning(f"Стакан {coin}: формат {path} не совпадает, файл пересоздаётся")
+        if readonly:
+            if not exists:
+                raise FileNotFoundError(f"Нет буфера стакана {path}")
+            self.header = np.memmap(f"{path}.hdr", dtype=np.int64, mode="r", shape=(4,))
+            self.data = np.memmap(path, dtype=dtype, mode="r", shape=(capacity,))
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        mode = "r+" if exists else "w+"
+        self.data = np.memmap(path, dtype=dtype, mode=mode, shape=(capacity,))
+        self.header = np.memmap(f"{path}.hdr", dtype=np.int64, mode=mode, shape=(4,))
+        if not exists:
+            self.header[:] = (HEADER_MAGIC, capacity, depth, 0)
+        elif self.header[3]:
+            logger.info(f"Стакан {coin}: продолжение буфера {path} ({len(self)} снимков)")
+
+    @property
+    def total(self):
+        return int(self.header[3])
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, time_ms, bids, asks):
+        """Записать снимок: bids/asks — [(px, sz), ...] от лучшей цены."""
+        with self._lock:
+            slot = self.data[self.total % self.capacity]
+            slot["time"] = time_ms
+            for side, levels in (("bid", bids), ("ask", asks)):
+                levels = levels[:self.depth]
+                px = np.full(self.depth, np.nan)
+                sz = np.zeros(self.depth)
+                if len(levels):
+                    arr = np.asarray(levels, dtype=np.float64)
+                    px[:len(arr)], sz[:len(arr)] = arr[:, 0], arr[:, 1]
+                slot[f"{side}_px"] = px
+                slot[f"{side}_sz"] = sz
+            self.header[3] += 1  # Счётчик после данных: читатель не увидит недописанный снимок
+
+    def update(self, data):
+        """Сообщение l2Book (WebSocket) или ответ Info.l2_snapshot."""
+        bids, asks = data["levels"]
+        self.append(int(data["time"]), [(float(l["px"]), float(l["sz"])) for l in bids],
+                    [(float(l["px"]), float(l["sz"])) for l in asks])
+
+    def latest(self):
+        total = self.total
+        return self.data[(total - 1) % self.capacity] if total else None
+
+    def snapshots(self):
+        """Все снимки буфера по времени (копия) — для реплея и анализа."""
+        total, n = self.total, len(self)
+        start = total % self.capacity if total > self.capacity else 0
+        return np.concatenate((self.data[start:n], self.data[:start])) if start else np.array(self.data[:n])
+
+    def at(self, time_ms):
+        """Последний снимок не позже time_ms (None, если такого нет)."""
+        ordered = self.snapshots()
+        idx = int(np.searchsorted(ordered["time"], time_ms, side="right")) - 1
+        return ordered[idx] if idx >= 0 else None
+
+    def age(self, now=None):
+        """Возраст последнего снимка (с) по времени биржи."""
+        snapshot = self.latest()
+        if snapshot is None:
+            return None
+        return (time.time() if now is None else now) - int(snapshot["time"]) / 1000
+
+    def flush(self):
+        if isinstance(self.data, np.memmap) and self.data.mode != "r":
+            self.data.flush()
+            self.header.flush()
+
+    # --- запросы к снимку (по умолчанию — последний) ---
+
+    def _snapshot(self, snapshot):
+        return self.latest() if snapshot is None else snapshot
+
+    def best_bid(self, snapshot=None):
+        snapshot = self._snapshot(snapshot)
+        return None if snapshot is None or np.isnan(snapshot["bid_px"][0]) else float(snapshot["bid_px"][0])
+
+    def best_ask(self, snapshot=None):
+        snapshot = self._snapshot(snapshot)
+        return None if snapshot is None or np.isnan(snapshot["ask_px"][0]) else float(snapshot["ask_px"][0])
+
+    def mid(self, snapshot=None):
+        snapshot = self._snapshot(snapshot)
+        bid, ask = self.best_bid(snapshot), self.best_ask(snapshot)
+        return (bid + ask) / 2 if bid is not None and ask is not None else None
+
+    def spread(self, snapshot=None):
+        """(спред в цене, спред в bps от mid)."""
+        snapshot = self._snapshot(snapshot)
+        bid, ask = self.best_bid(snapshot), self.best_ask(snapshot)
+        if bid is None or ask is None:
+            return None, None
+        return ask - bid, (ask - bid) / ((ask + bid) / 2) * 10_000
+
+    def _taker_side(self, is_buy, snapshot):
+        """Уровни, которые съест агрессивный ордер: покупка — asks, продажа — bids."""
+        snapshot = self._snapshot(snapshot)
+        if snapshot is None:
+            return None, None
+        side = "ask" if is_buy else "bid"
+        sz = snapshot[f"{side}_sz"]
+        n = int(np.count_nonzero(sz))
+        return snapshot[f"{side}_px"][:n], sz[:n]
+
+    def depth_to_price(self, is_buy, price, snapshot=None):
+        """Объём, доступный taker-ордеру до цены price включительно."""
+        px, sz = self._taker_side(is_buy, snapshot)
+        if px is None:
+            return 0.0
+        mask = px <= price if is_buy else px >= price
+        return float(sz[mask].sum())
+
+    def slippage(self, is_buy, size, snapshot=None):
+        """Исполнение size по стакану: средняя и худшая цена, проскальзывание от mid (bps), исполнимость."""
+        snapshot = self._snapshot(snapshot)  # Один снимок на весь расчёт, даже если фид пишет новый
+        px, sz = self._taker_side(is_buy, snapshot)
+        mid = self.mid(snapshot)
+        if px is None or not len(px) or mid is None:
+            return {"avg_px": None, "worst_px": None, "slippage_bps": None, "filled": 0.0, "complete": False}
+        cum = np.cumsum(sz)
+        last = int(np.searchsorted(cum, size, side="left"))
+        complete = last < len(cum)
+        last = min(last, len(cum) - 1)
+        take = sz[:last + 1].copy()
+        take[-1] -= max(0.0, cum[last] - size)
+        filled = float(take.sum())
+        avg_px = float((px[:last + 1] * take).sum() / filled) if filled else None
+        slip = (avg_px - mid) / mid * 10_000 if is_buy else (mid - avg_px) / mid * 10_000
+        return {"avg_px": avg_px, "worst_px": float(px[last]), "slippage_bps": float(slip), "filled": filled,
+                "complete": complete}
+
+    def limit_price(self, is_buy, size, snapshot=None):
+        """Худшая цена уровня, на котором size исполнится целиком (None, если глубины не хватает)."""
+        result = self.slippage(is_buy, size, snapshot)
+        return result["worst_px"] if result["complete"] else None
+
+
+class OrderBooks:
+    """Буферы стаканов по монетам с подпиской на l2Book через MarketDataHub."""
+
+    def __init__(self, root=None, depth=LEVELS, capacity=CAPACITY, persist=True):
+        self.root = root or ORDERBOOK_DIR
+        self.depth = depth
+        self.capacity = capacity
+        self.persist = persist
+        self.books = {}
+        self._attached = set()
+        self._lock = threading.Lock()
+
+    def book(self, coin):
+        with self._lock:
+            if coin not in self.books:
+                path = os.path.join(self.root, f"{coin}.l2") if self.persist else None
+                self.books[coin] = OrderBookBuffer(coin, self.depth, self.capacity, path)
+            return self.books[coin]
+
+    def attach(self, hub, coin):
+        """Подписать буфер coin на l2Book фид hub (повторный вызов ничего не делает)."""
+        book = self.book(coin)
+        with self._lock:
+            if coin in self._attached:
+                return book
+            self._attached.add(coin)
+        hub.subscribe_l2(coin, callback=book.update)
+        return book
+
+    def get(self, coin, max_age=None):
+        """Буфер coin, если в нём есть снимок не старше max_age секунд; иначе None."""
+        book = self.books.get(coin)
+        if book is None or not book.total:
+            return None
+        if max_age is not None and book.age() > max_age:
+            return None
+        return book
+
+    def flush(self):
+        for book in list(self.books.values()):
+            book.flush()
+
+
+_books = None
+_books_lock = threading.Lock()
+
+
+def get_order_books():
+    """Общие на процесс буферы стаканов."""
+    global _books
+    with _books_lock:
+        if _books is None:
+            _books = OrderBooks()
+    return _books
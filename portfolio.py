@@ -0,0 +1,232 @@
+import os
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVERAGE = 20
+DEFAULT_MAX_LEVERAGE = 50
+# Лимиты pre-trade проверки: суммарный notional / equity и доля equity на одну монету
+MAX_GROSS_LEVERAGE = float(os.getenv("RISK_MAX_GROSS_LEVERAGE", "5"))
+MAX_COIN_EXPOSURE = float(os.getenv("RISK_MAX_COIN_EXPOSURE", "3"))
+MIN_LIQ_DISTANCE = float(os.getenv("RISK_MIN_LIQ_DISTANCE", "0.1"))  # Не ближе 10% до ликвидации после сделки
+
+
+class Portfolio:
+    """Позиции в NumPy-массивах (индекс монеты, знаковый размер, вход, плечо, mark) с риском по портфелю.
+
+    on_fill/on_mid обновляют массивы и пересчитывают PnL, экспозицию, маржу и расстояние до
+    ликвидации векторно; агрегаты кэшируются, поэтому pre_trade_check — только арифметика по
+    скалярам, единицы микросекунд. Модель маржи — cross, как у Hyperliquid: maintenance —
+    половина initial margin при максимальном плече монеты.
+    """
+
+    def __init__(self, capacity=16, collateral=0.0):
+        self.coins = []
+        self.index = {}
+        self.size = np.zeros(capacity)  # >0 long, <0 short
+        self.entry = np.zeros(capacity)
+        self.leverage = np.full(capacity, float(DEFAULT_LEVERAGE))
+        self.max_leverage = np.full(capacity, float(DEFAULT_MAX_LEVERAGE))
+        self.mark = np.full(capacity, np.nan)
+        self.collateral = float(collateral)  # Equity без нереализованного PnL
+        self.realized = 0.0
+        self.fees = 0.0
+        self.totals = {}
+        self._lock = threading.Lock()
+        self._recompute()
+
+    def _slot(self, coin):
+        idx = self.index.get(coin)
+        if idx is None:
+            idx = len(self.coins)
+            if idx == len(self.size):
+                grow = len(self.size)
+                self.size = np.concatenate((self.size, np.zeros(grow)))
+                self.entry = np.concatenate((self.entry, np.zeros(grow)))
+                self.leverage = np.concatenate((self.leverage, np.full(grow, float(DEFAULT_LEVERAGE))))
+                self.max_leverage = np.concatenate((self.max_leverage, np.full(grow, float(DEFAULT_MAX_LEVERAGE))))
+                self.mark = np.concatenate((self.mark, np.full(grow, np.nan)))
+            self.coins.append(coin)
+            self.index[coin] = idx
+        return idx
+
+    def load_user_state(self, user_state, mids=None):
+        """Синхронизация с user_state Hyperliquid: assetPositions[i]["position"] и marginSummary."""
+        positions = user_state.get("assetPositions", [])
+        account_value = float(user_state.get("marginSummary", {}).get("accountValue", 0) or 0)
+        with self._lock:
+            self.size[:] = 0.0
+            unrealized = self._load_positions(positions, mids)
+            self.collateral = account_value - unrealized
+            self._recompute()
+        return self
+
+    def load_positions(self, positions, mids=None):
+        """Позиции из get_positions() (без баланса): для расчёта PnL и экспозиции."""
+        with self._lock:
+            self.size[:] = 0.0
+            self._load_positions(positions, mids)
+            self._recompute()
+        return self
+
+    def _load_positions(self, positions, mids):
+        unrealized = 0.0
+        for item in positions:
+            pos = item.get("position", item)
+            idx = self._slot(pos["coin"])
+            self.size[idx] = float(pos.get("szi", 0) or 0)
+            self.entry[idx] = float(pos.get("entryPx", 0) or 0)
+            leverage = pos.get("leverage") or {}
+            self.leverage[idx] = float(leverage.get("value", DEFAULT_LEVERAGE) if isinstance(leverage, dict) else leverage)
+            if pos.get("maxLeverage"):
+                self.max_leverage[idx] = float(pos["maxLeverage"])
+            unrealized += float(pos.get("unrealizedPnl", 0) or 0)
+            if pos.get("positionValue") and self.size[idx]:
+                self.mark[idx] = float(pos["positionValue"]) / abs(self.size[idx])  # Mark биржи на момент снимка
+        if mids:
+            for coin, px in mids.items():
+                idx = self.index.get(coin)
+                if idx is not None:
+                    self.mark[idx] = float(px)
+        return unrealized
+
+    def set_max_leverage(self, meta):
+        """maxLeverage монет из Info.meta() — от него зависит maintenance margin."""
+        with self._lock:
+            for asset in meta.get("universe", []):
+                self.max_leverage[self._slot(asset["name"])] = float(asset.get("maxLeverage", DEFAULT_MAX_LEVERAGE))
+            self._recompute()
+
+    def on_fill(self, coin, is_buy, sz, px, fee=0.0):
+        """Исполнение: средний вход при наращивании, реализованный PnL при сокращении и развороте."""
+        if sz <= 0:
+            return
+        with self._lock:
+            idx = self._slot(coin)
+            old = self.size[idx]
+            delta = sz if is_buy else -sz
+            new = old + delta
+            if old == 0 or (old > 0) == (delta > 0):
+                self.entry[idx] = (self.entry[idx] * abs(old) + px * abs(delta)) / abs(new)
+            else:
+                closed = min(abs(old), abs(delta))
+                pnl = (px - self.entry[idx]) * closed * (1 if old > 0 else -1)
+                self.realized += pnl
+                self.collateral += pnl
+                if new != 0 and (new > 0) != (old > 0):
+                    self.entry[idx] = px  # Разворот: остаток открыт по цене сделки
+                elif new == 0:
+                    self.entry[idx] = 0.0
+            self.size[idx] = 0.0 if abs(new) < 1e-12 else new
+            self.fees += fee
+            self.collateral -= fee
+            if np.isnan(self.mark[idx]):
+                self.mark[idx] = px
+            self._recompute()
+
+    def on_mid(self, coin, px):
+        with self._lock:
+            idx = self.index.get(coin)
+            if idx is None:
+                return
+            self.mark[idx] = float(px)
+            self._recompute()
+
+    def on_mids(self, mids):
+        """Пакет mid-цен (allMids): одна векторная запись и один пересчёт."""
+        with self._lock:
+            idx = [self.index[c] for c in mids if c in self.index]
+            if not idx:
+                return
+            self.mark[idx] = [float(mids[c]) for c in mids if c in self.index]
+            self._recompute()
+
+    def _recompute(self):
+        n = len(self.coins)
+        size, entry, mark = self.size[:n], self.entry[:n], self.mark[:n]
+        mark = np.where(np.isnan(mark), entry, mark)
+        notional = np.abs(size) * mark
+        unrealized = (mark - entry) * size
+        margin = notional / self.leverage[:n]
+        mm_rate = 0.5 / self.max_leverage[:n]
+        maintenance = notional * mm_rate
+        equity = self.collateral + unrealized.sum()
+        maint_total = maintenance.sum()
+        # Цена монеты, при которой equity = maintenance (остальные цены неизменны), как в cross margin
+        denominator = size - np.abs(size) * mm_rate
+        with np.errstate(divide="ignore", invalid="ignore"):
+            liq_px = np.where(size != 0, mark + (maint_total - equity) / denominator, np.nan)
+            liq_px = np.where(liq_px > 0, liq_px, np.where(size != 0, 0.0, np.nan))
+            liq_distance = np.where(size != 0, np.abs(mark - liq_px) / mark, np.nan)
+        self.notional = notional
+        self.unrealized = unrealized
+        self.liq_px = liq_px
+        self.liq_distance = liq_distance
+        self.totals = {
+            "equity": float(equity),
+            "unrealized_pnl": float(unrealized.sum()),
+            "realized_pnl": self.realized,
+            "gross_exposure": float(notional.sum()),
+            "net_exposure": float((size * mark).sum()),
+            "margin_used": float(margin.sum()),
+            "maintenance_margin": float(maint_total),
+            "margin_ratio": float(maint_total / equity) if equity > 0 else float("inf"),
+            "min_liq_distance": float(np.nanmin(liq_distance)) if np.any(size != 0) else None,
+        }
+        self._mm_rate = mm_rate
+
+    def positions(self):
+        """По монетам: размер, вход, mark, PnL, notional, ликвидация."""
+        with self._lock:
+            return [{"coin": coin, "size": float(self.size[i]), "entry": float(self.entry[i]),
+                     "mark": float(self.mark[i]), "unrealized_pnl": float(self.unrealized[i]),
+                     "notional": float(self.notional[i]), "leverage": float(self.leverage[i]),
+                     "liquidation_px": float(self.liq_px[i]), "liq_distance": float(self.liq_distance[i])}
+                    for i, coin in enumerate(self.coins) if self.size[i] != 0]
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.totals)
+
+    def pre_trade_check(self, coin, is_buy, sz, px=None, max_gross_leverage=MAX_GROSS_LEVERAGE,
+                        max_coin_exposure=MAX_COIN_EXPOSURE, min_liq_distance=MIN_LIQ_DISTANCE):
+        """Проверка ордера до отправки: (True, "") или (False, причина).
+
+        Без блокировки и без NumPy-редукций: читает кэшированные агрегаты последнего пересчёта.
+        """
+        totals = self.totals
+        idx = self.index.get(coin)
+        if idx is None:
+            old, mark, leverage, mm_rate = 0.0, px, float(DEFAULT_LEVERAGE), 0.5 / DEFAULT_MAX_LEVERAGE
+        else:
+            old = float(self.size[idx])
+            mark = px if px is not None else float(self.mark[idx])
+            leverage = float(self.leverage[idx])
+            mm_rate = float(self._mm_rate[idx]) if idx < len(self._mm_rate) else 0.5 / DEFAULT_MAX_LEVERAGE
+        if not mark or mark != mark:
+            return False, f"нет цены для {coin}"
+        new = old + (sz if is_buy else -sz)
+        equity = totals["equity"]
+        if equity <= 0:
+            return False, f"equity {equity:.2f} <= 0"
+        if abs(new) <= abs(old) and (new == 0 or (new > 0) == (old > 0)):
+            return True, ""  # Сокращение позиции риск не увеличивает
+        added_notional = (abs(new) - abs(old)) * mark
+        gross = totals["gross_exposure"] + added_notional
+        if gross > equity * max_gross_leverage:
+            return False, f"gross exposure {gross:.2f} > {max_gross_leverage}x equity {equity:.2f}"
+        if abs(new) * mark > equity * max_coin_exposure:
+            return False, f"exposure {coin} {abs(new) * mark:.2f} > {max_coin_exposure}x equity"
+        margin = totals["margin_used"] + added_notional / leverage
+        if margin > equity:
+            return False, f"margin {margin:.2f} > equity {equity:.2f}"
+        maint = totals["maintenance_margin"] + added_notional * mm_rate
+        denominator = new - abs(new) * mm_rate
+        if denominator:
+            liq_px = mark + (maint - equity) / denominator
+            distance = abs(mark - liq_px) / mark if liq_px > 0 else 1.0
+            if distance < min_liq_distance:
+                return False, f"до ликвидации {distance:.1%} < {min_liq_distance:.0%}"
+        return True, ""
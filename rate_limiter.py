@@ -0,0 +1,135 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+import numpy as np
+from candle_store import INTERVAL_MS
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше — важнее. Ордера обслуживаются раньше опроса рыночных данных.
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_MARKET_DATA = 2
+PRIORITY_NAMES = {PRIORITY_ORDER: "order", PRIORITY_ACCOUNT: "account", PRIORITY_MARKET_DATA: "market_data"}
+
+# Веса запросов Hyperliquid (лимит 1200 в минуту на IP)
+LIGHT_INFO_TYPES = {"l2Book", "allMids", "clearinghouseState", "orderStatus", "spotClearinghouseState", "exchangeStatus"}
+ACCOUNT_INFO_TYPES = {"clearinghouseState", "openOrders", "frontendOpenOrders", "orderStatus", "userFills",
+                      "userFillsByTime", "userFunding", "spotClearinghouseState", "userRateLimit"}
+
+
+def request_weight(url_path, payload):
+    """(вес, приоритет) запроса к /info или /exchange по правилам лимитов биржи."""
+    payload = payload or {}
+    if url_path == "/exchange":
+        action = payload.get("action", {})
+        batch = action.get("orders") or action.get("cancels") or action.get("modifies") or []
+        return 1 + len(batch) // 40, PRIORITY_ORDER
+    info_type = payload.get("type")
+    priority = PRIORITY_ACCOUNT if info_type in ACCOUNT_INFO_TYPES else PRIORITY_MARKET_DATA
+    if info_type in LIGHT_INFO_TYPES:
+        return 2, priority
+    if info_type == "candleSnapshot":
+        req = payload.get("req", {})
+        step = INTERVAL_MS.get(req.get("interval"), 3_600_000)
+        items = min(5000, max(0, (req.get("endTime", 0) - req.get("startTime", 0)) // step))
+        return 20 + items // 60, priority
+    return 20, priority
+
+
+class RateLimiter:
+    """Взвешенный token bucket с очередью по приоритету и статистикой ожидания."""
+
+    def __init__(self, capacity=None, per_minute=None, stats_window=1000):
+        self.per_minute = per_minute or float(os.getenv("HL_RATE_LIMIT_PER_MINUTE", "1200"))
+        self.capacity = capacity or self.per_minute
+        self.rate = self.per_minute / 60.0
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []  # heap (priority, seq)
+        self._seq = itertools.count()
+        self._waits = {p: deque(maxlen=stats_window) for p in PRIORITY_NAMES}
+        self._counts = {p: 0 for p in PRIORITY_NAMES}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, weight=1, priority=PRIORITY_MARKET_DATA):
+        """Дождаться weight токенов; возвращает время ожидания в секундах."""
+        weight = min(weight, self.capacity)
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                self._refill()
+                if self._waiters[0] == ticket and self.tokens >= weight:
+                    heapq.heappop(self._waiters)
+                    self.tokens -= weight
+                    self._cond.notify_all()
+                    break
+                timeout = (weight - self.tokens) / self.rate if self._waiters[0] == ticket else None
+                self._cond.wait(timeout)
+        waited = time.monotonic() - started
+        self._waits[priority].append(waited)
+        self._counts[priority] += 1
+        if waited > 1:
+            logger.warning(f"Ожидание лимита запросов {waited:.2f}s (приоритет {PRIORITY_NAMES[priority]})")
+        return waited
+
+    def stats(self):
+        """Статистика ожидания в очереди по приоритетам (ms) и текущий запас токенов."""
+        with self._cond:
+            self._refill()
+            result = {"tokens": round(self.tokens, 1), "queued": len(self._waiters)}
+        for priority, name in PRIORITY_NAMES.items():
+            waits = np.fromiter(self._waits[priority], dtype=np.float64) * 1000
+            result[name] = {
+                "requests": self._counts[priority],
+                "wait_p50_ms": float(np.percentile(waits, 50)) if len(waits) else 0.0,
+                "wait_p95_ms": float(np.percentile(waits, 95)) if len(waits) else 0.0,
+                "wait_max_ms": float(waits.max()) if len(waits) else 0.0,
+            }
+        return result
+
+
+def install(client, limiter, session=None):
+    """Пропускать все POST клиента SDK (Info/Exchange) через limiter и общую HTTP-сессию."""
+    if session is not None:
+        client.session = session
+    post = client.post
+
+    def limited_post(url_path, payload=None):
+        weight, priority = request_weight(url_path, payload)
+        metrics.RATE_LIMIT_WAIT.observe(limiter.acquire(weight, priority), priority=PRIORITY_NAMES[priority])
+        endpoint = "exchange" if url_path == "/exchange" else (payload or {}).get("type", url_path)
+        metrics.API_REQUESTS.inc(endpoint=endpoint)
+        try:
+            return post(url_path, payload)
+        except Exception:
+            metrics.API_ERRORS.inc(endpoint=endpoint)
+            raise
+
+    client.post = limited_post
+    return client
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Общий на процесс лимитер (лимит биржи считается на IP, а не на клиента)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,237 @@
+import logging
+import threading
+import numpy as np
+from candle_store import COLUMNS, DTYPES, INTERVAL_MS, arrays_to_frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVALS = ("5m", "15m", "1h", "4h", "1d")
+MAX_BARS = 10_000  # Закрытых баров на интервал в памяти
+
+
+def resample(arrays, step):
+    """OHLCV базового интервала -> более крупный интервал step (ms), бары по границам step."""
+    times = arrays["time"]
+    if len(times) == 0:
+        return {k: v[:0] for k, v in arrays.items()}
+    buckets = times // step
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    return {
+        "time": buckets[starts] * step,
+        "open": arrays["open"][starts],
+        "high": np.maximum.reduceat(arrays["high"], starts),
+        "low": np.minimum.reduceat(arrays["low"], starts),
+        "close": arrays["close"][np.concatenate((starts[1:] - 1, [len(times) - 1]))],
+        "volume": np.add.reduceat(arrays["volume"], starts),
+    }
+
+
+def _as_bar(candle):
+    """Свеча из WebSocket (time/open/...), candle_snapshot (t/o/...) или кортежа -> кортеж OHLCV."""
+    if isinstance(candle, dict):
+        if "t" in candle:
+            return (int(candle["t"]), float(candle["o"]), float(candle["h"]), float(candle["l"]),
+                    float(candle["c"]), float(candle["v"]))
+        return (int(candle["time"]), float(candle["open"]), float(candle["high"]), float(candle["low"]),
+                float(candle["close"]), float(candle["volume"]))
+    t, o, h, lo, c, v = candle[:6]
+    return int(t), float(o), float(h), float(lo), float(c), float(v)
+
+
+class BarSeries:
+    """Закрытые бары одного интервала: колонки numpy с амортизированным O(1) append и лимитом maxlen."""
+
+    def __init__(self, maxlen=MAX_BARS):
+        self.maxlen = maxlen
+        self.size = 0
+        self._cols = {col: np.empty(min(maxlen, 256), dtype=DTYPES[col]) for col in COLUMNS}
+
+    def append(self, bar):
+        capacity = len(self._cols["time"])
+        if self.size == capacity:
+            if capacity < self.maxlen:
+                for col in COLUMNS:
+                    grown = np.empty(min(self.maxlen, capacity * 2), dtype=DTYPES[col])
+                    grown[:self.size] = self._cols[col]
+                    self._cols[col] = grown
+            else:
+                # Сдвиг на половину буфера раз в maxlen/2 баров — амортизированно O(1)
+                keep = self.maxlen // 2
+                for col in COLUMNS:
+                    self._cols[col][:keep] = self._cols[col][self.size - keep:self.size]
+                self.size = keep
+        for col, value in zip(COLUMNS, bar):
+            self._cols[col][self.size] = value
+        self.size += 1
+
+    def extend(self, arrays):
+        n = len(arrays["time"])
+        if n > self.maxlen:
+            arrays = {col: arrays[col][-self.maxlen:] for col in COLUMNS}
+            n = self.maxlen
+        for col in COLUMNS:
+            self._cols[col] = np.empty(max(n, min(self.maxlen, 256)), dtype=DTYPES[col])
+            self._cols[col][:n] = arrays[col]
+        self.size = n
+
+    def arrays(self):
+        return {col: self._cols[col][:self.size] for col in COLUMNS}
+
+    def __len__(self):
+        return self.size
+
+
+class _Bucket:
+    """Строящийся бар старшего интервала: агрегат уже закрытых 1m баров его корзины."""
+
+    __slots__ = ("start", "open", "high", "low", "close", "volume")
+
+    def __init__(self, start, bar):
+        self.start = start
+        _, self.open, self.high, self.low, self.close, self.volume = bar
+
+    def add(self, bar):
+        self.high = max(self.high, bar[2])
+        self.low = min(self.low, bar[3])
+        self.close = bar[4]
+        self.volume += bar[5]
+
+    def as_bar(self, partial=None):
+        """Бар корзины; partial — ещё не закрытая 1m свеча, учитывается без изменения агрегата."""
+        if partial is None:
+            return self.start, self.open, self.high, self.low, self.close, self.volume
+        return (self.start, self.open, max(self.high, partial[2]), min(self.low, partial[3]), partial[4],
+                self.volume + partial[5])
+
+
+class Resampler:
+    """Бары 5m/15m/1h/4h/1d из одного 1m фида, инкрементально: O(1) на каждую 1m свечу.
+
+    Обновления незакрытой 1m свечи (WebSocket шлёт её многократно) заменяют предыдущее значение и
+    в агрегаты не попадают; свеча фиксируется, когда приходит следующая минута. Бар старшего
+    интервала закрывается с первой 1m свечой следующей корзины (границы кратны шагу, как у биржи),
+    объём суммируется по закрытым минутам плюс текущая незакрытая.
+    """
+
+    def __init__(self, coin="BTC", intervals=DEFAULT_INTERVALS, base="1m", maxlen=MAX_BARS):
+        self.coin = coin
+        self.base = base
+        self.base_step = INTERVAL_MS[base]
+        self.intervals = [base] + [i for i in intervals if i != base]
+        for interval in self.intervals:
+            if INTERVAL_MS[interval] % self.base_step:
+                raise ValueError(f"Интервал {interval} не кратен базовому {base}")
+        self.steps = {interval: INTERVAL_MS[interval] for interval in self.intervals}
+        self.closed = {interval: BarSeries(maxlen) for interval in self.intervals}
+        self.buckets = {interval: None for interval in self.intervals}
+        self.partial = None  # Незакрытая 1m свеча
+        self.last_time = None  # Время последней зафиксированной 1m свечи
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """callback(interval, bar) при закрытии бара любого интервала (bar — кортеж OHLCV)."""
+        self._listeners.append(callback)
+
+    def seed(self, arrays):
+        """Заполнить историю из закрытых 1m свечей (колонки CandleStore) векторно; хвост — в корзины."""
+        arrays = {col: np.asarray(arrays[col], dtype=DTYPES[col]) for col in COLUMNS}
+        times = arrays["time"]
+        with self._lock:
+            if len(times) == 0:
+                return
+            for interval, step in self.steps.items():
+                bars = resample(arrays, step)
+                last = len(bars["time"]) - 1
+                # Последняя корзина может быть неполной: она остаётся строящейся и дополняется из фида
+                self.closed[interval].extend({col: bars[col][:last] for col in COLUMNS})
+                self.buckets[interval] = _Bucket(int(bars["time"][last]),
+                                                 tuple(bars[col][last] for col in COLUMNS))
+            self.last_time = int(times[-1])
+            self.partial = None
+
+    def update(self, candle):
+        """Новая или обновлённая 1m свеча; возвращает [(interval, bar)] закрытых этим обновлением баров."""
+        bar = _as_bar(candle)
+        t = bar[0]
+        with self._lock:
+            if self.partial is not None and t == self.partial[0]:
+                self.partial = bar  # Обновление той же минуты
+                return []
+            if (self.partial is not None and t < self.partial[0]) or (self.last_time is not None and t <= self.last_time):
+                logger.warning(f"Resampler {self.coin}: устаревшая свеча {t} пропущена")
+                return []
+            closed = []
+            if self.partial is not None:
+                self._commit(self.partial)
+            self.partial = bar
+            for interval, step in self.steps.items():
+                bucket = self.buckets[interval]
+                if bucket is not None and t - t % step != bucket.start:
+                    closed.append((interval, bucket.as_bar()))
+                    self.closed[interval].append(bucket.as_bar())
+                    self.buckets[interval] = None
+        for interval, closed_bar in closed:
+            for callback in self._listeners:
+                try:
+                    callback(interval, closed_bar)
+                except Exception as e:
+                    logger.error(f"Ошибка в callback resampler {interval}: {e}")
+        return closed
+
+    def close_partial(self):
+        """Зафиксировать текущую 1m свечу без ожидания следующей (например, по времени закрытия)."""
+        with self._lock:
+            if self.partial is not None:
+                self._commit(self.partial)
+                self.partial = None
+
+    def _commit(self, bar):
+        for interval, step in self.steps.items():
+            bucket = self.buckets[interval]
+            start = bar[0] - bar[0] % step
+            if bucket is None:
+                self.buckets[interval] = _Bucket(start, bar)
+            else:
+                bucket.add(bar)
+        self.last_time = bar[0]
+
+    def current(self, interval):
+        """Строящийся бар интервала с учётом незакрытой 1m свечи (None, если данных нет)."""
+        with self._lock:
+            return self._current(interval)
+
+    def _current(self, interval):
+        bucket = self.buckets[interval]
+        partial = self.partial
+        if partial is not None and bucket is not None and partial[0] - partial[0] % self.steps[interval] == bucket.start:
+            return bucket.as_bar(partial)
+        if partial is not None and bucket is None:
+            return _Bucket(partial[0] - partial[0] % self.steps[interval], partial).as_bar()
+        return bucket.as_bar() if bucket is not None else None
+
+    def arrays(self, interval, include_partial=True):
+        """Колонки закрытых баров интервала (+ строящийся бар в конце при include_partial)."""
+        with self._lock:
+            arrays = {col: arr.copy() for col, arr in self.closed[interval].arrays().items()}
+            current = self._current(interval) if include_partial else None
+        if current is not None:
+            arrays = {col: np.append(arrays[col], np.asarray(value, dtype=DTYPES[col]))
+                      for col, value in zip(COLUMNS, current)}
+        return arrays
+
+    def frame(self, interval, include_partial=True):
+        """DataFrame баров интервала (time в ms) — вход calculate_indicators без запросов к API."""
+        return arrays_to_frame(self.arrays(interval, include_partial))
+
+    def attach(self, hub):
+        """Подписаться на 1m свечи coin в MarketDataHub: одна WebSocket-подписка на все интервалы."""
+        hub.subscribe_candles(self.coin, self.base, callback=self.update)
+        return self
+
+
+def from_store(store, coin, start_time, end_time, intervals=DEFAULT_INTERVALS, maxlen=MAX_BARS):
+    """Resampler, засеянный 1m историей из CandleStore (одна загрузка вместо запроса на каждый интервал)."""
+    resampler = Resampler(coin, intervals, maxlen=maxlen)
+    resampler.seed(store.frame(coin=coin, interval="1m", start_time=start_time, end_time=end_time))
+    return resampler
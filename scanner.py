@@ -0,0 +1,155 @@
+import os
+import time
+import argparse
+import logging
+import log_pipeline
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore, INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_SCORES = {"BUY": 1, "SELL": -1, "STRONG_BUY": 2, "STRONG_SELL": -2}
+
+_worker_strategy = None
+
+
+class _WorkerAPI:
+    """API процесса пула: свечи и funding приходят от родителя, воркер к бирже не подключается."""
+
+    def get_funding_rate(self, asset="BTC"):
+        return 0.0001
+
+    def get_price(self, asset="BTC"):
+        return 0.0
+
+
+def _init_worker(testnet, grid_mode):
+    """Один MLStrategy на процесс пула (модель и импорты грузятся один раз) без клиента биржи."""
+    global _worker_strategy
+    from ml_strategy import MLStrategy
+    _worker_strategy = MLStrategy(testnet=testnet, grid_mode=grid_mode, api=_WorkerAPI())
+
+
+def _evaluate(coin, interval, columns, funding_rate):
+    """Расчёт сигнала для одной монеты в процессе пула."""
+    df = pd.DataFrame(columns)
+    df["time"] = pd.to_datetime(df["time"], unit="ms").dt.strftime('%Y-%m-%d %H:%M:%S')
+    df["funding_rate"] = funding_rate
+    signal = _worker_strategy.get_signal(df, asset=coin, interval=interval)
+    last = df.iloc[-1]
+    return {
+        "coin": coin,
+        "signal": signal,
+        "close": float(last["close"]),
+        "rsi": float(last.get("RSI", np.nan)),
+        "chop": float(last.get("chop", np.nan)),
+        "trend": float((last["SMA10"] - last["SMA50"]) / last["SMA50"]) if "SMA50" in last else np.nan,
+        "funding": funding_rate,
+    }
+
+
+class SignalScanner:
+    """Сканер сигналов MLStrategy по вселенной монет: параллельная загрузка и расчёт в пуле процессов."""
+
+    def __init__(self, api=None, interval="1h", lookback_bars=150, fetch_workers=None, processes=None,
+                 testnet=True, grid_mode=False):
+        if api is None:
+            from api_interface import get_api
+            api = get_api()
+        self.api = api
+        self.candle_store = CandleStore(api)
+        self.interval = interval
+        self.lookback_bars = lookback_bars
+        self.fetch_workers = fetch_workers or int(os.getenv("SCANNER_FETCH_WORKERS", "16"))
+        self.processes = processes or os.cpu_count()
+        self.testnet = testnet
+        self.grid_mode = grid_mode
+        self.logger = logging.getLogger(__name__)
+        self._pool = None
+
+    def _process_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                             initargs=(self.testnet, self.grid_mode))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _fetch(self, coin, start_ts, end_ts):
+        try:
+            window = self.candle_store.frame(coin=coin, interval=self.interval, start_time=start_ts, end_time=end_ts)
+            return coin, {col: np.array(window[col]) for col in window.columns}
+        except Exception as e:
+            self.logger.error(f"Ошибка загрузки свечей {coin}: {e}")
+            return coin, None
+
+    def scan(self, universe=None):
+        """Ранжированная таблица сигналов по монетам вселенной (по умолчанию все перпы)."""
+        started = time.perf_counter()
+        contexts = self.api.get_asset_contexts()
+        prices = self.api.get_prices()  # Все цены одним all_mids()
+        coins = list(universe) if universe else sorted(contexts)
+        coins = [c for c in coins if c in prices]
+        step = INTERVAL_MS.get(self.interval, 3_600_000)
+        now = int(time.time() * 1000)
+        end_ts = now - now % step - 1  # Только закрытые свечи: формирующаяся менялась бы между сканами
+        start_ts = end_ts + 1 - self.lookback_bars * step
+
+        # I/O параллельно в потоках: время ограничено самой медленной загрузкой
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as fetch_pool:
+            fetched = list(fetch_pool.map(lambda c: self._fetch(c, start_ts, end_ts), coins))
+        fetch_seconds = time.perf_counter() - started
+
+        # CPU (pandas/torch) — в пуле процессов на все ядра
+        pool = self._process_pool()
+        futures = [pool.submit(_evaluate, coin, self.interval, columns,
+                               contexts.get(coin, {}).get("funding", 0.0001))
+                   for coin, columns in fetched if columns and len(columns["close"])]
+        rows = []
+        for future in futures:
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                self.logger.error(f"Ошибка расчёта сигнала: {e}")
+
+        table = pd.DataFrame(rows, columns=["coin", "signal", "close", "rsi", "chop", "trend", "funding"])
+        if not table.empty:
+            table["price"] = table["coin"].map(prices)
+            base = table["signal"].str.replace("GRID_", "", regex=False)
+            table["score"] = base.map(SIGNAL_SCORES).fillna(0) * (1 + table["trend"].abs().fillna(0))
+            table = table.reindex(table["score"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+        self.logger.info(f"Скан {len(coins)} монет: загрузка {fetch_seconds:.2f}s, "
+                         f"всего {time.perf_counter() - started:.2f}s")
+        return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сканер сигналов MLStrategy по нескольким монетам")
+    parser.add_argument("coins", nargs="*", help="Монеты (по умолчанию все перпы)")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--lookback", type=int, default=150, help="Число свечей в окне")
+    parser.add_argument("--fetch-workers", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--grid-mode", action="store_true")
+    parser.add_argument("--csv", default=None)
+    args = parser.parse_args(argv)
+    log_pipeline.configure()
+
+    scanner = SignalScanner(interval=args.interval, lookback_bars=args.lookback, fetch_workers=args.fetch_workers,
+                            processes=args.processes, grid_mode=args.grid_mode)
+    try:
+        table = scanner.scan(args.coins or None)
+    finally:
+        scanner.close()
+    print(table.to_string(index=False))
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
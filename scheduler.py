@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import pandas as pd
+from candle_store import INTERVAL_MS
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GRACE = float(os.getenv("SCHEDULER_GRACE", "0.5"))  # Запас после закрытия: расхождение часов и публикация свечи
+RETRY = float(os.getenv("SCHEDULER_RETRY", "0.5"))  # Повтор, если биржа ещё не отдала закрытую свечу
+MAX_DELAY = float(os.getenv("SCHEDULER_MAX_DELAY", "30"))  # Дольше — закрытие пропускается, а не торгуется по старым данным
+MAX_SLEEP = 60.0
+
+
+def bar_time_ms(value):
+    """Время открытия свечи в ms из колонки time (строка fetch_historical_data или число)."""
+    if isinstance(value, str):
+        return int(pd.Timestamp(value).value // 1_000_000)
+    return int(value)
+
+
+class StrategyJob:
+    """Конфигурация стратегии в планировщике: (coin, interval), каденс в свечах и обработчик сигнала.
+
+    on_signal(job, signal, df) вызывается после каждой оценки; every=N — оценка на каждом N-м закрытии.
+    """
+
+    def __init__(self, name, strategy, coin="BTC", interval="1h", every=1, lookback_hours=24, on_signal=None):
+        self.name = name
+        self.strategy = strategy
+        self.coin = coin
+        self.interval = interval
+        self.step = INTERVAL_MS[interval]
+        self.every = max(1, int(every))
+        self.lookback_hours = lookback_hours
+        self.on_signal = on_signal
+        self.next_close = None  # ms, закрытие свечи, по которому будет следующая оценка
+        self.retry_at = None  # с, повтор при опоздании данных
+        self.fingerprint = None
+        self.last_signal = None
+
+    def due_at(self, grace):
+        if self.retry_at is not None:
+            return self.retry_at
+        return self.next_close / 1000 + grace
+
+    def schedule_after(self, bar_ms):
+        """Следующее закрытие от времени свечи биржи: границы берутся из данных, а не из локальных часов."""
+        self.next_close = bar_ms + self.step * (1 + self.every)
+        self.retry_at = None
+
+    def evaluate(self, df):
+        with metrics.span("indicators"):
+            df = self.strategy.update_indicators(df)
+        with metrics.span("signal"):
+            self.last_signal = self.strategy.get_signal(df, asset=self.coin, interval=self.interval)
+        return self.last_signal
+
+
+class CandleScheduler:
+    """Оценка стратегий ровно на закрытии свечи их (coin, interval) вместо фиксированного sleep.
+
+    Закрытие считается по времени свечей биржи; оценка ждёт grace после закрытия и, если закрытая
+    свеча ещё не опубликована, повторяет запрос каждые retry секунд до max_delay. Стратегии с одним
+    (coin, interval, lookback) на одном закрытии делят одну загрузку свечей; оценка с теми же входами,
+    что и прошлая, пропускается.
+    """
+
+    def __init__(self, jobs=(), grace=GRACE, retry=RETRY, max_delay=MAX_DELAY):
+        self.jobs = []
+        self.grace = grace
+        self.retry = retry
+        self.max_delay = max_delay
+        self.clock = metrics.LoopClock("scheduler")
+        self._frames = {}
+        self.evaluated = 0  # Попыток оценки в последнем run_pending
+        for job in jobs:
+            self.add(job)
+
+    def add(self, job):
+        if any(j.name == job.name for j in self.jobs):
+            raise ValueError(f"Задача планировщика {job.name} уже добавлена")
+        self.jobs.append(job)
+        return job
+
+    def _align(self, job, now_ms):
+        """Первое закрытие после now с учётом каденса (границы кратны шагу интервала, как у биржи)."""
+        close = (now_ms // job.step + 1) * job.step
+        while (close // job.step) % job.every:
+            close += job.step
+        job.next_close = close
+
+    @staticmethod
+    def _key(job, close_ms):
+        return job.coin, job.interval, job.lookback_hours, close_ms
+
+    def _frame(self, job, close_ms):
+        """Закрытые к close_ms свечи; одна загрузка на (coin, interval, lookback, close) для всех задач."""
+        key = self._key(job, close_ms)
+        if key not in self._frames:
+            self._frames[key] = job.strategy.fetch_historical_data(asset=job.coin, interval=job.interval,
+                                                                   lookback_hours=job.lookback_hours,
+                                                                   end_ms=close_ms - 1)
+        return self._frames[key]
+
+    def run_job(self, job, now):
+        """Одна попытка оценки: True — сигнал посчитан или закрытие пропущено, False — повтор позже."""
+        close_ms = job.next_close
+        with metrics.trace(job.name):
+            with metrics.span("candles"):
+                df = self._frame(job, close_ms)
+            bar_ms = bar_time_ms(df["time"].iloc[-1]) if not df.empty else None
+            if bar_ms is None or bar_ms < close_ms - job.step:
+                # Биржа ещё не отдала закрытую свечу (или отдала синтетику): ждём, но не дольше max_delay
+                if now - close_ms / 1000 < self.max_delay:
+                    job.retry_at = now + self.retry
+                    return False
+                logger.warning("%s: свеча %s/%s на %s не получена за %ss, закрытие пропущено",
+                               job.name, job.coin, job.interval, close_ms, self.max_delay)
+                metrics.EVALUATIONS_SKIPPED.inc(job=job.name, reason="late")
+                job.next_close += job.step * job.every
+                job.retry_at = None
+                return True
+            job.schedule_after(bar_ms)
+            last = df.iloc[-1]
+            fingerprint = (bar_ms, float(last["close"]), float(last["volume"]))
+            if fingerprint == job.fingerprint:
+                logger.info("%s: входные данные не изменились, оценка пропущена", job.name)
+                metrics.EVALUATIONS_SKIPPED.inc(job=job.name, reason="unchanged")
+                return True
+            job.fingerprint = fingerprint
+            try:
+                signal = job.evaluate(df.copy())  # Копия: индикаторы пишутся в кадр, общий для задач
+                metrics.CLOSE_TO_SIGNAL.observe(max(0.0, time.time() - (bar_ms + job.step) / 1000), job=job.name)
+                logger.info("%s: %s/%s свеча %s -> %s", job.name, job.coin, job.interval, bar_ms, signal)
+                if job.on_signal is not None:
+                    job.on_signal(job, signal, df)
+            except Exception as e:
+                # Свеча уже учтена: ошибка сигнала/ордера не должна вызывать повторы до следующего закрытия
+                logger.error("Ошибка обработки сигнала %s: %s", job.name, e)
+        return True
+
+    def run_pending(self, now=None):
+        """Выполнить все задачи, чьё время наступило; вернуть время следующего пробуждения (с)."""
+        now = time.time() if now is None else now
+        self.evaluated = 0
+        for job in self.jobs:
+            if job.next_close is None:
+                self._align(job, int(now * 1000))
+        for job in sorted(self.jobs, key=lambda j: j.due_at(self.grace)):
+            if job.due_at(self.grace) > now:
+                continue
+            self.evaluated += 1
+            try:
+                self.run_job(job, now)
+            except Exception as e:
+                logger.error(f"Ошибка загрузки свечей {job.name}: {e}")
+                job.retry_at = now + self.retry if now - job.next_close / 1000 < self.max_delay else None
+                if job.retry_at is None:
+                    job.next_close += job.step * job.every
+        self._frames.clear()  # Кадры общие только в пределах одного пробуждения; повтор перезапрашивает свечи
+        return min(job.due_at(self.grace) for job in self.jobs) if self.jobs else now + MAX_SLEEP
+
+    def run_forever(self, after_tick=None):
+        """Главный цикл: спит до ближайшего закрытия (не дольше MAX_SLEEP) и выполняет задачи.
+
+        after_tick() вызывается после пробуждений, на которых были оценки (дамп метрик, статистика).
+        """
+        if not self.jobs:
+            raise ValueError("Нет задач для планировщика")
+        while True:
+            self.clock.tick()
+            wake_at = self.run_pending()
+            if after_tick is not None and self.evaluated:
+                after_tick()
+            delay = wake_at - time.time()
+            if delay > 0:
+                self.clock.sleep(min(delay, MAX_SLEEP))
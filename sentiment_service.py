@@ -0,0 +1,184 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv("SENTIMENT_REFRESH", "60"))  # секунд между опросами Twitter
+MAX_AGE = float(os.getenv("SENTIMENT_MAX_AGE", "600"))  # старше — агрегат считается устаревшим
+TWEETS_PER_REFRESH = 50
+CACHE_SIZE = 10_000
+WORKERS = int(os.getenv("SENTIMENT_WORKERS", "4"))
+
+
+def score_text(text):
+    """Полярность текста TextBlob в [-1, 1]; textblob импортируется при первом вызове."""
+    from textblob import TextBlob
+    return TextBlob(text).sentiment.polarity
+
+
+class LRUCache:
+    """Ограниченный по размеру словарь: при переполнении вытесняется давно не использованный ключ."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SentimentService:
+    """Фоновый расчёт sentiment по символам: торговый цикл читает готовый агрегат из памяти.
+
+    fetcher(symbol, count) -> [(tweet_id, text)]. Твиты дедуплицируются по id, одинаковые тексты
+    (ретвиты) не пересчитываются благодаря LRU, новые тексты оцениваются пачкой в пуле воркеров.
+    """
+
+    def __init__(self, fetcher, symbols=("BTC",), interval=REFRESH_INTERVAL, scorer=score_text,
+                 workers=WORKERS, count=TWEETS_PER_REFRESH, cache_size=CACHE_SIZE):
+        self.fetcher = fetcher
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.scorer = scorer
+        self.count = count
+        self.workers = workers
+        self._by_id = LRUCache(cache_size)  # tweet_id -> оценка
+        self._by_text = LRUCache(cache_size)  # текст -> оценка
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sentiment")
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"fetched": 0, "scored": 0, "cached": 0, "errors": 0}
+
+    def add_symbol(self, symbol):
+        if symbol not in self.symbols:
+            self.symbols.append(symbol)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sentiment-refresh", daemon=True)
+            self._thread.start()
+            logger.info(f"Sentiment-сервис запущен: {self.symbols}, обновление каждые {self.interval}s")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._pool.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop.is_set():
+            for symbol in list(self.symbols):
+                self.refresh(symbol)
+            self._stop.wait(self.interval)
+
+    def refresh(self, symbol):
+        """Один опрос: забрать твиты, оценить только новые, обновить агрегат символа."""
+        try:
+            with metrics.span("sentiment_fetch", loop="sentiment"):
+                tweets = self.fetcher(symbol, self.count) or []
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Ошибка загрузки твитов для {symbol}: {e}")
+            return self.latest(symbol)
+        self.stats["fetched"] += len(tweets)
+        scores = {}
+        pending = {}
+        for tweet_id, text in tweets:
+            cached = self._by_id.get(tweet_id)
+            if cached is None:
+                cached = self._by_text.get(text)
+                if cached is not None:
+                    self._by_id.put(tweet_id, cached)
+            if cached is not None:
+                scores[tweet_id] = cached
+                self.stats["cached"] += 1
+            else:
+                pending.setdefault(text, []).append(tweet_id)
+        if pending:
+            texts = list(pending)
+            try:
+                with metrics.span("sentiment_score", loop="sentiment"):
+                    chunk = max(1, len(texts) // (self.workers * 2))
+                    batches = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+                    results = [s for batch in self._pool.map(self._score_batch, batches) for s in batch]
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Ошибка оценки sentiment для {symbol}: {e}")
+                return self.latest(symbol)
+            for text, score in zip(texts, results):
+                self._by_text.put(text, score)
+                for tweet_id in pending[text]:
+                    self._by_id.put(tweet_id, score)
+                    scores[tweet_id] = score
+            self.stats["scored"] += len(texts)
+        if scores:
+            value = sum(scores.values()) / len(scores)
+            with self._lock:
+                self._latest[symbol] = {"sentiment": value, "updated": time.time(), "count": len(scores)}
+            logger.info(f"Sentiment {symbol}: {value:.3f} по {len(scores)} твитам ({len(pending)} новых текстов)")
+        return self.latest(symbol)
+
+    def _score_batch(self, texts):
+        return [self.scorer(text) for text in texts]
+
+    def latest(self, symbol="BTC", max_age=MAX_AGE):
+        """Последний агрегат: {"sentiment", "updated", "age", "stale", "count"}; без данных — stale и 0."""
+        with self._lock:
+            entry = self._latest.get(symbol)
+        if entry is None:
+            return {"sentiment": 0.0, "updated": None, "age": None, "stale": True, "count": 0}
+        age = time.time() - entry["updated"]
+        return {**entry, "age": age, "stale": age > max_age}
+
+
+_service = None
+_unavailable = False
+_service_lock = threading.Lock()
+
+
+def get_sentiment_service(symbols=("BTC",), source=None):
+    """Общий на процесс сервис поверх ExternalData (source); None, если Twitter не настроен."""
+    global _service, _unavailable
+    with _service_lock:
+        if _unavailable:
+            return None
+        if _service is None:
+            if source is None:
+                from external_data import ExternalData
+                source = ExternalData()
+            if source.api is None:
+                _unavailable = True
+                logger.warning("Sentiment: Twitter не настроен (TW_* или tweepy), используется значение по умолчанию")
+                return None
+            _service = SentimentService(source.fetch_tweets, symbols).start()
+        for symbol in symbols:
+            _service.add_symbol(symbol)
+    return _service
@@ -0,0 +1,162 @@
+import os
+import logging
+import importlib
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Реестр: имя -> "модуль:класс". Модуль импортируется только когда бэкенд включён в конфиге,
+# поэтому бот на одних правилах не платит за torch/NLP при старте.
+BACKENDS = {
+    "rules": "signal_backends:RuleBackend",
+    "lstm": "signal_backends:LSTMBackend",
+    "sentiment": "signal_backends:SentimentBackend",
+}
+DEFAULT_BACKENDS = "rules,lstm,sentiment"
+
+
+def parse_backends(spec=None):
+    """Список включённых бэкендов из строки "rules,lstm" / последовательности / env SIGNAL_BACKENDS."""
+    if spec is None:
+        spec = os.getenv("SIGNAL_BACKENDS", DEFAULT_BACKENDS)
+    if isinstance(spec, str):
+        spec = spec.split(",")
+    names = [name.strip() for name in spec if name.strip()]
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Неизвестные бэкенды сигналов: {unknown}")
+    return names
+
+
+def register_backend(name, target):
+    """Добавить бэкенд в реестр: target — "модуль:класс"."""
+    BACKENDS[name] = target
+
+
+def load_backend(name, **kwargs):
+    """Импортировать модуль бэкенда и создать экземпляр."""
+    module_name, class_name = BACKENDS[name].split(":")
+    backend_cls = getattr(importlib.import_module(module_name), class_name)
+    return backend_cls(**kwargs)
+
+
+def load_backends(spec=None, **kwargs):
+    """Загрузить только включённые бэкенды: {имя: экземпляр}."""
+    backends = {}
+    for name in parse_backends(spec):
+        try:
+            backends[name] = load_backend(name, **kwargs.get(name, {}))
+        except Exception as e:
+            logger.error(f"Ошибка загрузки бэкенда сигналов {name}: {e}")
+    logger.info(f"Бэкенды сигналов: {list(backends)}")
+    return backends
+
+
+class RuleBackend:
+    """Базовый сигнал SMA/RSI по последней строке с индикаторами."""
+
+    name = "rules"
+
+    def __init__(self, rsi_upper=70, rsi_lower=30):
+        self.rsi_upper = rsi_upper
+        self.rsi_lower = rsi_lower
+
+    def evaluate(self, df):
+        last_row = df.iloc[-1]
+        if last_row["SMA10"] > last_row["SMA50"] and last_row["RSI"] < self.rsi_upper:
+            return "BUY"
+        if last_row["SMA10"] < last_row["SMA50"] and last_row["RSI"] > self.rsi_lower:
+            return "SELL"
+        return "HOLD"
+
+
+class LSTMBackend:
+    """Сигнал по предсказанию LSTM; torch импортируется только при создании бэкенда.
+
+    У каждой пары (coin, interval) своя модель: веса и scaler берутся из последнего чекпоинта
+    lstm_training этой пары при первой оценке и кэшируются. Без чекпоинта пары — HOLD:
+    чужая модель или необученная сеть дают шум.
+    """
+
+    name = "lstm"
+
+    def __init__(self, mode=None, min_bars=100, threshold=0.001, directory=None):
+        import lstm_inference  # torch грузится при создании бэкенда, а не на первой свече
+        self.mode = mode
+        self.directory = directory
+        self.min_bars = min_bars
+        self.threshold = threshold
+        self.models = {}  # (coin, interval) -> (LSTMInference, meta) или None
+        self.last_prediction = float("nan")
+
+    def _model(self, coin, interval):
+        key = (coin, interval)
+        if key not in self.models:
+            self.models[key] = self._load(coin, interval)
+        return self.models[key]
+
+    def _load(self, coin, interval):
+        from lstm_inference import LSTMInference
+        from lstm_training import latest_checkpoint, load_checkpoint
+        path = latest_checkpoint(coin, interval, self.directory)
+        if path is None:
+            logger.warning(f"LSTM: нет чекпоинта {coin}/{interval}, сигнал LSTM отключён "
+                           f"(python lstm_training.py train --coin {coin} --interval {interval})")
+            return None
+        try:
+            model, scaler, meta = load_checkpoint(path)
+            if (meta.get("coin"), meta.get("interval")) != (coin, interval):
+                raise ValueError(f"чекпоинт обучен на {meta.get('coin')}/{meta.get('interval')}")
+            inference = LSTMInference(model, mode=self.mode, scaler=scaler, seq_length=meta["config"]["seq_length"])
+            logger.info(f"LSTM {coin}/{interval}: загружен чекпоинт v{meta['version']} ({path})")
+            return inference, meta
+        except Exception as e:
+            logger.error(f"Ошибка загрузки чекпоинта LSTM {path}: {e}")
+            return None
+
+    def evaluate(self, df, asset="BTC", interval="1h"):
+        loaded = self._model(asset, interval)
+        if loaded is None:
+            return "HOLD"
+        inference, meta = loaded
+        if len(df) <= self.min_bars:
+            logger.warning("Недостаточно данных для LSTM")
+            return "HOLD"
+        prices = pd.to_numeric(df["close"], errors="coerce").dropna().values
+        # Масштаб — scaler чекпоинта, pred на последних seq_length ценах
+        self.last_prediction = inference.predict_series(prices)
+        if np.isnan(self.last_prediction):
+            return "HOLD"
+        current_price = df["close"].iloc[-1]
+        signal = "HOLD"
+        if self.last_prediction > current_price * (1 + self.threshold):
+            signal = "BUY"
+        elif self.last_prediction < current_price * (1 - self.threshold):
+            signal = "SELL"
+        logger.info("LSTM %s/%s предсказание (v%s): %.2f vs %.2f -> %s", asset, interval, meta.get("version"),
+                    self.last_prediction, current_price, signal)
+        return signal
+
+
+class SentimentBackend:
+    """Sentiment по активу из фонового SentimentService; без свежих данных — default_score."""
+
+    name = "sentiment"
+
+    def __init__(self, default_score=0.5, max_age=None):
+        from sentiment_service import MAX_AGE
+        self.default_score = default_score  # Bullish
+        self.max_age = MAX_AGE if max_age is None else max_age
+        self.last = None
+
+    def score(self, asset="BTC"):
+        from sentiment_service import get_sentiment_service
+        service = get_sentiment_service((asset,))
+        if service is None:
+            return self.default_score
+        self.last = service.latest(asset, self.max_age)
+        if self.last["stale"]:
+            logger.warning(f"Sentiment {asset} устарел (age={self.last['age']}), используется {self.default_score}")
+            return self.default_score
+        return self.last["sentiment"]
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+
+# Точки входа: импорты модуля и загрузка бэкендов сигналов, как при старте процесса.
+# Сетевые вызовы (get_api) не входят — меряется только стоимость импорта и инициализации.
+ENTRY_POINTS = {
+    "bot_rules": ("import ml_strategy, execution, trade_journal, telegram_alerts, signal_backends, scheduler; "
+                  "signal_backends.load_backends('rules,sentiment')"),
+    "bot_full": ("import ml_strategy, execution, trade_journal, telegram_alerts, signal_backends, scheduler; "
+                 "signal_backends.load_backends('rules,lstm,sentiment')"),
+    "scanner": "import scanner, signal_backends; signal_backends.load_backends()",
+    "backtest": "import backtest",
+    "app": "import streamlit, altair, ml_strategy, signal_backends; signal_backends.load_backends()",
+}
+
+_TIMER = ("import time; _t = time.perf_counter()\n{code}\n"
+          "print('STARTUP_SECONDS', time.perf_counter() - _t)")
+
+
+def measure(code, repeats=5, cwd=None):
+    """Время (с) выполнения code в свежем интерпретаторе, по repeats запускам."""
+    timings = []
+    for _ in range(repeats):
+        proc = subprocess.run([sys.executable, "-c", _TIMER.format(code=code)], capture_output=True, text=True,
+                              cwd=cwd or os.path.dirname(os.path.abspath(__file__)))
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "exit code != 0")
+        line = [ln for ln in proc.stdout.splitlines() if ln.startswith("STARTUP_SECONDS")][-1]
+        timings.append(float(line.split()[1]))
+    return np.array(timings)
+
+
+def top_imports(code, limit=10):
+    """Самые дорогие модули по `python -X importtime` (кумулятивно, мс)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line[len("import time:"):].split("|")
+        if module.startswith("  "):
+            continue  # Вложенный импорт: учтён в кумулятивном времени родителя
+        rows.append((module.strip(), int(cumulative_us) / 1000))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время старта точек входа (импорты + бэкенды сигналов)")
+    parser.add_argument("entries", nargs="*", help=f"Точки входа (по умолчанию все: {', '.join(ENTRY_POINTS)})")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="Показать N самых дорогих импортов")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Код выхода 1, если медиана любой точки входа выше порога")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.entries or ENTRY_POINTS:
+        try:
+            timings = measure(ENTRY_POINTS[name], args.repeats)
+        except Exception as e:
+            print(f"{name:<10} ошибка: {e}")
+            continue
+        results[name] = {"median_s": float(np.median(timings)), "min_s": float(timings.min()),
+                         "max_s": float(timings.max())}
+        print(f"{name:<10} median={results[name]['median_s']:.3f}s min={results[name]['min_s']:.3f}s "
+              f"max={results[name]['max_s']:.3f}s")
+        for module, ms in top_imports(ENTRY_POINTS[name], args.top) if args.top else ():
+            print(f"    {module:<30} {ms:8.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.max_seconds is not None and any(r["median_s"] > args.max_seconds for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
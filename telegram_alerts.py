@@ -1,18 +1,218 @@
 import os
-from telegram import Bot
+import time
+import atexit
+import asyncio
+import logging
+import threading
+from collections import Counter
 from dotenv import load_dotenv
+import metrics
 
 load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+MAX_MESSAGE_LENGTH = 4096
 
-bot = Bot(token=TELEGRAM_TOKEN)
+logger = logging.getLogger(__name__)
+
+_bot = None
+
+
+def __getattr__(name):
+    """Модульный bot создаётся при первом обращении: python-telegram-bot не грузится при старте."""
+    global _bot
+    if name == "bot":
+        if _bot is None:
+            from telegram import Bot
+            _bot = Bot(token=TELEGRAM_TOKEN)
+        return _bot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 async def send_alert(message):
     """Отправка сообщения в Telegram (асинхронная)"""
     try:
-        await bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message)
+        await __getattr__("bot").send_message(chat_id=TELEGRAM_CHAT_ID, text=message)
         print(f"Уведомление отправлено: {message}")
     except Exception as e:
         print(f"Ошибка отправки Telegram уведомления: {e}")
+
+
+def coalesce(messages):
+    """Склеить пачку сообщений в один текст: одинаковые строки сворачиваются в «×N»."""
+    counts = Counter(messages)
+    lines = []
+    for message in dict.fromkeys(messages):
+        lines.append(message if counts[message] == 1 else f"{message} (×{counts[message]})")
+    text = "\n".join(lines)
+    return [text[i:i + MAX_MESSAGE_LENGTH] for i in range(0, len(text), MAX_MESSAGE_LENGTH)]
+
+
+class AlertDispatcher:
+    """Фоновый диспетчер алертов: ограниченная очередь, постоянный event loop и HTTP-сессия бота.
+
+    enqueue() никогда не блокирует: при переполнении очереди сообщение отбрасывается.
+    Сообщения, пришедшие в пределах coalesce_window, уходят одним сообщением; отправки
+    разнесены минимум на min_interval секунд, RetryAfter и сетевые ошибки — с backoff.
+    Если бот не инициализируется (неверный токен, нет сети), попытки повторяются с backoff,
+    а сообщения на это время считаются в dropped.
+    """
+
+    def __init__(self, token=TELEGRAM_TOKEN, chat_id=TELEGRAM_CHAT_ID, maxsize=1000,
+                 coalesce_window=1.0, min_interval=1.0, max_batch=50, max_retries=3, init_backoff=5.0,
+                 max_init_backoff=300.0):
+        self.token = token
+        self.chat_id = chat_id
+        self.maxsize = maxsize
+        self.coalesce_window = coalesce_window
+        self.min_interval = min_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.init_backoff = init_backoff
+        self.max_init_backoff = max_init_backoff
+        self.available = False  # Бот инициализирован (токен проверен get_me)
+        self.sent = 0
+        self.dropped = 0
+        self._last_send = 0.0
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._ready.set()
+        self._loop.run_until_complete(self._run())
+
+    def enqueue(self, message):
+        """Fire-and-forget: поставить сообщение в очередь без ожидания Telegram."""
+        try:
+            self._loop.call_soon_threadsafe(self._put, str(message))
+        except RuntimeError:
+            self.dropped += 1  # Loop уже остановлен
+
+    def _put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Очередь алертов переполнена, отброшено: {self.dropped}")
+
+    async def _run(self):
+        """Сессия бота; при ошибке инициализации (токен, сеть) — повтор с backoff, а не тихая смерть потока."""
+        attempt = 0
+        while True:
+            try:
+                from telegram import Bot  # Импорт в фоновом потоке, не на старте процесса
+                tg_bot = Bot(token=self.token)
+                async with tg_bot:  # Одна HTTP-сессия на всё время жизни диспетчера
+                    self.available = True
+                    attempt = 0
+                    if await self._serve(tg_bot):
+                        return
+            except Exception as e:
+                self.available = False
+                delay = min(self.init_backoff * 2 ** attempt, self.max_init_backoff)
+                attempt += 1
+                metrics.RETRIES.inc(component="telegram")
+                logger.error(f"Telegram бот недоступен: {e}; повтор через {delay:g}s, алерты до этого отбрасываются")
+                if await self._drop_for(delay):
+                    return
+
+    async def _drop_for(self, delay):
+        """Пока бот недоступен: сообщения из очереди считаются отброшенными; True — пришла остановка."""
+        deadline = self._loop.time() + delay
+        while True:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                return False
+            try:
+                message = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return False
+            if message is None:
+                return True
+            self.dropped += 1
+
+    async def _serve(self, tg_bot):
+        """Отправка пачками до остановки; True — получен сигнал остановки."""
+        while True:
+            message = await self._queue.get()
+            if message is None:
+                return True
+            batch = [message]
+            stop = False
+            deadline = self._loop.time() + self.coalesce_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if message is None:
+                    stop = True
+                    break
+                batch.append(message)
+            for text in coalesce(batch):
+                await self._send(tg_bot, text)
+            if stop:
+                return True
+
+    async def _send(self, tg_bot, text):
+        from telegram.error import RetryAfter, NetworkError
+        for attempt in range(self.max_retries + 1):
+            wait = self._last_send + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                with metrics.span("telegram", loop="alerts"):
+                    await tg_bot.send_message(chat_id=self.chat_id, text=text)
+                self._last_send = time.monotonic()
+                self.sent += 1
+                return True
+            except RetryAfter as e:
+                metrics.RETRIES.inc(component="telegram")
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                logger.warning(f"Telegram rate limit, повтор через {retry_after}s")
+                await asyncio.sleep(retry_after)
+            except NetworkError as e:
+                metrics.RETRIES.inc(component="telegram")
+                logger.warning(f"Сетевая ошибка Telegram (попытка {attempt + 1}): {e}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except Exception as e:
+                logger.error(f"Ошибка отправки Telegram уведомления: {e}")
+                return False
+        logger.error(f"Алерт не отправлен после {self.max_retries + 1} попыток: {text[:200]}")
+        return False
+
+    def close(self, timeout=5):
+        """Отправить накопленное и остановить поток диспетчера."""
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+            self._thread.join(timeout)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Общий на процесс диспетчер алертов (создаётся при первом обращении)."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher()
+            atexit.register(_dispatcher.close)
+    return _dispatcher
+
+
+def enqueue(message):
+    """Поставить алерт в очередь общего диспетчера (не ждёт Telegram)."""
+    if os.getenv("TELEGRAM_ALERTS", "1") == "0":
+        logger.info(f"Алерт (Telegram выключен): {message}")  # Реплей/CI: в Telegram не отправляем
+        return
+    get_dispatcher().enqueue(message)
@@ -0,0 +1,116 @@
+import numpy as np
+from candle_store import CandleStore, INTERVAL_MS, candles_to_arrays
+
+# CandleStore.sync / append / merge / compact на фейковом API свечей: без сети, в tmp_path
+STEP = INTERVAL_MS["1h"]
+T0 = 1_735_689_600_000  # 2025-01-01
+
+
+class FakeCandleAPI:
+    """get_candles по заданному набору времён; fail — диапазоны, где запрос «падает» (None)."""
+
+    def __init__(self, times, fail=()):
+        self.times = np.asarray(times, dtype=np.int64)
+        self.fail = list(fail)
+        self.calls = []
+
+    def get_candles(self, coin="BTC", interval="1h", start_time=None, end_time=None):
+        self.calls.append((start_time, end_time))
+        if any(lo <= start_time <= hi for lo, hi in self.fail):
+            return None
+        times = self.times[(self.times >= start_time) & (self.times <= end_time)]
+        return [{"t": int(t), "o": 1.0, "h": 2.0, "l": 0.5, "c": float(t % 1000), "v": 1.0} for t in times]
+
+
+def bars(first, last):
+    return T0 + np.arange(first, last + 1, dtype=np.int64) * STEP
+
+
+def fetched(api, start, end):
+    return candles_to_arrays(api.get_candles(start_time=start, end_time=end))
+
+
+def test_sync_fetches_only_missing_tail(tmp_path):
+    api = FakeCandleAPI(bars(0, 99))
+    store = CandleStore(api, str(tmp_path))
+    assert store.sync("BTC", "1h", T0, T0 + 49 * STEP) == 50
+    api.calls.clear()
+    store.sync("BTC", "1h", T0, T0 + 99 * STEP)
+    assert api.calls == [(T0 + 49 * STEP, T0 + 99 * STEP)]  # С последней сохранённой свечи
+    times = store.load("BTC", "1h")["time"]
+    assert np.array_equal(times, bars(0, 99))
+
+
+def test_append_replaces_revised_last_candle(tmp_path):
+    store = CandleStore(root=str(tmp_path))
+    times = bars(0, 9)
+    store._write("BTC", "1h", {"time": times, "open": np.ones(10), "high": np.ones(10), "low": np.ones(10),
+                               "close": np.ones(10), "volume": np.ones(10)})
+    newer = bars(9, 11)
+    store._append("BTC", "1h", {"time": newer, "open": np.ones(3), "high": np.ones(3), "low": np.ones(3),
+                                "close": np.full(3, 5.0), "volume": np.ones(3)})
+    loaded = store.load("BTC", "1h")
+    assert np.array_equal(loaded["time"], bars(0, 11))
+    assert loaded["close"][8] == 1.0 and np.all(loaded["close"][9:] == 5.0)
+
+
+def test_older_range_is_merged_and_covered(tmp_path):
+    api = FakeCandleAPI(bars(0, 99))
+    store = CandleStore(api, str(tmp_path))
+    store.sync("BTC", "1h", T0 + 50 * STEP, T0 + 99 * STEP)
+    store.sync("BTC", "1h", T0, T0 + 99 * STEP)
+    assert np.array_equal(store.load("BTC", "1h")["time"], bars(0, 99))
+    assert store._read_meta("BTC", "1h")["covered_from"] == T0
+
+
+def test_failed_older_fetch_does_not_mark_range_covered(tmp_path):
+    api = FakeCandleAPI(bars(0, 99), fail=[(T0, T0 + 49 * STEP)])
+    store = CandleStore(api, str(tmp_path))
+    store.sync("BTC", "1h", T0 + 50 * STEP, T0 + 99 * STEP)
+    store.sync("BTC", "1h", T0, T0 + 99 * STEP)
+    assert store._read_meta("BTC", "1h")["covered_from"] == T0 + 50 * STEP
+    api.fail.clear()  # Сеть вернулась — следующая синхронизация закрывает диапазон
+    store.sync("BTC", "1h", T0, T0 + 99 * STEP)
+    assert np.array_equal(store.load("BTC", "1h")["time"], bars(0, 99))
+    assert store._read_meta("BTC", "1h")["covered_from"] == T0
+
+
+def test_failed_chunk_leaves_gap_that_next_sync_fills(tmp_path):
+    api = FakeCandleAPI(bars(0, 99))
+    store = CandleStore(api, str(tmp_path))
+    store.sync("BTC", "1h", T0, T0 + 39 * STEP)
+    # Дыра посреди хранилища (например, от старой версии, двигавшей курсор за ошибкой)
+    store._merge("BTC", "1h", fetched(api, T0 + 60 * STEP, T0 + 99 * STEP))
+    assert store.gaps("BTC", "1h", T0, T0 + 99 * STEP) == [(T0 + 40 * STEP, T0 + 60 * STEP - 1)]
+    api.fail = [(T0 + 40 * STEP, T0 + 60 * STEP - 1)]
+    store.sync("BTC", "1h", T0, T0 + 99 * STEP)
+    assert store.gaps("BTC", "1h", T0, T0 + 99 * STEP)  # Ошибка — пропуск не считается пустым
+    api.fail.clear()
+    store.sync("BTC", "1h", T0, T0 + 99 * STEP)
+    assert store.gaps("BTC", "1h", T0, T0 + 99 * STEP) == []
+    assert np.array_equal(store.load("BTC", "1h")["time"], bars(0, 99))
+
+
+def test_confirmed_empty_gap_is_not_refetched(tmp_path):
+    times = np.concatenate([bars(0, 9), bars(20, 29)])  # Биржа не отдаёт свечи 10..19
+    api = FakeCandleAPI(times)
+    store = CandleStore(api, str(tmp_path))
+    store.sync("BTC", "1h", T0, T0 + 29 * STEP)
+    store.sync("BTC", "1h", T0, T0 + 29 * STEP)
+    assert store._read_meta("BTC", "1h")["empty"] == [[T0 + 10 * STEP, T0 + 20 * STEP - 1]]
+    api.calls.clear()
+    store.sync("BTC", "1h", T0, T0 + 29 * STEP)
+    assert api.calls == [(T0 + 29 * STEP, T0 + 29 * STEP)]  # Только хвост
+
+
+def test_compact_sorts_and_dedupes(tmp_path):
+    store = CandleStore(root=str(tmp_path))
+    times = np.array([T0 + 2 * STEP, T0, T0 + STEP, T0], dtype=np.int64)
+    close = np.array([3.0, 1.0, 2.0, 9.0])
+    ones = np.ones(4)
+    store._write("BTC", "1h", {"time": times, "open": ones, "high": ones, "low": ones, "close": close,
+                               "volume": ones})
+    assert store.compact("BTC", "1h") == 1
+    loaded = store.load("BTC", "1h")
+    assert np.array_equal(loaded["time"], bars(0, 2))
+    assert list(loaded["close"]) == [9.0, 2.0, 3.0]  # Из дубликатов остаётся последняя запись
@@ -0,0 +1,69 @@
+from grid import GridManager
+
+# План сверки сетки: совпадающие уровни остаются, сдвинутые — modify, лишние — cancel, недостающие — place
+
+
+class RoundingAPI:
+    """round_size/round_price без биржи: цена до 0.1, размер до 0.001."""
+
+    def round_size(self, coin, size):
+        return round(size, 3)
+
+    def round_price(self, coin, price):
+        return round(price, 1)
+
+
+def grid(live=None, levels=()):
+    manager = GridManager(RoundingAPI(), executor=None, tolerance_bps=5)
+    manager.live["BTC"] = dict(live or {})
+    manager.set_ladder("BTC", levels)
+    return manager
+
+
+def test_matching_levels_are_kept():
+    manager = grid({1: (True, 99.0, 1.0), 2: (False, 101.0, 1.0)}, [(True, 99.0, 1.0), (False, 101.0, 1.0)])
+    assert manager.plan("BTC") == {"cancel": [], "modify": [], "place": []}
+    # Сдвиг цены в пределах допуска (5 bps) не переставляет ордер
+    manager.set_ladder("BTC", [(True, 99.04, 1.0), (False, 101.0, 1.0)])
+    assert manager.plan("BTC") == {"cancel": [], "modify": [], "place": []}
+
+
+def test_moved_levels_are_modified_not_replaced():
+    manager = grid({1: (True, 99.0, 1.0), 2: (True, 98.0, 1.0)}, [(True, 98.0, 1.0), (True, 97.0, 1.0)])
+    plan = manager.plan("BTC")
+    # 98 уже стоит; ордер 99 переезжает на недостающий уровень 97
+    assert plan == {"cancel": [], "modify": [(1, (True, 97.0, 1.0))], "place": []}
+    manager.set_ladder("BTC", [(True, 99.0, 2.0), (True, 98.0, 1.0)])
+    assert manager.plan("BTC")["modify"] == [(1, (True, 99.0, 2.0))]  # Другой размер — тоже modify
+
+
+def test_extra_orders_cancelled_and_missing_placed():
+    manager = grid({1: (True, 99.0, 1.0), 2: (True, 98.0, 1.0), 3: (False, 101.0, 1.0)},
+                   [(True, 99.0, 1.0), (False, 101.0, 1.0), (False, 102.0, 1.0)])
+    assert manager.plan("BTC") == {"cancel": [2], "modify": [], "place": [(False, 102.0, 1.0)]}
+    manager.clear("BTC")
+    assert sorted(manager.plan("BTC")["cancel"]) == [1, 2, 3]
+
+
+def test_rounding_and_zero_size_levels():
+    manager = grid(levels=[(True, 99.04, 1.0004), (True, 98.0, 0.0001)])
+    assert manager.targets["BTC"] == [(True, 99.0, 1.0)]
+    assert manager.plan("BTC")["place"] == [(True, 99.0, 1.0)]
+
+
+def test_filled_levels_nearest_market_are_not_replaced():
+    ladder = [(True, 99.0, 1.0), (True, 98.0, 1.0), (True, 97.0, 1.0), (False, 101.0, 1.0)]
+    manager = grid({2: (True, 98.0, 1.0), 3: (True, 97.0, 1.0), 4: (False, 101.0, 1.0)}, ladder)
+    manager.placed["BTC"] = {1: True, 2: True, 3: True, 4: False}
+    manager.api.get_open_orders = lambda coin: [
+        {"coin": "BTC", "oid": oid, "side": "B" if is_buy else "A", "limitPx": str(px), "sz": str(sz)}
+        for oid, (is_buy, px, sz) in manager.live["BTC"].items()]
+    assert manager.sync("BTC")  # Ордер 1 пропал без нашей отмены — исполнен
+    assert manager.filled["BTC"] == {True: 1}
+    assert manager.plan("BTC") == {"cancel": [], "modify": [], "place": []}
+    # Повторный сигнал с той же лестницей не добирает позицию
+    manager.set_ladder("BTC", ladder)
+    assert manager.plan("BTC")["place"] == []
+    # Сторона снята — счёт исполнений обнуляется
+    manager.set_ladder("BTC", [(False, 101.0, 1.0)])
+    assert manager.filled["BTC"] == {}
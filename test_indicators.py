@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from indicators import StreamingIndicators, INDICATOR_COLUMNS
+from ml_strategy import MLStrategy
+
+# Потоковые индикаторы против полного pandas-расчёта MLStrategy.calculate_indicators
+T0 = 1_735_689_600_000
+
+
+def candles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 50_000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.concatenate(([50_000], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.002, n)) * close
+    return pd.DataFrame({"time": T0 + np.arange(n, dtype=np.int64) * 3_600_000, "open": open_,
+                         "high": np.maximum(open_, close) + spread, "low": np.minimum(open_, close) - spread,
+                         "close": close, "volume": np.ones(n), "funding_rate": 0.0001})
+
+
+def strategy():
+    return MLStrategy(api=object(), backends="rules")  # Без API: только расчёт индикаторов
+
+
+def assert_parity(actual, expected):
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(actual[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-6, equal_nan=True, err_msg=column)
+
+
+def test_streaming_matches_pandas_per_bar():
+    df = candles(200)
+    expected = strategy().calculate_indicators(df.copy())
+    engine = StreamingIndicators()
+    for i, row in enumerate(df.to_dict("records")):
+        values = engine.update(row, time_key=row["time"])
+        for column in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(values[column], expected[column].iloc[i], rtol=1e-9, atol=1e-6,
+                                       equal_nan=True, err_msg=f"{column} @ {i}")
+
+
+def test_update_indicators_fills_whole_frame_across_revisions():
+    ml = strategy()
+    full = candles(260, seed=1)
+    window = 120
+    for end in range(window, len(full)):
+        df = full.iloc[end - window:end].reset_index(drop=True)
+        # Формирующаяся свеча: сначала частичная, затем та же time с другим close/high/low
+        forming = df.copy()
+        forming.loc[forming.index[-1], ["high", "low", "close"]] = forming.iloc[-1][["open"]].to_numpy().repeat(3)
+        for frame in (forming, df):
+            actual = ml.update_indicators(frame.copy())
+            # Ожидание — полный пересчёт всей истории с той же последней свечой
+            history = pd.concat([full.iloc[:end - 1], frame.iloc[[-1]]], ignore_index=True)
+            expected = ml.calculate_indicators(history).iloc[-window:].reset_index(drop=True)
+            assert_parity(actual, expected)
+
+
+def test_update_indicators_recomputes_when_history_is_missing():
+    ml = strategy()
+    ml.indicators = StreamingIndicators(history=10)
+    df = candles(100, seed=2)
+    actual = ml.update_indicators(df.copy())
+    assert actual[list(INDICATOR_COLUMNS)].iloc[:-1].notna().any().all()
+    assert_parity(actual, ml.calculate_indicators(df.copy()))
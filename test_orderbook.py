@@ -0,0 +1,74 @@
+import math
+import pytest
+from orderbook import OrderBookBuffer
+
+# Кольцевой буфер L2-снимков: перенос по кругу, переоткрытие memmap, проскальзывание по уровням
+BIDS = [(99.0, 1.0), (98.0, 2.0), (97.0, 3.0)]
+ASKS = [(101.0, 1.0), (102.0, 2.0), (103.0, 3.0)]
+
+
+def shifted(levels, shift):
+    return [(px + shift, sz) for px, sz in levels]
+
+
+def test_ring_wraps_and_keeps_time_order():
+    book = OrderBookBuffer("BTC", depth=3, capacity=4)
+    for i in range(10):
+        book.append(1_000 + i, shifted(BIDS, i), shifted(ASKS, i))
+    assert book.total == 10 and len(book) == 4
+    assert list(book.snapshots()["time"]) == [1_006, 1_007, 1_008, 1_009]
+    assert book.best_bid() == 108.0
+    assert int(book.at(1_007)["time"]) == 1_007
+    assert book.at(1_005) is None  # Перезаписан кольцом
+
+
+def test_memmap_reopens_with_history(tmp_path):
+    path = str(tmp_path / "BTC.l2")
+    book = OrderBookBuffer("BTC", depth=3, capacity=4, path=path)
+    for i in range(6):
+        book.append(1_000 + i, shifted(BIDS, i), shifted(ASKS, i))
+    book.flush()
+    del book
+    reopened = OrderBookBuffer("BTC", depth=3, capacity=4, path=path)
+    assert reopened.total == 6
+    assert list(reopened.snapshots()["time"]) == [1_002, 1_003, 1_004, 1_005]
+    reopened.append(1_006, BIDS, ASKS)
+    reopened.flush()
+    replay = OrderBookBuffer("BTC", depth=3, capacity=4, path=path, readonly=True)
+    assert list(replay.snapshots()["time"]) == [1_003, 1_004, 1_005, 1_006]
+    assert replay.best_ask() == 101.0
+
+
+def test_reopen_with_other_layout_recreates_file(tmp_path):
+    path = str(tmp_path / "BTC.l2")
+    OrderBookBuffer("BTC", depth=3, capacity=4, path=path).append(1_000, BIDS, ASKS)
+    book = OrderBookBuffer("BTC", depth=3, capacity=8, path=path)
+    assert book.total == 0
+    with pytest.raises(FileNotFoundError):
+        OrderBookBuffer("ETH", depth=3, capacity=4, path=str(tmp_path / "ETH.l2"), readonly=True)
+
+
+def test_slippage_walks_levels():
+    book = OrderBookBuffer("BTC", depth=5, capacity=2)
+    book.append(1_000, BIDS, ASKS)
+    assert book.mid() == 100.0
+    assert book.spread() == (2.0, 200.0)
+    buy = book.slippage(True, 2.0)  # 1 по 101 и 1 по 102
+    assert buy["complete"] and buy["filled"] == 2.0
+    assert buy["avg_px"] == 101.5 and buy["worst_px"] == 102.0
+    assert math.isclose(buy["slippage_bps"], 150.0)
+    sell = book.slippage(False, 0.5)
+    assert sell["avg_px"] == 99.0 and math.isclose(sell["slippage_bps"], 100.0)
+    too_big = book.slippage(True, 10.0)
+    assert not too_big["complete"] and too_big["filled"] == 6.0
+    assert book.limit_price(True, 3.0) == 102.0
+    assert book.limit_price(True, 10.0) is None
+    assert book.depth_to_price(False, 98.0) == 3.0
+
+
+def test_empty_side_has_no_price():
+    book = OrderBookBuffer("BTC", depth=3, capacity=2)
+    assert book.latest() is None and book.slippage(True, 1.0)["avg_px"] is None
+    book.append(1_000, BIDS, [])
+    assert book.best_ask() is None and book.mid() is None
+    assert book.slippage(True, 1.0)["complete"] is False
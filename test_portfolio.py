@@ -0,0 +1,66 @@
+import math
+from portfolio import Portfolio
+
+# PnL, разворот позиции, ликвидация и лимиты pre-trade проверки Portfolio
+
+
+def test_on_fill_average_entry_reduce_and_reversal():
+    p = Portfolio(collateral=10_000.0)
+    p.on_fill("BTC", True, 1.0, 100.0)
+    p.on_fill("BTC", True, 1.0, 110.0)
+    assert p.positions()[0]["size"] == 2.0 and p.positions()[0]["entry"] == 105.0
+    p.on_fill("BTC", False, 3.0, 120.0, fee=1.5)  # Закрыть 2 (+30) и открыть шорт 1 по цене сделки
+    pos = p.positions()[0]
+    assert pos["size"] == -1.0 and pos["entry"] == 120.0
+    assert p.realized == 30.0
+    assert p.collateral == 10_000.0 + 30.0 - 1.5
+    p.on_fill("BTC", True, 1.0, 100.0)  # Шорт закрыт с прибылью 20
+    assert p.positions() == []
+    assert p.realized == 50.0
+    assert p.entry[p.index["BTC"]] == 0.0
+
+
+def test_unrealized_pnl_follows_mid():
+    p = Portfolio(collateral=1_000.0)
+    p.on_fill("ETH", False, 2.0, 3_000.0)
+    p.on_mid("ETH", 2_900.0)
+    totals = p.snapshot()
+    assert totals["unrealized_pnl"] == 200.0
+    assert totals["equity"] == 1_200.0
+    assert totals["net_exposure"] == -5_800.0
+
+
+def test_liquidation_price_zeroes_margin_buffer():
+    p = Portfolio(collateral=1_000.0)
+    p.on_fill("BTC", True, 0.5, 50_000.0)
+    liq_px = p.positions()[0]["liquidation_px"]
+    assert 0 < liq_px < 50_000.0
+    p.on_mid("BTC", liq_px)  # На цене ликвидации equity равна maintenance margin
+    totals = p.snapshot()
+    assert math.isclose(totals["equity"], totals["maintenance_margin"], rel_tol=1e-9)
+    assert math.isclose(totals["margin_ratio"], 1.0, rel_tol=1e-9)
+
+
+def test_pre_trade_check_limits():
+    p = Portfolio(collateral=10_000.0)
+    assert p.pre_trade_check("BTC", True, 0.1, 50_000.0) == (True, "")
+    ok, reason = p.pre_trade_check("BTC", True, 1.2, 50_000.0, max_gross_leverage=5, max_coin_exposure=10)
+    assert not ok and reason.startswith("gross exposure")
+    ok, reason = p.pre_trade_check("BTC", True, 0.7, 50_000.0, max_gross_leverage=10, max_coin_exposure=3)
+    assert not ok and reason.startswith("exposure BTC")
+    ok, reason = p.pre_trade_check("BTC", True, 0.9, 50_000.0, max_gross_leverage=10, max_coin_exposure=10,
+                                   min_liq_distance=0.5)
+    assert not ok and reason.startswith("до ликвидации")
+    ok, reason = p.pre_trade_check("SOL", True, 1.0)
+    assert not ok and reason == "нет цены для SOL"
+
+
+def test_pre_trade_check_allows_reduction_and_rejects_without_equity():
+    p = Portfolio(collateral=10_000.0)
+    p.on_fill("BTC", True, 0.5, 50_000.0)
+    assert p.pre_trade_check("BTC", False, 0.5, 50_000.0, max_gross_leverage=0.1) == (True, "")
+    ok, reason = p.pre_trade_check("BTC", False, 1.0, 50_000.0, max_gross_leverage=0.1)
+    assert not ok  # Разворот увеличивает риск и проверяется как новая позиция
+    p.on_mid("BTC", 29_000.0)  # Убыток больше залога
+    ok, reason = p.pre_trade_check("BTC", True, 0.01, 29_000.0)
+    assert not ok and reason.startswith("equity")
@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import numpy as np
+
+# Реплей bot.run_bot на синтетических 1m свечах: два прогона должны давать одинаковые исполнения
+T0 = 1_735_689_600_000  # 2025-01-01
+DAYS = 4
+REPLAY_HOURS = 6
+
+
+def synthetic_candles(seed=0):
+    rng = np.random.default_rng(seed)
+    n = 60 * 24 * DAYS
+    close = 95000 * np.exp(np.cumsum(rng.normal(0, 0.0015, n)))
+    open_ = np.concatenate(([95000], close[:-1]))
+    return {"BTC": {"time": T0 + np.arange(n, dtype=np.int64) * 60_000, "open": open_,
+                    "high": np.maximum(open_, close) * 1.0005, "low": np.minimum(open_, close) * 0.9995,
+                    "close": close, "volume": np.ones(n)}}
+
+
+def run_once(out_path):
+    """Один реплей в отдельном процессе (bot — модуль с глобальным состоянием)."""
+    import exchange_sim
+    start = T0 + (DAYS - 1) * 86_400_000
+    clock = exchange_sim.VirtualClock(start, start + REPLAY_HOURS * 3_600_000)
+    sim = exchange_sim.SimulatedExchange(synthetic_candles(), clock)
+    summary = exchange_sim.replay_bot(sim, clock, workdir=os.path.dirname(out_path))
+    fills = list(sim.fills)
+    with open(out_path, "w") as f:
+        json.dump({"account_value": summary["account_value"], "fills": fills}, f, default=str)
+
+
+def replay(workdir, name):
+    """Прогон в своём каталоге: журнал, лог и свечи реплея не попадают в репозиторий."""
+    run_dir = os.path.join(workdir, name)
+    os.makedirs(run_dir)
+    out_path = os.path.join(run_dir, "result.json")
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, BOT_MARKETS="BTC:1m", BOT_SIGNAL_BACKENDS="rules", METRICS_PORT="0",
+               TRADE_JOURNAL=os.path.join(run_dir, "trades.jsonl"), LOG_FILE=os.path.join(run_dir, "bot.log"),
+               PYTHONPATH=os.pathsep.join(filter(None, (here, os.environ.get("PYTHONPATH")))))
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--run", out_path], check=True, env=env, cwd=run_dir)
+    with open(out_path) as f:
+        return json.load(f)
+
+
+def test_replay_deterministic():
+    with tempfile.TemporaryDirectory() as workdir:
+        first, second = replay(workdir, "first"), replay(workdir, "second")
+    assert first["fills"], "реплей без исполнений ничего не проверяет"
+    assert first["fills"] == second["fills"]
+    assert first["account_value"] == second["account_value"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--run":
+        run_once(sys.argv[2])
+    else:
+        test_replay_deterministic()
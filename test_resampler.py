@@ -0,0 +1,66 @@
+import numpy as np
+from candle_store import INTERVAL_MS
+from resampler import Resampler, resample
+
+# Инкрементальный Resampler против векторного resample по той же 1m истории
+MINUTE = INTERVAL_MS["1m"]
+T0 = 1_735_689_600_000  # 2025-01-01, граница дня
+INTERVALS = ("5m", "15m", "1h")
+
+
+def minutes(n, seed=0, start=T0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    return {"time": start + np.arange(n, dtype=np.int64) * MINUTE, "open": open_,
+            "high": np.maximum(open_, close) + 0.05, "low": np.minimum(open_, close) - 0.05,
+            "close": close, "volume": rng.uniform(1, 5, n)}
+
+
+def rows(arrays):
+    return [tuple(arrays[col][i] for col in ("time", "open", "high", "low", "close", "volume"))
+            for i in range(len(arrays["time"]))]
+
+
+def assert_same(actual, expected):
+    for col in expected:
+        np.testing.assert_allclose(actual[col], expected[col], rtol=1e-12, err_msg=col)
+
+
+def test_incremental_matches_resample():
+    data = minutes(400)
+    resampler = Resampler(intervals=INTERVALS)
+    for bar in rows(data):
+        resampler.update(bar)
+    for interval in INTERVALS:
+        expected = resample(data, INTERVAL_MS[interval])
+        # Последняя корзина ещё строится: она есть в arrays() и отсутствует среди закрытых баров
+        assert_same(resampler.arrays(interval), expected)
+        closed = resampler.arrays(interval, include_partial=False)
+        assert len(closed["time"]) == len(expected["time"]) - 1
+
+
+def test_seed_then_feed_matches_resample():
+    data = minutes(500, seed=1, start=T0 + 7 * MINUTE)  # Начало не на границе корзин
+    resampler = Resampler(intervals=INTERVALS)
+    resampler.seed({col: values[:250] for col, values in data.items()})
+    for bar in rows(data)[250:]:
+        resampler.update(bar)
+    for interval in INTERVALS:
+        assert_same(resampler.arrays(interval), resample(data, INTERVAL_MS[interval]))
+
+
+def test_revisions_of_open_minute_are_not_aggregated():
+    data = minutes(30, seed=2)
+    resampler = Resampler(intervals=("5m",))
+    closed = []
+    resampler.add_listener(lambda interval, bar: closed.append((interval, bar[0])))
+    for t, o, h, lo, c, v in rows(data):
+        # WebSocket присылает незакрытую минуту несколько раз: сначала без движения, затем финальной
+        resampler.update({"t": t, "o": o, "h": o, "l": o, "c": o, "v": v / 2})
+        resampler.update((t, o, h, lo, c, v))
+    assert_same(resampler.arrays("5m"), resample(data, INTERVAL_MS["5m"]))
+    assert [t for interval, t in closed if interval == "5m"] == list(T0 + np.arange(5) * 5 * MINUTE)
+    assert resampler.update((T0, 1.0, 1.0, 1.0, 1.0, 1.0)) == []  # Устаревшая минута пропускается
+    resampler.close_partial()
+    assert resampler.current("5m")[0] == T0 + 25 * MINUTE
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import numpy as np
+from execution import parse_statuses
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = os.getenv("TRADE_JOURNAL", "trades.jsonl")
+INDEX_DTYPE = np.dtype([("ts", "<i8"), ("offset", "<i8")])  # Sidecar: (время ms, смещение строки)
+FIELDS = ("ts", "oid", "coin", "side", "size", "price", "status", "signal", "tag", "latency_ms")
+
+
+class TradeJournal:
+    """Append-only журнал сделок в JSONL с бинарным индексом по времени (path + ".idx")."""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.index_path = path + ".idx"
+
+    def append(self, record):
+        """Дописать одну запись (dict с полями FIELDS); безопасно для нескольких процессов."""
+        record = {field: record.get(field) for field in FIELDS}
+        with open(self.path, "ab") as data, open(self.index_path, "ab") as index:
+            fcntl.flock(data, fcntl.LOCK_EX)
+            try:
+                # Время берём под блокировкой, чтобы индекс оставался отсортированным
+                if record["ts"] is None:
+                    record["ts"] = int(time.time() * 1000)
+                line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+                offset = data.seek(0, os.SEEK_END)
+                data.write(line)
+                data.flush()
+                index.write(np.array([(record["ts"], offset)], dtype=INDEX_DTYPE).tobytes())
+                index.flush()  # До снятия блокировки: иначе запись другого процесса может лечь в .idx раньше
+            finally:
+                fcntl.flock(data, fcntl.LOCK_UN)
+        return record
+
+    def append_ack(self, ack, signal=None):
+        """Запись по подтверждению OrderExecutor: цена — фактическая avgPx для исполненных ордеров."""
+        price = ack.get("avg_px") if ack.get("status") == "filled" else ack.get("price")
+        size = ack.get("filled_size") if ack.get("status") == "filled" else ack.get("size")
+        return self.append({
+            "oid": ack.get("oid"),
+            "coin": ack.get("coin"),
+            "side": ack.get("side"),
+            "size": size,
+            "price": price,
+            "status": ack.get("status"),
+            "signal": signal or ack.get("signal"),
+            "tag": ack.get("tag"),
+            "latency_ms": ack.get("latency_ms"),
+        })
+
+    def record_result(self, order, result, signal=None, tag=None):
+        """Записать ответ биржи на order (OrderRequest) — для ручных ордеров вне OrderExecutor."""
+        records = []
+        for ack in parse_statuses([order], result, None):
+            ack["tag"] = tag
+            records.append(self.append_ack(ack, signal))
+        return records
+
+    def record_cancel(self, coin, oid, result, tag=None):
+        statuses = []
+        if isinstance(result, dict) and result.get("status") == "ok":
+            statuses = result.get("response", {}).get("data", {}).get("statuses", [])
+        status = "cancelled" if statuses and statuses[0] == "success" else "error"
+        return self.append({"oid": oid, "coin": coin, "status": status, "tag": tag})
+
+    def _index(self):
+        try:
+            n = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        except FileNotFoundError:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        if n == 0:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r", shape=(n,))
+
+    def read_range(self, start_ms=None, end_ms=None):
+        """Записи с start_ms <= ts <= end_ms: бинарный поиск по индексу, чтение только нужного куска."""
+        index = self._index()
+        if len(index) == 0:
+            return []
+        ts = index["ts"]
+        lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side="left"))
+        hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side="right"))
+        if lo >= hi:
+            return []
+        start_offset = int(index["offset"][lo])
+        end_offset = int(index["offset"][hi]) if hi < len(index) else None
+        with open(self.path, "rb") as f:
+            f.seek(start_offset)
+            chunk = f.read() if end_offset is None else f.read(end_offset - start_offset)
+        records = _parse_lines(chunk)
+        if end_ms is not None:
+            records = [r for r in records if r["ts"] <= end_ms]
+        return records
+
+    def tail(self, from_end=True):
+        """TailReader, читающий только новые записи (по умолчанию — начиная с текущего конца)."""
+        offset = 0
+        if from_end and os.path.exists(self.path):
+            offset = os.path.getsize(self.path)
+        return TailReader(self.path, offset)
+
+
+class TailReader:
+    """Инкрементальное чтение журнала: каждый вызов read_new() читает только дописанные байты."""
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+
+    def read_new(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return []
+        complete = chunk.rfind(b"\n") + 1  # Недописанную последнюю строку оставляем на потом
+        self.offset += complete
+        return _parse_lines(chunk[:complete])
+
+
+def _parse_lines(chunk):
+    records = []
+    for line in chunk.splitlines():
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            logger.warning(f"Повреждённая строка журнала сделок: {line[:100]!r}")
+    return records